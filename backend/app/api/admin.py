@@ -1,58 +1,461 @@
 """
 管理员 API 路由
 """
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import JSONResponse, ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, func, desc, delete, update, lambda_stmt, or_, and_
 from app.utils.auth import get_current_admin
-from app.db.database import get_db
-from app.db.models import Document, User
-from app.models.schemas import DocumentMetadata, UserResponse, UserQuotaUpdate
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.db.database import get_db, AsyncSessionLocal
+from app.db.models import (
+    Document, User, TokenUsage, Conversation, Message, Image,
+    RegistrationCode, image_tag_association
+)
+from app.models.schemas import UserQuotaUpdate, AdminDocumentPage, AdminUserPage
 from app.middleware.rate_limit import limiter
-from app.core.constants import RateLimitConfig
-from typing import List
+from app.core.constants import RateLimitConfig, CacheConfig, AdminConfig
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.image_storage_service import storage_service as image_storage_service
+from app.api.auth import invalidate_user_profile_cache, get_cached_user_profile
+from typing import List, Optional
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# ------------------------------
+# 预构建的热点查询语句（lambda_stmt 按代码位置缓存，避免每次请求重新构建子句）
+# ------------------------------
+_list_documents_stmt = lambda_stmt(
+    lambda: select(
+        Document.file_id,
+        Document.filename,
+        Document.file_type,
+        Document.file_size,
+        Document.created_at,
+        Document.chunks_count,
+        Document.status,
+        Document.user_id,
+        Document.id
+    ).order_by(Document.created_at.desc(), Document.id.desc())
+)
 
-@router.get("/documents", response_model=List[DocumentMetadata])
+_list_users_stmt = lambda_stmt(
+    lambda: select(
+        User.id,
+        User.email,
+        User.full_name,
+        User.is_active,
+        User.role,
+        User.token_quota,
+        User.created_at
+    ).order_by(User.created_at.desc(), User.id.desc())
+)
+
+_users_token_summary_stmt = lambda_stmt(
+    lambda: select(
+        User.id,
+        User.email,
+        User.role,
+        User.is_active,
+        User.token_quota,
+        func.coalesce(func.sum(TokenUsage.total_tokens), 0).label("tokens_used")
+    )
+    .select_from(User)
+    .outerjoin(TokenUsage, TokenUsage.user_id == User.id)
+    .group_by(User.id)
+    .order_by(User.id)
+)
+
+
+async def _execute_in_new_session(stmt):
+    """
+    在独立会话中执行只读查询
+
+    每个查询从连接池获取独立连接，便于使用 asyncio.gather 并发执行互不依赖的统计查询
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        return result.all()
+
+
+def _stale_cache_key(prefix: str, **key_params) -> str:
+    """过期副本缓存键（独立前缀，不受常规失效影响）"""
+    return cache_service.cache_key(f"{prefix}_{CacheConfig.ADMIN_STALE_CACHE_SUFFIX}", **key_params)
+
+
+def _set_with_stale_copy(prefix: str, value, ttl: int, **key_params):
+    """写入新鲜缓存，同时保存一份保留时间更长的过期副本"""
+    cache_service.set(cache_service.cache_key(prefix, **key_params), value, ttl=ttl)
+    if settings.ADMIN_STALE_FALLBACK_ENABLED:
+        cache_service.set(
+            _stale_cache_key(prefix, **key_params),
+            value,
+            ttl=CacheConfig.ADMIN_STALE_CACHE_TTL
+        )
+
+
+def _stale_fallback_response(prefix: str, **key_params):
+    """
+    数据库异常时返回过期副本
+
+    Returns:
+        带 X-Cache: STALE 头的响应；未启用或没有副本时返回 None
+    """
+    if not settings.ADMIN_STALE_FALLBACK_ENABLED:
+        return None
+    stale_value = cache_service.get(_stale_cache_key(prefix, **key_params))
+    if stale_value is None:
+        return None
+    logger.warning(f"数据库查询失败，返回过期缓存: {prefix}")
+    return JSONResponse(content=stale_value, headers={"X-Cache": "STALE"})
+
+
+def _invalidate_document_caches():
+    """文档变更后清除管理后台文档相关缓存"""
+    cache_service.clear(CacheConfig.ADMIN_DOCUMENTS_CACHE_PREFIX)
+    cache_service.clear(CacheConfig.ADMIN_DOCUMENTS_STATS_CACHE_PREFIX)
+
+
+def _invalidate_user_caches():
+    """用户变更后清除管理后台用户相关缓存"""
+    cache_service.clear(CacheConfig.ADMIN_USERS_CACHE_PREFIX)
+    cache_service.clear(CacheConfig.ADMIN_USERS_STATS_CACHE_PREFIX)
+    cache_service.clear(CacheConfig.ADMIN_TOKENS_SUMMARY_CACHE_PREFIX)
+
+
+async def get_verified_admin(
+    current_admin: dict = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+) -> dict:
+    """
+    关键写操作使用的管理员校验（依赖注入）
+    
+    普通管理接口只校验 JWT 中的 role 声明，不访问数据库；
+    删除用户、修改配额等操作要求角色信息足够新，因此再通过短 TTL 的用户资料缓存确认
+    账号仍存在、仍为管理员且未被禁用（缓存时间不超过 JWT 校验缓存）
+    """
+    profile = await get_cached_user_profile(db, current_admin.get("sub"), fresh=True)
+    if not profile or profile.get("role") != "admin" or not profile.get("is_active"):
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+    return current_admin
+
+
+# ------------------------------
+# 数据加载（带缓存），供各列表/统计接口与 /dashboard 聚合接口复用
+# ------------------------------
+async def _load_documents_page(db: AsyncSession, limit: int, cursor: Optional[str]) -> dict:
+    """加载文档列表分页（游标分页）"""
+    # 缓存键不包含管理员身份，所有管理员共享同一份缓存；但必须包含分页参数
+    cache_key = cache_service.cache_key(
+        CacheConfig.ADMIN_DOCUMENTS_CACHE_PREFIX,
+        limit=limit,
+        cursor=cursor
+    )
+    cached_page = cache_service.get(cache_key)
+    if cached_page is not None:
+        return cached_page
+    
+    # 只查询需要的列，不加载 doc_metadata 等大字段
+    stmt = _list_documents_stmt
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor, int)
+        stmt += lambda s: s.where(
+            or_(
+                Document.created_at < cursor_time,
+                and_(Document.created_at == cursor_time, Document.id < cursor_id)
+            )
+        )
+    stmt += lambda s: s.limit(limit)
+    result = await db.execute(stmt)
+    rows = result.all()
+    
+    # 直接构建字典，跳过逐行 Pydantic 校验
+    result_list = [
+        {
+            "file_id": row.file_id,
+            "filename": row.filename,
+            "file_type": row.file_type,
+            "file_size": row.file_size,
+            "upload_time": row.created_at.isoformat(),
+            "chunks_count": row.chunks_count,
+            "status": row.status,
+            "user_id": row.user_id  # 管理员可以看到是哪个用户上传的
+        }
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if len(rows) == limit else None
+    page = {
+        "items": result_list,
+        "next_cursor": next_cursor
+    }
+    cache_service.set(cache_key, page, ttl=CacheConfig.ADMIN_LIST_CACHE_TTL)
+    return page
+
+
+async def _load_documents_stats() -> dict:
+    """加载文档统计信息"""
+    cache_key = cache_service.cache_key(CacheConfig.ADMIN_DOCUMENTS_STATS_CACHE_PREFIX)
+    cached_stats = cache_service.get(cache_key)
+    if cached_stats is not None:
+        return cached_stats
+    
+    # 并发执行互不依赖的统计查询（总数与总大小合并为一次聚合）
+    totals_rows, user_stats_result = await asyncio.gather(
+        _execute_in_new_session(
+            select(func.count(), func.sum(Document.file_size)).select_from(Document)
+        ),
+        _execute_in_new_session(
+            select(
+                Document.user_id,
+                func.count().label('doc_count'),
+                func.sum(Document.file_size).label('total_size')
+            )
+            .group_by(Document.user_id)
+            .order_by(desc('doc_count'))
+        )
+    )
+    total_docs, total_size = totals_rows[0]
+    total_size = total_size or 0
+    
+    user_stats = [
+        {
+            "user_id": row.user_id,
+            "document_count": row.doc_count,
+            "total_size": row.total_size
+        }
+        for row in user_stats_result
+    ]
+    
+    stats = {
+        "total_documents": total_docs,
+        "total_size_bytes": total_size,
+        "total_size_mb": round(total_size / (1024 * 1024), 2),
+        "users_stats": user_stats
+    }
+    _set_with_stale_copy(
+        CacheConfig.ADMIN_DOCUMENTS_STATS_CACHE_PREFIX,
+        stats,
+        ttl=CacheConfig.ADMIN_STATS_CACHE_TTL
+    )
+    return stats
+
+
+async def _load_users_page(db: AsyncSession, limit: int, cursor: Optional[str]) -> dict:
+    """加载用户列表分页（游标分页）"""
+    cache_key = cache_service.cache_key(
+        CacheConfig.ADMIN_USERS_CACHE_PREFIX,
+        limit=limit,
+        cursor=cursor
+    )
+    cached_page = cache_service.get(cache_key)
+    if cached_page is not None:
+        return cached_page
+    
+    # 只查询需要的列，不加载 hashed_password 等字段
+    stmt = _list_users_stmt
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor, int)
+        stmt += lambda s: s.where(
+            or_(
+                User.created_at < cursor_time,
+                and_(User.created_at == cursor_time, User.id < cursor_id)
+            )
+        )
+    stmt += lambda s: s.limit(limit)
+    result = await db.execute(stmt)
+    rows = result.all()
+    
+    user_list = [
+        {
+            "id": row.id,
+            "email": row.email,
+            "full_name": row.full_name,
+            "is_active": row.is_active,
+            "role": row.role,
+            "token_quota": row.token_quota,
+            "created_at": row.created_at.isoformat() if row.created_at else None
+        }
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if len(rows) == limit else None
+    page = {
+        "items": user_list,
+        "next_cursor": next_cursor
+    }
+    cache_service.set(cache_key, page, ttl=CacheConfig.ADMIN_LIST_CACHE_TTL)
+    return page
+
+
+async def _load_users_stats(db: AsyncSession) -> dict:
+    """加载用户统计信息"""
+    cache_key = cache_service.cache_key(CacheConfig.ADMIN_USERS_STATS_CACHE_PREFIX)
+    cached_stats = cache_service.get(cache_key)
+    if cached_stats is not None:
+        return cached_stats
+    
+    # 使用 FILTER 条件聚合，一次扫描得到所有计数（同一快照，结果一致）
+    result = await db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(User.is_active == True).label("active"),
+            func.count().filter(User.role == "admin").label("admins")
+        )
+        .select_from(User)
+    )
+    row = result.one()
+    total_users = row.total
+    active_users = row.active
+    admin_users = row.admins
+    
+    stats = {
+        "total_users": total_users,
+        "active_users": active_users,
+        "inactive_users": total_users - active_users,
+        "admin_users": admin_users,
+        "regular_users": total_users - admin_users
+    }
+    _set_with_stale_copy(
+        CacheConfig.ADMIN_USERS_STATS_CACHE_PREFIX,
+        stats,
+        ttl=CacheConfig.ADMIN_STATS_CACHE_TTL
+    )
+    return stats
+
+
+async def _load_token_summary(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[int],
+    user_ids: Optional[List[int]] = None
+) -> dict:
+    """加载用户 Token 使用汇总（按用户 ID 游标分页，可只取指定用户）"""
+    cache_key = cache_service.cache_key(
+        CacheConfig.ADMIN_TOKENS_SUMMARY_CACHE_PREFIX,
+        limit=limit,
+        cursor=cursor,
+        user_ids=user_ids
+    )
+    cached_summary = cache_service.get(cache_key)
+    if cached_summary is not None:
+        return cached_summary
+    
+    # total_users 为系统用户总数，与分页无关
+    total_users = (await db.execute(select(func.count()).select_from(User))).scalar()
+    
+    # 一次查询获取所有用户及其已使用的 tokens（避免 N+1 查询）
+    stmt = _users_token_summary_stmt
+    if cursor is not None:
+        stmt += lambda s: s.where(User.id > cursor)
+    if user_ids:
+        stmt += lambda s: s.where(User.id.in_(user_ids))
+    stmt += lambda s: s.limit(limit)
+    
+    # 服务端游标分批读取 Core 行，不构建 ORM 对象
+    result = await db.stream(stmt)
+    
+    summary = []
+    async for partition in result.partitions(AdminConfig.STREAM_PARTITION_SIZE):
+        for row in partition:
+            tokens_used = row.tokens_used
+            tokens_remaining = max(0, row.token_quota - tokens_used)
+            
+            summary.append({
+                "user_id": row.id,
+                "email": row.email,
+                "role": row.role,
+                "is_active": row.is_active,
+                "token_quota": row.token_quota,
+                "tokens_used": tokens_used,
+                "tokens_remaining": tokens_remaining,
+                "usage_percentage": round((tokens_used / row.token_quota * 100) if row.token_quota > 0 else 0, 2)
+            })
+    
+    summary_response = {
+        "total_users": total_users,
+        "users": summary,
+        "next_cursor": summary[-1]["user_id"] if len(summary) == limit else None
+    }
+    _set_with_stale_copy(
+        CacheConfig.ADMIN_TOKENS_SUMMARY_CACHE_PREFIX,
+        summary_response,
+        ttl=CacheConfig.ADMIN_TOKENS_SUMMARY_CACHE_TTL,
+        limit=limit,
+        cursor=cursor,
+        user_ids=user_ids
+    )
+    return summary_response
+
+
+async def _load_in_new_session(loader, *args):
+    """在独立会话中执行加载函数（用于 asyncio.gather 并发加载）"""
+    async with AsyncSessionLocal() as session:
+        return await loader(session, *args)
+
+
+@router.get("/dashboard")
+@limiter.limit(RateLimitConfig.DOCUMENT_RATE_LIMIT)
+async def get_dashboard(
+    request: Request,
+    current_admin: dict = Depends(get_current_admin)
+):
+    """
+    管理后台聚合数据
+    
+    一次请求并发加载文档列表首页、文档统计、用户列表首页、用户统计和 Token 使用汇总首页，
+    只消耗一次限流配额
+    """
+    try:
+        documents, documents_stats, users, users_stats, tokens_summary = await asyncio.gather(
+            _load_in_new_session(_load_documents_page, AdminConfig.DEFAULT_PAGE_SIZE, None),
+            _load_documents_stats(),
+            _load_in_new_session(_load_users_page, AdminConfig.DEFAULT_PAGE_SIZE, None),
+            _load_in_new_session(_load_users_stats),
+            _load_in_new_session(_load_token_summary, AdminConfig.DEFAULT_PAGE_SIZE, None)
+        )
+        
+        return ORJSONResponse({
+            "documents": documents,
+            "documents_stats": documents_stats,
+            "users": users,
+            "users_stats": users_stats,
+            "tokens_summary": tokens_summary
+        })
+        
+    except Exception as e:
+        logger.error(f"获取管理后台数据失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"获取管理后台数据失败: {str(e)}")
+
+
+@router.get("/documents", response_model=AdminDocumentPage)
 @limiter.limit(RateLimitConfig.DOCUMENT_RATE_LIMIT)
 async def list_all_documents(
     request: Request,
+    limit: int = Query(AdminConfig.DEFAULT_PAGE_SIZE, ge=1, le=AdminConfig.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor（created_at|id）"),
     current_admin: dict = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db)
 ):
     """
     管理员查看所有文档
     
-    返回系统中所有用户上传的文档列表
+    返回系统中所有用户上传的文档列表（按上传时间倒序，游标分页）
+    
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的 next_cursor，为空时从最新文档开始
     """
     try:
-        result = await db.execute(
-            select(Document)
-            .order_by(Document.created_at.desc())
-        )
-        documents = result.scalars().all()
-        
-        result_list = [
-            DocumentMetadata(
-                file_id=doc.file_id,
-                filename=doc.filename,
-                file_type=doc.file_type,
-                file_size=doc.file_size,
-                upload_time=doc.created_at,
-                chunks_count=doc.chunks_count,
-                status=doc.status,
-                user_id=doc.user_id  # 管理员可以看到是哪个用户上传的
-            )
-            for doc in documents
-        ]
+        page = await _load_documents_page(db, limit, cursor)
         
-        logger.info(f"管理员 {current_admin.get('user_id')} 查看了所有文档，共 {len(result_list)} 个")
-        return result_list
+        logger.info(f"管理员 {current_admin.get('user_id')} 查看了文档列表，本页 {len(page['items'])} 个")
+        return ORJSONResponse(page)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取所有文档列表失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取文档列表失败: {str(e)}")
@@ -62,8 +465,7 @@ async def list_all_documents(
 @limiter.limit(RateLimitConfig.DOCUMENT_RATE_LIMIT)
 async def get_documents_stats(
     request: Request,
-    current_admin: dict = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db)
+    current_admin: dict = Depends(get_current_admin)
 ):
     """
     获取文档统计信息
@@ -72,76 +474,38 @@ async def get_documents_stats(
         文档总数、总大小、按用户统计等
     """
     try:
-        total_docs_result = await db.execute(select(func.count(Document.id)))
-        total_docs = total_docs_result.scalar()
-        
-        total_size_result = await db.execute(select(func.sum(Document.file_size)))
-        total_size = total_size_result.scalar() or 0
-        
-        user_stats_result = await db.execute(
-            select(
-                Document.user_id,
-                func.count(Document.id).label('doc_count'),
-                func.sum(Document.file_size).label('total_size')
-            )
-            .group_by(Document.user_id)
-            .order_by(desc('doc_count'))
-        )
-        user_stats = [
-            {
-                "user_id": row.user_id,
-                "document_count": row.doc_count,
-                "total_size": row.total_size
-            }
-            for row in user_stats_result
-        ]
-        
-        return {
-            "total_documents": total_docs,
-            "total_size_bytes": total_size,
-            "total_size_mb": round(total_size / (1024 * 1024), 2),
-            "users_stats": user_stats
-        }
+        return await _load_documents_stats()
         
     except Exception as e:
         logger.error(f"获取文档统计失败: {e}", exc_info=True)
+        stale_response = _stale_fallback_response(CacheConfig.ADMIN_DOCUMENTS_STATS_CACHE_PREFIX)
+        if stale_response is not None:
+            return stale_response
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
 
-@router.get("/users", response_model=List[UserResponse])
+@router.get("/users", response_model=AdminUserPage)
 @limiter.limit(RateLimitConfig.DOCUMENT_RATE_LIMIT)
 async def list_all_users(
     request: Request,
+    limit: int = Query(AdminConfig.DEFAULT_PAGE_SIZE, ge=1, le=AdminConfig.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor（created_at|id）"),
     current_admin: dict = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db)
 ):
     """
     管理员查看所有用户
     
-    返回系统中所有用户列表
+    返回系统中所有用户列表（按创建时间倒序，游标分页）
     """
     try:
-        result = await db.execute(
-            select(User).order_by(User.created_at.desc())
-        )
-        users = result.scalars().all()
-        
-        user_list = [
-            UserResponse(
-                id=user.id,
-                email=user.email,
-                full_name=user.full_name,
-                is_active=user.is_active,
-                role=user.role,
-                token_quota=user.token_quota,
-                created_at=user.created_at
-            )
-            for user in users
-        ]
+        page = await _load_users_page(db, limit, cursor)
         
-        logger.info(f"管理员 {current_admin.get('user_id')} 查看了所有用户，共 {len(user_list)} 个")
-        return user_list
+        logger.info(f"管理员 {current_admin.get('user_id')} 查看了用户列表，本页 {len(page['items'])} 个")
+        return ORJSONResponse(page)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取用户列表失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取用户列表失败: {str(e)}")
@@ -158,29 +522,13 @@ async def get_users_stats(
     获取用户统计信息
     """
     try:
-        total_users_result = await db.execute(select(func.count(User.id)))
-        total_users = total_users_result.scalar()
-        
-        active_users_result = await db.execute(
-            select(func.count(User.id)).where(User.is_active == True)
-        )
-        active_users = active_users_result.scalar()
-        
-        admin_users_result = await db.execute(
-            select(func.count(User.id)).where(User.role == "admin")
-        )
-        admin_users = admin_users_result.scalar()
-        
-        return {
-            "total_users": total_users,
-            "active_users": active_users,
-            "inactive_users": total_users - active_users,
-            "admin_users": admin_users,
-            "regular_users": total_users - admin_users
-        }
+        return await _load_users_stats(db)
         
     except Exception as e:
         logger.error(f"获取用户统计失败: {e}", exc_info=True)
+        stale_response = _stale_fallback_response(CacheConfig.ADMIN_USERS_STATS_CACHE_PREFIX)
+        if stale_response is not None:
+            return stale_response
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
 
@@ -199,34 +547,39 @@ async def admin_delete_document(
         from app.services.local_storage_service import storage_service
         from app.services.qdrant_service import qdrant_service
         
-        # 1. 查询文档是否存在
+        # 1. 删除数据库记录并返回文件名（查询与删除合并为一次往返，事务提交前可回滚）
         result = await db.execute(
-            select(Document).where(Document.file_id == file_id)
+            delete(Document)
+            .where(Document.file_id == file_id)
+            .returning(Document.filename, Document.user_id)
         )
-        document = result.scalar_one_or_none()
+        deleted = result.one_or_none()
         
-        if not document:
+        if not deleted:
             raise HTTPException(status_code=404, detail="文档不存在")
         
-        # 2. 删除物理文件
-        try:
-            storage_service.delete_file(file_id, document.filename)
+        # 2. 并发删除物理文件和向量数据（两者互不依赖）
+        # 向量数据使用异步 Qdrant 客户端；存储服务为同步 I/O，放到线程池执行
+        file_result, vector_result = await asyncio.gather(
+            asyncio.to_thread(storage_service.delete_file, file_id, deleted.filename),
+            qdrant_service.delete_documents_async(file_id),
+            return_exceptions=True
+        )
+        
+        # 3. 分别记录结果，失败时继续执行，不阻断流程
+        if isinstance(file_result, Exception):
+            logger.error(f"物理文件删除失败: {file_result}")
+        else:
             logger.info(f"物理文件删除成功: {file_id}")
-        except Exception as e:
-            logger.error(f"物理文件删除失败: {e}")
-            # 继续执行，不阻断流程
         
-        # 3. 删除向量数据
-        try:
-            qdrant_service.delete_documents(file_id)
+        if isinstance(vector_result, Exception):
+            logger.error(f"向量数据删除失败: {vector_result}")
+        else:
             logger.info(f"向量数据删除成功: {file_id}")
-        except Exception as e:
-            logger.error(f"向量数据删除失败: {e}")
-            # 继续执行，不阻断流程
         
-        # 4. 删除数据库记录
-        await db.delete(document)
+        # 4. 提交删除
         await db.commit()
+        _invalidate_document_caches()
         
         logger.info(f"管理员 {current_admin.get('user_id')} 成功删除文档 {file_id}")
         return {"message": "文档删除成功", "file_id": file_id}
@@ -250,22 +603,21 @@ async def get_user_detail(
     管理员查看用户详情（包含 Token 使用情况）
     """
     try:
-        from app.db.models import TokenUsage
         from app.models.schemas import AdminUserDetailResponse
         
-        # 查询用户
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
+        # 查询用户并同时汇总已使用的 tokens（单次查询）
+        result = await db.execute(
+            select(User, func.coalesce(func.sum(TokenUsage.total_tokens), 0))
+            .outerjoin(TokenUsage, TokenUsage.user_id == User.id)
+            .where(User.id == user_id)
+            .group_by(User.id)
+        )
+        row = result.one_or_none()
         
-        if not user:
+        if not row:
             raise HTTPException(status_code=404, detail="用户不存在")
         
-        # 计算用户已使用的 tokens
-        tokens_used_result = await db.execute(
-            select(func.sum(TokenUsage.total_tokens))
-            .where(TokenUsage.user_id == user_id)
-        )
-        tokens_used = tokens_used_result.scalar() or 0
+        user, tokens_used = row
         
         # 计算剩余 tokens
         tokens_remaining = max(0, user.token_quota - tokens_used)
@@ -294,7 +646,7 @@ async def get_user_detail(
 async def delete_user(
     request: Request,
     user_id: int,
-    current_admin: dict = Depends(get_current_admin),
+    current_admin: dict = Depends(get_verified_admin),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -303,23 +655,55 @@ async def delete_user(
     注意：会级联删除用户的所有文档、对话、Token 使用记录等
     """
     try:
-        # 查询用户
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            raise HTTPException(status_code=404, detail="用户不存在")
-        
         # 不允许删除管理员自己
         if user_id == current_admin.get('user_id'):
             raise HTTPException(status_code=400, detail="不能删除自己的账号")
         
-        # 删除用户（会级联删除关联数据）
-        await db.delete(user)
+        # 在同一事务中显式删除关联数据：SQLite 默认不启用外键约束，
+        # images.user_id 也没有 ON DELETE CASCADE，不能只依赖数据库级联
+        conversation_ids = select(Conversation.id).where(Conversation.user_id == user_id).scalar_subquery()
+        await db.execute(delete(Message).where(Message.conversation_id.in_(conversation_ids)))
+        await db.execute(delete(Conversation).where(Conversation.user_id == user_id))
+        await db.execute(delete(Document).where(Document.user_id == user_id))
+        await db.execute(delete(TokenUsage).where(TokenUsage.user_id == user_id))
+        
+        image_ids = select(Image.id).where(Image.user_id == user_id).scalar_subquery()
+        await db.execute(delete(image_tag_association).where(image_tag_association.c.image_id.in_(image_ids)))
+        image_result = await db.execute(
+            delete(Image).where(Image.user_id == user_id).returning(Image.storage_path, Image.thumbnail_path)
+        )
+        image_paths = [path for row in image_result for path in row if path]
+        
+        await db.execute(
+            update(RegistrationCode).where(RegistrationCode.created_by == user_id).values(created_by=None)
+        )
+        
+        result = await db.execute(
+            delete(User).where(User.id == user_id).returning(User.email)
+        )
+        email = result.scalar_one_or_none()
+        
+        if email is None:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail="用户不存在")
+        
         await db.commit()
         
-        logger.info(f"管理员 {current_admin.get('user_id')} 成功删除用户 {user_id} ({user.email})")
-        return {"message": "用户删除成功", "user_id": user_id, "email": user.email}
+        # 数据库记录删除成功后再清理图片文件，失败只记录日志
+        for path in image_paths:
+            try:
+                await image_storage_service.delete_file(path)
+            except Exception as e:
+                logger.warning(f"删除用户图片文件失败: {path}, {e}")
+        if image_paths:
+            cache_service.clear(CacheConfig.IMAGE_DETAIL_CACHE_PREFIX)
+        
+        _invalidate_user_caches()
+        invalidate_user_profile_cache(email)
+        _invalidate_document_caches()
+        
+        logger.info(f"管理员 {current_admin.get('user_id')} 成功删除用户 {user_id} ({email})")
+        return {"message": "用户删除成功", "user_id": user_id, "email": email}
         
     except HTTPException:
         raise
@@ -335,7 +719,7 @@ async def update_user_quota(
     request: Request,
     user_id: int,
     quota_update: UserQuotaUpdate,
-    current_admin: dict = Depends(get_current_admin),
+    current_admin: dict = Depends(get_verified_admin),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -354,7 +738,8 @@ async def update_user_quota(
         user.token_quota = quota_update.token_quota
         
         await db.commit()
-        await db.refresh(user)
+        _invalidate_user_caches()
+        invalidate_user_profile_cache(user.email)
         
         logger.info(f"管理员 {current_admin.get('user_id')} 更新用户 {user_id} 的 Token 配额: {old_quota} -> {quota_update.token_quota}")
         
@@ -363,7 +748,7 @@ async def update_user_quota(
             "user_id": user_id,
             "email": user.email,
             "old_quota": old_quota,
-            "new_quota": user.token_quota
+            "new_quota": quota_update.token_quota
         }
         
     except HTTPException:
@@ -378,45 +763,31 @@ async def update_user_quota(
 @limiter.limit(RateLimitConfig.DOCUMENT_RATE_LIMIT)
 async def get_users_token_summary(
     request: Request,
+    limit: int = Query(AdminConfig.DEFAULT_PAGE_SIZE, ge=1, le=AdminConfig.MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, description="上一页返回的 next_cursor（用户 ID）"),
+    user_ids: Optional[str] = Query(None, description="只返回指定用户（逗号分隔的用户 ID），供用户列表按页获取"),
     current_admin: dict = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取所有用户的 Token 使用汇总
+    获取所有用户的 Token 使用汇总（按用户 ID 游标分页）
     """
     try:
-        from app.db.models import TokenUsage
-        
-        # 获取所有用户
-        users_result = await db.execute(select(User))
-        users = users_result.scalars().all()
-        
-        summary = []
-        for user in users:
-            # 计算用户已使用的 tokens
-            tokens_used_result = await db.execute(
-                select(func.sum(TokenUsage.total_tokens))
-                .where(TokenUsage.user_id == user.id)
-            )
-            tokens_used = tokens_used_result.scalar() or 0
-            tokens_remaining = max(0, user.token_quota - tokens_used)
-            
-            summary.append({
-                "user_id": user.id,
-                "email": user.email,
-                "role": user.role,
-                "is_active": user.is_active,
-                "token_quota": user.token_quota,
-                "tokens_used": tokens_used,
-                "tokens_remaining": tokens_remaining,
-                "usage_percentage": round((tokens_used / user.token_quota * 100) if user.token_quota > 0 else 0, 2)
-            })
-        
-        return {
-            "total_users": len(summary),
-            "users": summary
-        }
+        user_id_list = sorted({int(uid) for uid in user_ids.split(",") if uid.strip()}) if user_ids else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的用户 ID 列表")
+    
+    try:
+        return await _load_token_summary(db, limit, cursor, user_id_list)
         
     except Exception as e:
         logger.error(f"获取 Token 使用汇总失败: {e}", exc_info=True)
+        stale_response = _stale_fallback_response(
+            CacheConfig.ADMIN_TOKENS_SUMMARY_CACHE_PREFIX,
+            limit=limit,
+            cursor=cursor,
+            user_ids=user_id_list
+        )
+        if stale_response is not None:
+            return stale_response
         raise HTTPException(status_code=500, detail=f"获取汇总失败: {str(e)}")
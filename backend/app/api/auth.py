@@ -2,40 +2,162 @@
 认证 API 路由
 """
 from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from app.models.schemas import UserLogin, Token, UserCreate, UserResponse
 from app.utils.auth import create_access_token, get_current_user
 from app.db.database import get_db
 from app.db.models import User
 from app.middleware.rate_limit import limiter
-from app.core.constants import RateLimitConfig
-from passlib.context import CryptContext
-from datetime import timedelta
+from app.core.constants import RateLimitConfig, CacheConfig
+from app.services.cache_service import cache_service
+import bcrypt
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
 from app.core.config import settings
+import asyncio
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt 成本因子（由配置决定；哈希中记录了各自的成本，旧哈希仍可直接验证）
+BCRYPT_ROUNDS = settings.BCRYPT_ROUNDS
+
+# bcrypt 计算耗时且会释放 GIL，放到专用线程池执行，避免阻塞事件循环
+# 纯 CPU 计算，线程数超过核心数不会带来额外吞吐，按核心数设置
+BCRYPT_POOL = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="bcrypt"
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """验证密码（直接调用 bcrypt，省去 passlib 的调度开销）"""
+    try:
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    except ValueError:
+        # 哈希格式无效
+        return False
 
 
 def get_password_hash(password: str) -> str:
     """密码哈希"""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """哈希的成本因子与当前配置不一致时需要重新哈希（格式: $2b$<rounds>$...）"""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在线程池中验证密码"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(BCRYPT_POOL, verify_password, plain_password, hashed_password)
+
 
+async def get_password_hash_async(password: str) -> str:
+    """在线程池中计算密码哈希"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(BCRYPT_POOL, get_password_hash, password)
 
-async def get_user_by_account(db: AsyncSession, account: str) -> User | None:
-    """从数据库获取用户（通过账号）"""
-    result = await db.execute(select(User).where(User.email == account))
-    return result.scalar_one_or_none()
+
+# 账号不存在时用于比对的占位哈希（导入时计算一次），使登录耗时与账号是否存在无关
+# 同时记录单次哈希耗时，便于评估成本因子设置
+_hash_started = time.perf_counter()
+_DUMMY_PASSWORD_HASH = get_password_hash(os.urandom(16).hex())
+logger.info(f"bcrypt 成本因子 {BCRYPT_ROUNDS}，单次哈希耗时 {(time.perf_counter() - _hash_started) * 1000:.1f}ms")
+
+
+class UserRecord(NamedTuple):
+    """用户记录的只读快照（列查询结果，不绑定任何会话）"""
+    id: int
+    email: str
+    full_name: Optional[str]
+    hashed_password: str
+    is_active: bool
+    role: str
+    token_quota: int
+    created_at: Optional[datetime]
+
+
+async def get_user_by_account(db: AsyncSession, account: str) -> UserRecord | None:
+    """
+    从数据库获取用户记录（通过账号）
+    
+    不做缓存：登录依赖最新的密码哈希与启用状态，进程内缓存的失效无法到达其他 worker，
+    禁用账号或修改密码后旧凭据会在 TTL 内继续有效
+    """
+    result = await db.execute(
+        select(
+            User.id,
+            User.email,
+            User.full_name,
+            User.hashed_password,
+            User.is_active,
+            User.role,
+            User.token_quota,
+            User.created_at
+        ).where(User.email == account)
+    )
+    row = result.one_or_none()
+    return UserRecord(*row) if row is not None else None
+
+
+def _user_profile_cache_key(account: str, fresh: bool = False) -> str:
+    """用户资料缓存键"""
+    prefix = CacheConfig.USER_PROFILE_FRESH_CACHE_PREFIX if fresh else CacheConfig.USER_PROFILE_CACHE_PREFIX
+    return cache_service.cache_key(prefix, account)
+
+
+async def get_cached_user_profile(db: AsyncSession, account: str, fresh: bool = False) -> dict | None:
+    """
+    获取用户资料（带短 TTL 缓存）
+    
+    Args:
+        fresh: 用于权限校验时为 True，使用与 JWT 校验缓存相同的更短 TTL，
+               Redis 不可用、失效只到达本进程时，角色或禁用状态的变更也能很快生效
+    
+    Returns:
+        用户资料字典，用户不存在时返回 None（不缓存不存在的结果）
+    """
+    cache_key = _user_profile_cache_key(account, fresh)
+    cached_profile = cache_service.get(cache_key)
+    if cached_profile is not None:
+        return cached_profile
+    
+    user = await get_user_by_account(db, account)
+    if not user:
+        return None
+    
+    profile = UserResponse(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        is_active=user.is_active,
+        role=user.role,
+        token_quota=user.token_quota,
+        created_at=user.created_at
+    ).model_dump(mode="json")
+    ttl = CacheConfig.JWT_VERIFY_CACHE_TTL if fresh else CacheConfig.USER_PROFILE_CACHE_TTL
+    cache_service.set(cache_key, profile, ttl=ttl)
+    return profile
+
+
+def invalidate_user_profile_cache(account: str):
+    """用户信息变更后清除其资料缓存"""
+    cache_service.delete(_user_profile_cache_key(account))
+    cache_service.delete(_user_profile_cache_key(account, fresh=True))
 
 
 @router.post("/login", response_model=Token)
@@ -53,7 +175,11 @@ async def login(
     """
     user = await get_user_by_account(db, user_credentials.account)
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    # 账号不存在时同样执行一次 bcrypt 校验，避免通过响应时间枚举账号
+    hashed_password = user.hashed_password if user else _DUMMY_PASSWORD_HASH
+    password_valid = await verify_password_async(user_credentials.password, hashed_password)
+    
+    if not user or not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="账号或密码错误",
@@ -66,6 +192,14 @@ async def login(
             detail="用户已被禁用"
         )
     
+    # 成本因子调整后，在用户登录成功时顺带升级其密码哈希
+    if password_needs_rehash(user.hashed_password):
+        new_hash = await get_password_hash_async(user_credentials.password)
+        await db.execute(
+            update(User).where(User.id == user.id).values(hashed_password=new_hash)
+        )
+        invalidate_user_profile_cache(user_credentials.account)
+    
     access_token_expires = timedelta(hours=settings.JWT_EXPIRATION_HOURS)
     access_token = create_access_token(
         data={"sub": user.email, "user_id": user.id, "role": user.role},
@@ -125,9 +259,10 @@ async def register(
         )
     
     # 创建新用户
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         email=user_data.account,  # 使用 account 字段作为 email
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=hashed_password,
         full_name=None,  # 不再使用 full_name
         is_active=True,
         token_quota=reg_code.tokens_per_registration  # 设置用户的初始 Token 配额
@@ -140,6 +275,7 @@ async def register(
     
     await db.commit()
     await db.refresh(new_user)
+    invalidate_user_profile_cache(new_user.email)
     
     return UserResponse(
         id=new_user.id,
@@ -161,23 +297,16 @@ async def get_current_user_info(
     获取当前用户信息
     """
     account = current_user.get("sub")
-    user = await get_user_by_account(db, account)
+    profile = await get_cached_user_profile(db, account)
     
-    if not user:
+    if not profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="用户不存在"
         )
     
-    return UserResponse(
-        id=user.id,
-        email=user.email,
-        full_name=user.full_name,
-        is_active=user.is_active,
-        role=user.role,
-        token_quota=user.token_quota,
-        created_at=user.created_at
-    )
+    # 缓存的资料已是 JSON 兼容字典，直接用 orjson 输出，跳过 response_model 的再次校验与编码
+    return ORJSONResponse(profile)
 
 
 async def get_current_admin_user(current_user: dict = Depends(get_current_user)):
@@ -3,13 +3,15 @@
 """
 import zipfile
 import csv
+import codecs
+import asyncio
 import io
 import os
-import tempfile
 import uuid
 import logging
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request
 from fastapi.responses import Response
@@ -21,6 +23,8 @@ from app.api.auth import get_current_admin_user
 from app.services.image_storage_service import storage_service
 from app.middleware.rate_limit import limiter
 from app.models.schemas import BatchUploadResponse, BatchUploadResult
+from app.core.constants import FileValidationConfig
+from app.utils.upload_spool import UploadSpool
 from PIL import Image as PILImage
 
 logger = logging.getLogger(__name__)
@@ -30,6 +34,11 @@ router = APIRouter()
 # 配置
 MAX_ZIP_SIZE = 100 * 1024 * 1024  # 100MB
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB per image
+THUMBNAIL_MIN_FILE_SIZE = 100 * 1024  # 小于 100KB 的图片不生成缩略图
+MAX_TOTAL_UNCOMPRESSED_SIZE = 500 * 1024 * 1024  # ZIP 解压后总大小上限 500MB
+MAX_COMPRESSION_RATIO = 100  # 单个条目允许的最大压缩比（防 ZIP 炸弹）
+MAX_CSV_SIZE = 5 * 1024 * 1024  # CSV 元数据文件解压后大小上限 5MB
+BATCH_UPLOAD_CONCURRENCY = 8  # 同时处理的图片数量上限
 ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
 ALLOWED_IMAGE_MIMETYPES = {
     '.jpg': 'image/jpeg',
@@ -39,8 +48,42 @@ ALLOWED_IMAGE_MIMETYPES = {
     '.webp': 'image/webp'
 }
 
+# CSV 模板（导入时编码一次；使用 BOM 确保 Excel 正确显示中文）
+CSV_TEMPLATE_BYTES = """filename,description
+example1.jpg,这是第一张图片的描述，包含关键词方便搜索匹配
+example2.png,这是第二张图片的描述
+example3.webp,产品A展示图，18mm厚度胶合板正面图
+""".encode('utf-8-sig')
+CSV_TEMPLATE_HEADERS = {
+    "Content-Disposition": "attachment; filename=images_template.csv"
+}
 
-def parse_csv_metadata(csv_content: str) -> Dict[str, str]:
+# 缩略图生成（PIL 的 C 实现会释放 GIL）专用线程池，大小与 CPU 核数一致
+IMAGE_PROCESS_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="image-process")
+
+
+def decode_csv_content(csv_content: bytes) -> str:
+    """
+    解码 CSV 内容：先按 BOM 判断编码，否则依次尝试 UTF-8、GBK
+    """
+    if csv_content.startswith(codecs.BOM_UTF8):
+        return csv_content.decode('utf-8-sig')
+    if csv_content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return csv_content.decode('utf-16')
+    
+    try:
+        return csv_content.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    
+    try:
+        # GBK 是 GB2312 的超集
+        return csv_content.decode('gbk')
+    except UnicodeDecodeError:
+        return csv_content.decode('utf-8', errors='ignore')
+
+
+def parse_csv_metadata(csv_content: Union[bytes, str]) -> Dict[str, str]:
     """
     解析 CSV 元数据文件
     
@@ -55,48 +98,38 @@ def parse_csv_metadata(csv_content: str) -> Dict[str, str]:
     metadata = {}
     
     try:
-        # 尝试检测编码
-        for encoding in ['utf-8', 'utf-8-sig', 'gbk', 'gb2312']:
-            try:
-                if isinstance(csv_content, bytes):
-                    content = csv_content.decode(encoding)
-                else:
-                    content = csv_content
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            content = csv_content.decode('utf-8', errors='ignore') if isinstance(csv_content, bytes) else csv_content
+        content = decode_csv_content(csv_content) if isinstance(csv_content, bytes) else csv_content
         
-        reader = csv.DictReader(io.StringIO(content))
+        reader = csv.reader(io.StringIO(content))
         
         # 检查必要的列
-        if reader.fieldnames is None:
+        fieldnames = next(reader, None)
+        if not fieldnames:
             logger.warning("CSV 文件为空或格式错误")
             return metadata
         
         # 支持多种列名格式
-        filename_col = None
-        description_col = None
+        filename_idx = None
+        description_idx = None
         
-        for col in reader.fieldnames:
+        for idx, col in enumerate(fieldnames):
             col_lower = col.lower().strip()
             if col_lower in ['filename', 'file_name', 'file', '文件名', '文件']:
-                filename_col = col
+                filename_idx = idx
             elif col_lower in ['description', 'desc', '描述', '说明']:
-                description_col = col
+                description_idx = idx
         
-        if not filename_col:
-            logger.warning(f"CSV 缺少 filename 列，可用列: {reader.fieldnames}")
+        if filename_idx is None:
+            logger.warning(f"CSV 缺少 filename 列，可用列: {fieldnames}")
             return metadata
         
-        if not description_col:
-            logger.warning(f"CSV 缺少 description 列，可用列: {reader.fieldnames}")
+        if description_idx is None:
+            logger.warning(f"CSV 缺少 description 列，可用列: {fieldnames}")
             return metadata
         
         for row in reader:
-            filename = row.get(filename_col, '').strip()
-            description = row.get(description_col, '').strip()
+            filename = row[filename_idx].strip() if filename_idx < len(row) else ''
+            description = row[description_idx].strip() if description_idx < len(row) else ''
             
             if filename:
                 metadata[filename] = description
@@ -130,17 +163,41 @@ def generate_description_from_filename(filename: str) -> str:
     return name if name else filename
 
 
+def read_zip_entry(zip_file: zipfile.ZipFile, name: str, max_size: int) -> Optional[bytes]:
+    """
+    流式解压 ZIP 条目，超过大小限制时立即停止
+    
+    Returns:
+        Optional[bytes]: 条目内容；超过 max_size 时返回 None
+    """
+    buffer = io.BytesIO()
+    with zip_file.open(name) as entry:
+        while chunk := entry.read(FileValidationConfig.UPLOAD_READ_CHUNK_SIZE):
+            if buffer.tell() + len(chunk) > max_size:
+                return None
+            buffer.write(chunk)
+    return buffer.getvalue()
+
+
 def create_thumbnail(image_data: bytes, max_size: tuple = (400, 400)) -> Optional[bytes]:
     """创建缩略图"""
     try:
+        # 文件本身很小时无需打开图片
+        if len(image_data) < THUMBNAIL_MIN_FILE_SIZE:
+            return None
+        
+        # PIL 延迟解码，这里只解析文件头获取尺寸
         img = PILImage.open(io.BytesIO(image_data))
         original_width, original_height = img.size
         
         # 如果原图足够小，不生成缩略图
-        file_size_kb = len(image_data) / 1024
-        if (original_width <= max_size[0] and original_height <= max_size[1]) or file_size_kb < 100:
+        if original_width <= max_size[0] and original_height <= max_size[1]:
             return None
         
+        # JPEG 在解码阶段直接按比例缩小（libjpeg DCT 缩放），大图解码快得多
+        if img.format == 'JPEG':
+            img.draft('RGB', max_size)
+        
         # 生成缩略图
         img.thumbnail(max_size, PILImage.Resampling.LANCZOS)
         
@@ -182,25 +239,27 @@ async def batch_upload_images(
                 detail="请上传 ZIP 文件"
             )
         
-        # 2. 读取 ZIP 内容
-        zip_content = await file.read()
-        
-        if len(zip_content) > MAX_ZIP_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"ZIP 文件大小不能超过 {MAX_ZIP_SIZE // 1024 // 1024}MB"
-            )
+        # 2. 分块读取 ZIP 到暂存区（小文件留在内存，大文件落盘），超过大小限制立即终止
+        zip_spool = UploadSpool(max_memory=FileValidationConfig.UPLOAD_SPOOL_MAX_MEMORY)
+        while chunk := await file.read(FileValidationConfig.UPLOAD_READ_CHUNK_SIZE):
+            if zip_spool.size + len(chunk) > MAX_ZIP_SIZE:
+                zip_spool.close()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"ZIP 文件大小不能超过 {MAX_ZIP_SIZE // 1024 // 1024}MB"
+                )
+            zip_spool.write(chunk)
         
         # 3. 解析 ZIP
         try:
-            zip_buffer = io.BytesIO(zip_content)
-            with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
-                # 检查是否有损坏
-                bad_file = zip_file.testzip()
-                if bad_file:
+            with zip_spool.open_reader() as zip_reader, zipfile.ZipFile(zip_reader, 'r') as zip_file:
+                # 先按声明的解压大小拦截 ZIP 炸弹；条目头可以伪造，实际解压字节数在流式读取时再限制
+                # （不调用 testzip：它会完整解压所有条目。条目损坏时读取该条目会抛出 BadZipFile，按单张失败处理）
+                total_uncompressed = sum(zi.file_size for zi in zip_file.infolist())
+                if total_uncompressed > MAX_TOTAL_UNCOMPRESSED_SIZE:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"ZIP 文件损坏: {bad_file}"
+                        detail=f"ZIP 解压后总大小不能超过 {MAX_TOTAL_UNCOMPRESSED_SIZE // 1024 // 1024}MB"
                     )
                 
                 # 4. 读取 CSV 元数据（如果存在）
@@ -210,15 +269,23 @@ async def batch_upload_images(
                 if csv_files:
                     csv_filename = csv_files[0]  # 使用第一个 CSV 文件
                     logger.info(f"找到 CSV 元数据文件: {csv_filename}")
-                    csv_content = zip_file.read(csv_filename)
+                    csv_content = read_zip_entry(zip_file, csv_filename, MAX_CSV_SIZE)
+                    if csv_content is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"CSV 元数据文件不能超过 {MAX_CSV_SIZE // 1024 // 1024}MB"
+                        )
                     metadata = parse_csv_metadata(csv_content)
                 else:
                     logger.info("未找到 CSV 元数据文件，将使用文件名作为描述")
                 
-                # 5. 处理所有图片文件
+                # 5. 收集需要处理的图片文件
                 user_id = current_user.get("user_id")
+                image_items = []
                 
-                for item in zip_file.namelist():
+                for zip_info in zip_file.infolist():
+                    item = zip_info.filename
+                    
                     # 跳过目录和非图片文件
                     if item.endswith('/') or item.startswith('__MACOSX'):
                         continue
@@ -231,79 +298,137 @@ async def batch_upload_images(
                         logger.debug(f"跳过非图片文件: {item}")
                         continue
                     
-                    try:
-                        # 读取图片内容
-                        image_data = zip_file.read(item)
-                        
-                        if len(image_data) > MAX_IMAGE_SIZE:
-                            results.append(BatchUploadResult(
-                                filename=pure_filename,
-                                success=False,
-                                error=f"图片大小超过 {MAX_IMAGE_SIZE // 1024 // 1024}MB"
-                            ))
-                            continue
-                        
-                        # 获取描述
-                        description = metadata.get(pure_filename)
-                        if not description:
-                            description = generate_description_from_filename(pure_filename)
-                            logger.info(f"使用文件名生成描述: {pure_filename} -> {description}")
-                        
-                        # 生成文件 ID
-                        file_id = str(uuid.uuid4())
-                        stored_filename = f"{file_id}{file_ext}"
-                        mime_type = ALLOWED_IMAGE_MIMETYPES.get(file_ext, 'image/jpeg')
-                        
-                        # 保存原图
-                        storage_path = await storage_service.save_file(
-                            image_data,
-                            stored_filename,
-                            mime_type
-                        )
-                        
-                        # 创建缩略图（可选）
-                        thumbnail_path = None
-                        thumbnail_data = create_thumbnail(image_data)
-                        if thumbnail_data:
-                            thumbnail_filename = f"{file_id}_thumb.jpg"
-                            thumbnail_path = await storage_service.save_file(
-                                thumbnail_data,
-                                thumbnail_filename,
-                                "image/jpeg"
-                            )
-                        
-                        # 创建数据库记录
-                        new_image = Image(
-                            file_id=file_id,
-                            filename=stored_filename,
-                            original_filename=pure_filename,
-                            file_size=len(image_data),
-                            mime_type=mime_type,
-                            storage_path=storage_path,
-                            thumbnail_path=thumbnail_path,
-                            description=description,
-                            alt_text=description[:500] if description else None,
-                            user_id=user_id
-                        )
-                        
-                        db.add(new_image)
-                        await db.flush()
-                        
+                    # 解压前根据条目头信息拒绝超大或压缩比异常的图片
+                    if zip_info.file_size > MAX_IMAGE_SIZE:
                         results.append(BatchUploadResult(
                             filename=pure_filename,
-                            success=True,
-                            image_id=new_image.id
+                            success=False,
+                            error=f"图片大小超过 {MAX_IMAGE_SIZE // 1024 // 1024}MB"
                         ))
-                        
-                        logger.info(f"成功处理图片: {pure_filename}, ID: {new_image.id}")
-                        
-                    except Exception as e:
-                        logger.error(f"处理图片失败 {item}: {e}")
+                        continue
+                    
+                    if zip_info.file_size / max(zip_info.compress_size, 1) > MAX_COMPRESSION_RATIO:
+                        logger.warning(f"图片压缩比异常，已跳过: {item}")
                         results.append(BatchUploadResult(
                             filename=pure_filename,
                             success=False,
-                            error=str(e)
+                            error="图片压缩比异常"
                         ))
+                        continue
+                    
+                    image_items.append((item, pure_filename, file_ext))
+                
+                # 6. 并发处理图片：条目按顺序解压，缩略图生成放到线程池，保存文件与之重叠，信号量控制并发数
+                loop = asyncio.get_running_loop()
+                semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+                # ZipFile 共享同一个底层文件句柄，内部按锁串行访问，多线程同时 open() 没有并行收益；
+                # 这里显式串行读取条目，只并行处理图片
+                zip_read_lock = asyncio.Lock()
+                decompressed_total = 0  # 实际解压的字节数（不信任条目头中声明的大小）
+                
+                async def process_one(item: str, pure_filename: str, file_ext: str) -> Union[Image, BatchUploadResult]:
+                    """处理单张图片，成功返回待入库的 Image，失败返回失败结果"""
+                    nonlocal decompressed_total
+                    async with semaphore:
+                        try:
+                            async with zip_read_lock:
+                                # 流式读取图片内容，超过大小限制时不再继续解压（在线程中执行，不阻塞事件循环）
+                                image_data = await asyncio.to_thread(
+                                    read_zip_entry, zip_file, item, MAX_IMAGE_SIZE
+                                )
+                                
+                                if image_data is None:
+                                    return BatchUploadResult(
+                                        filename=pure_filename,
+                                        success=False,
+                                        error=f"图片大小超过 {MAX_IMAGE_SIZE // 1024 // 1024}MB"
+                                    )
+                                
+                                decompressed_total += len(image_data)
+                                if decompressed_total > MAX_TOTAL_UNCOMPRESSED_SIZE:
+                                    return BatchUploadResult(
+                                        filename=pure_filename,
+                                        success=False,
+                                        error=f"ZIP 解压后总大小超过 {MAX_TOTAL_UNCOMPRESSED_SIZE // 1024 // 1024}MB"
+                                    )
+                            
+                            # 获取描述
+                            description = metadata.get(pure_filename)
+                            if not description:
+                                description = generate_description_from_filename(pure_filename)
+                                logger.info(f"使用文件名生成描述: {pure_filename} -> {description}")
+                            
+                            # 生成文件 ID
+                            file_id = str(uuid.uuid4())
+                            stored_filename = f"{file_id}{file_ext}"
+                            mime_type = ALLOWED_IMAGE_MIMETYPES.get(file_ext, 'image/jpeg')
+                            
+                            # 原图立即开始保存，同时在线程池中创建缩略图（小图直接跳过，不占用线程池、不构造 PIL 对象）
+                            save_original = asyncio.create_task(
+                                storage_service.save_file(image_data, stored_filename, mime_type)
+                            )
+                            thumbnail_data = None
+                            if len(image_data) >= THUMBNAIL_MIN_FILE_SIZE:
+                                thumbnail_data = await loop.run_in_executor(
+                                    IMAGE_PROCESS_POOL, create_thumbnail, image_data
+                                )
+                            
+                            # 原图与缩略图并发保存
+                            thumbnail_path = None
+                            if thumbnail_data:
+                                storage_path, thumbnail_path = await asyncio.gather(
+                                    save_original,
+                                    storage_service.save_file(
+                                        thumbnail_data,
+                                        f"{file_id}_thumb.jpg",
+                                        "image/jpeg"
+                                    )
+                                )
+                            else:
+                                storage_path = await save_original
+                            
+                            return Image(
+                                file_id=file_id,
+                                filename=stored_filename,
+                                original_filename=pure_filename,
+                                file_size=len(image_data),
+                                mime_type=mime_type,
+                                storage_path=storage_path,
+                                thumbnail_path=thumbnail_path,
+                                description=description,
+                                alt_text=description[:500] if description else None,
+                                user_id=user_id
+                            )
+                            
+                        except Exception as e:
+                            logger.error(f"处理图片失败 {item}: {e}")
+                            return BatchUploadResult(
+                                filename=pure_filename,
+                                success=False,
+                                error=str(e)
+                            )
+                
+                outcomes = await asyncio.gather(
+                    *(process_one(item, pure_filename, file_ext) for item, pure_filename, file_ext in image_items)
+                )
+                
+                # 7. 一次性批量写入数据库记录（同一个 Session 不能并发使用，统一 flush 获取自增 ID）
+                pending_images = [outcome for outcome in outcomes if isinstance(outcome, Image)]
+                if pending_images:
+                    db.add_all(pending_images)
+                    await db.flush()
+                
+                for (_, pure_filename, _), outcome in zip(image_items, outcomes):
+                    if isinstance(outcome, BatchUploadResult):
+                        results.append(outcome)
+                        continue
+                    
+                    results.append(BatchUploadResult(
+                        filename=pure_filename,
+                        success=True,
+                        image_id=outcome.id
+                    ))
+                    logger.info(f"成功处理图片: {pure_filename}, ID: {outcome.id}")
                 
                 # 提交所有更改
                 await db.commit()
@@ -313,8 +438,10 @@ async def batch_upload_images(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="无效的 ZIP 文件"
             )
+        finally:
+            zip_spool.close()
         
-        # 6. 统计结果
+        # 8. 统计结果
         success_count = sum(1 for r in results if r.success)
         failed_count = len(results) - success_count
         
@@ -343,16 +470,8 @@ async def download_csv_template():
     """
     下载 CSV 模板文件
     """
-    template_content = """filename,description
-example1.jpg,这是第一张图片的描述，包含关键词方便搜索匹配
-example2.png,这是第二张图片的描述
-example3.webp,产品A展示图，18mm厚度胶合板正面图
-"""
-    
     return Response(
-        content=template_content.encode('utf-8-sig'),  # 使用 BOM 确保 Excel 正确显示中文
+        content=CSV_TEMPLATE_BYTES,
         media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=images_template.csv"
-        }
+        headers=CSV_TEMPLATE_HEADERS
     )
@@ -1,11 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, delete
 from app.models.schemas import ChatRequest
 from app.utils.auth import get_current_user
 from app.utils.language_detector import detect_language
-from app.db.database import get_db
+from app.db.database import get_db, AsyncSessionLocal
 from app.db.models import Conversation, Message
 from app.services.openai_service import openai_service
 from app.services.qdrant_service import qdrant_service
@@ -13,27 +13,262 @@ from app.services.token_usage_service import token_usage_service
 from app.services.cleanup_service import cleanup_old_conversations_for_user
 from app.services.image_retrieval_service import image_retrieval_service
 from app.services.document_retrieval_service import document_retrieval_service
+from app.services.cache_service import cache_service
 from app.middleware.rate_limit import limiter
-from app.core.constants import RateLimitConfig, TokenLimitConfig, SearchConfig, ProcessingConfig, ConversationConfig
+from app.core.constants import RateLimitConfig, TokenLimitConfig, SearchConfig, ProcessingConfig, ConversationConfig, AIConfig, CacheConfig
 from app.core.config import settings
-from typing import List
+from typing import List, Dict, Optional, Tuple
+from itertools import islice
+import asyncio
 import logging
 import uuid
-import json
+import orjson
 
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# 回答来源：最多返回的条数与每条内容预览长度
+MAX_SOURCES = 2
+SOURCE_PREVIEW_LENGTH = 200
+
+
+def truncate_text(text: str, max_length: int) -> str:
+    """超过长度时截断并追加省略号"""
+    return text if len(text) <= max_length else text[:max_length] + "..."
+
+
+# SSE 帧前后缀（预先编码为字节）
+SSE_FRAME_PREFIX = b"data: "
+SSE_FRAME_SUFFIX = b"\n\n"
+
+
+def sse_event(payload: Dict) -> bytes:
+    """序列化为一条 SSE 事件（orjson 直接输出 UTF-8 字节，比 json.dumps 快）"""
+    return b"".join((SSE_FRAME_PREFIX, orjson.dumps(payload), SSE_FRAME_SUFFIX))
+
+
+# 流式内容帧只有 content 变化，预编码固定部分，逐 token 只序列化字符串
+SSE_CONTENT_PREFIX = b'data: {"content":'
+SSE_CONTENT_SUFFIX = b',"done":false}\n\n'
+
+
+def sse_content_event(content: str) -> bytes:
+    """序列化一条流式内容 SSE 事件（等价于 sse_event({'content': content, 'done': False})）"""
+    return SSE_CONTENT_PREFIX + orjson.dumps(content) + SSE_CONTENT_SUFFIX
+
+
+# 按缓存键加锁，相同问题并发到达时只检索一次（防缓存击穿）
+# 同时记录每个键上持有或等待锁的请求数，归零时才移除锁，避免等待者未醒时新请求拿到另一把锁
+_retrieval_locks: Dict[str, asyncio.Lock] = {}
+_retrieval_lock_users: Dict[str, int] = {}
+
+
+async def _search_relevant_docs(question: str, question_embedding: List[float]) -> List[Dict]:
+    """按问题长度选择检索参数进行向量检索，无结果时使用降低阈值的检索结果"""
+    question_length = len(question.strip())
+    if question_length <= 10:
+        limit = 5
+        score_threshold = 0.6
+    elif question_length <= 50:
+        limit = 8
+        score_threshold = 0.55
+    elif question_length <= SearchConfig.SHORT_QUERY_THRESHOLD:
+        limit = SearchConfig.SHORT_QUERY_LIMIT
+        score_threshold = SearchConfig.SHORT_QUERY_THRESHOLD_SCORE
+    else:
+        limit = SearchConfig.NORMAL_QUERY_LIMIT
+        score_threshold = SearchConfig.NORMAL_QUERY_THRESHOLD_SCORE
+    
+    # 严格检索与降级检索合并为一次 search_batch 请求，严格检索无结果时直接使用降级结果
+    search_results = await qdrant_service.search_batch_async(
+        query_embedding=question_embedding,
+        searches=[
+            (limit, score_threshold),
+            (SearchConfig.FALLBACK_LIMIT, SearchConfig.FALLBACK_THRESHOLD_SCORE)
+        ],
+        query_text=question
+    )
+    
+    for relevant_docs in search_results:
+        if relevant_docs:
+            relevant_docs = openai_service.optimize_context_for_speed(
+                documents=relevant_docs,
+                max_tokens=2500
+            )
+        if relevant_docs:
+            return relevant_docs
+    
+    return []
+
+
+async def retrieve_relevant_docs(question: str) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    获取问题的相关文档上下文（带短期缓存）
+    
+    相同问题（去除首尾空白、忽略大小写）在缓存有效期内直接返回上次的检索结果，
+    不再调用 OpenAI embedding 与 Qdrant。
+    
+    Returns:
+        (相关文档列表, embedding token 使用量) 元组；命中缓存时 token 使用量为 None
+    """
+    # 未启用缓存时加锁没有意义，直接检索
+    if not CacheConfig.ENABLE_CACHE:
+        relevant_docs, embedding_token_usage = await _embed_and_search(question)
+        return relevant_docs or [], embedding_token_usage
+    
+    cache_key = cache_service.cache_key(CacheConfig.RETRIEVAL_CACHE_PREFIX, question.strip().lower())
+    cached_docs = cache_service.get(cache_key)
+    if cached_docs is not None:
+        return cached_docs, None
+    
+    lock = _retrieval_locks.setdefault(cache_key, asyncio.Lock())
+    _retrieval_lock_users[cache_key] = _retrieval_lock_users.get(cache_key, 0) + 1
+    try:
+        async with lock:
+            # 等待锁期间其他请求可能已完成检索
+            cached_docs = cache_service.get(cache_key)
+            if cached_docs is not None:
+                return cached_docs, None
+            
+            relevant_docs, embedding_token_usage = await _embed_and_search(question)
+            # 检索失败时返回空列表，不缓存
+            if relevant_docs is None:
+                return [], embedding_token_usage
+            
+            cache_service.set(cache_key, relevant_docs, ttl=CacheConfig.RETRIEVAL_CACHE_TTL)
+            return relevant_docs, embedding_token_usage
+    finally:
+        _retrieval_lock_users[cache_key] -= 1
+        if _retrieval_lock_users[cache_key] == 0:
+            del _retrieval_lock_users[cache_key]
+            _retrieval_locks.pop(cache_key, None)
+
+
+async def _embed_and_search(question: str) -> Tuple[Optional[List[Dict]], Optional[Dict]]:
+    """生成问题 embedding 并检索相关文档（检索失败时文档列表为 None）"""
+    question_embeddings, embedding_token_usage = await openai_service.agenerate_embeddings([question])
+    
+    try:
+        relevant_docs = await _search_relevant_docs(question, question_embeddings[0])
+    except Exception as e:
+        logger.warning(f"向量检索失败: {e}")
+        return None, embedding_token_usage
+    
+    return relevant_docs, embedding_token_usage
+
+
+async def get_user_conversation(
+    db: AsyncSession,
+    conversation_id_str: str,
+    user_id: int
+) -> Optional[Tuple[int, Optional[str]]]:
+    """
+    查找当前用户的对话，返回 (主键, 标题)；对话不存在时返回 None
+
+    只查询需要的列（主键、所属用户、标题），不加载完整 ORM 对象
+
+    Raises:
+        HTTPException: 对话属于其他用户（404，不向调用方暴露该对话是否存在）
+    """
+    result = await db.execute(
+        select(Conversation.id, Conversation.user_id, Conversation.title)
+        .where(Conversation.conversation_id == conversation_id_str)
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    if row.user_id != user_id:
+        raise HTTPException(status_code=404, detail="对话不存在")
+    return row.id, row.title
+
+
+async def persist_assistant_message(
+    user_id: int,
+    conversation_pk: int,
+    conversation_id_str: str,
+    conversation_title: Optional[str],
+    question: str,
+    full_answer: str,
+    sources_json: Optional[bytes],
+    token_usage: Optional[Dict]
+):
+    """
+    保存流式回答（助手消息、对话标题、消息/对话清理、token 使用量）
+    
+    作为后台任务在响应结束后执行，不占用流式响应的连接
+    """
+    # 请求的数据库会话在开始生成前已提交释放连接，这里单独打开一个短期会话
+    async with AsyncSessionLocal() as save_db:
+        try:
+            assistant_message = Message(
+                conversation_id=conversation_pk,
+                role="assistant",
+                content=full_answer,
+                sources=sources_json.decode() if sources_json else None
+            )
+            save_db.add(assistant_message)
+            
+            if not conversation_title and question:
+                await save_db.execute(
+                    update(Conversation)
+                    .where(Conversation.id == conversation_pk)
+                    .values(title=question[:50])
+                )
+            
+            await save_db.commit()
+            
+            # 清理当前对话中过多的消息
+            if ConversationConfig.ENABLE_MESSAGE_LIMIT:
+                try:
+                    # 超出保留条数的最旧消息用一条 DELETE ... WHERE 删除，不逐条加载
+                    stale_ids = (
+                        select(Message.id)
+                        .where(Message.conversation_id == conversation_pk)
+                        .order_by(Message.created_at.desc())
+                        .offset(ConversationConfig.MAX_MESSAGES_PER_CONVERSATION)
+                        .scalar_subquery()
+                    )
+                    deleted = await save_db.execute(delete(Message).where(Message.id.in_(stale_ids)))
+                    
+                    if deleted.rowcount:
+                        await save_db.commit()
+                        logger.info(f"对话 {conversation_id_str} 自动清理了 {deleted.rowcount} 条旧消息")
+                except Exception as cleanup_error:
+                    logger.warning(f"清理对话消息失败: {cleanup_error}")
+                    # 清理失败不影响主流程
+            
+            # 清理用户超过最大数量的旧对话（只保留最近10个）
+            # 在保存完消息后清理，确保新对话已经保存
+            if user_id:
+                await cleanup_old_conversations_for_user(save_db, user_id)
+                await save_db.commit()
+            
+            if token_usage:
+                await token_usage_service.record_usage(
+                    db=save_db,
+                    user_id=user_id,
+                    prompt_tokens=token_usage.get('prompt_tokens', 0),
+                    completion_tokens=token_usage.get('completion_tokens', 0),
+                    endpoint="chat/stream"
+                )
+        except Exception as e:
+            logger.error(f"保存流式响应到数据库失败: {e}", exc_info=True)
+            await save_db.rollback()
+
 
 @router.post("/stream")
 @limiter.limit(RateLimitConfig.CHAT_RATE_LIMIT)
 async def stream_answer(
     request: Request,
     chat_request: ChatRequest,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
+    retrieval_task = None
+    
     try:
         user_id = current_user.get("user_id")
         
@@ -49,36 +284,43 @@ async def stream_answer(
                     status_code=429,
                     detail=error_msg or TokenLimitConfig.TOKEN_LIMIT_EXCEEDED_MESSAGE
                 )
+        
+        # 额度检查通过后立即开始检索（embedding 网络请求不依赖数据库），与下面的对话记录读写并发执行；
+        # 放在额度检查之后，被拒绝的请求不会产生 embedding 调用费用
+        retrieval_task = asyncio.create_task(retrieve_relevant_docs(chat_request.question))
+        
         conversation_id_str = chat_request.conversation_id or str(uuid.uuid4())
         
-        conversation = None
+        conversation_pk = None
+        conversation_title = None
         if conversation_id_str and user_id:
-            result = await db.execute(
-                select(Conversation).where(Conversation.conversation_id == conversation_id_str)
-            )
-            conversation = result.scalar_one_or_none()
-        
-        if not conversation and user_id:
-            conversation = Conversation(
-                conversation_id=conversation_id_str,
-                user_id=user_id,
-                title=chat_request.question[:50] if chat_request.question else None
-            )
-            db.add(conversation)
-            await db.flush()
+            existing = await get_user_conversation(db, conversation_id_str, user_id)
+            if existing:
+                conversation_pk, conversation_title = existing
         
         if user_id:
             user_message = Message(
-                conversation_id=conversation.id if conversation else None,
                 role="user",
                 content=chat_request.question
             )
-            db.add(user_message)
-            await db.flush()
+            
+            if conversation_pk is None:
+                # 新对话：通过关系挂上用户消息，一次 flush 按依赖顺序写入两条记录
+                conversation = Conversation(
+                    conversation_id=conversation_id_str,
+                    user_id=user_id,
+                    title=chat_request.question[:50] if chat_request.question else None
+                )
+                user_message.conversation = conversation
+                db.add_all([conversation, user_message])
+                await db.flush()
+                conversation_pk, conversation_title = conversation.id, conversation.title
+            else:
+                # 已有对话：用户消息随后续提交一并写入，无需单独 flush
+                user_message.conversation_id = conversation_pk
+                db.add(user_message)
         
-        embedding_token_usage_stream = None
-        question_embeddings, embedding_token_usage_stream = openai_service.generate_embeddings([chat_request.question])
-        question_embedding = question_embeddings[0]
+        relevant_docs, embedding_token_usage_stream = await retrieval_task
         
         if user_id and embedding_token_usage_stream:
             await token_usage_service.record_usage(
@@ -89,53 +331,6 @@ async def stream_answer(
                 endpoint="chat/stream/embedding"
             )
         
-        from app.core.constants import QdrantConfig, SearchConfig, ProcessingConfig, AIConfig
-        
-        relevant_docs = []
-        try:
-            question_length = len(chat_request.question.strip())
-            if question_length <= 10:
-                limit = 5
-                score_threshold = 0.6
-            elif question_length <= 50:
-                limit = 8
-                score_threshold = 0.55
-            elif question_length <= SearchConfig.SHORT_QUERY_THRESHOLD:
-                limit = SearchConfig.SHORT_QUERY_LIMIT
-                score_threshold = SearchConfig.SHORT_QUERY_THRESHOLD_SCORE
-            else:
-                limit = SearchConfig.NORMAL_QUERY_LIMIT
-                score_threshold = SearchConfig.NORMAL_QUERY_THRESHOLD_SCORE
-            
-            relevant_docs = qdrant_service.search(
-                query_embedding=question_embedding,
-                limit=limit,
-                score_threshold=score_threshold,
-                query_text=chat_request.question
-            )
-            
-            if relevant_docs:
-                relevant_docs = openai_service.optimize_context_for_speed(
-                    documents=relevant_docs,
-                    max_tokens=2500
-            )
-            
-            if not relevant_docs:
-                relevant_docs = qdrant_service.search(
-                    query_embedding=question_embedding,
-                    limit=SearchConfig.FALLBACK_LIMIT,
-                    score_threshold=SearchConfig.FALLBACK_THRESHOLD_SCORE,
-                    query_text=chat_request.question
-                )
-                if relevant_docs:
-                    relevant_docs = openai_service.optimize_context_for_speed(
-                        documents=relevant_docs,
-                        max_tokens=2500
-                )
-        except Exception as e:
-            logger.warning(f"向量检索失败: {e}")
-        
-        
         full_answer = ""
         sources = []
         images = []  # 相关图片列表
@@ -196,7 +391,7 @@ async def stream_answer(
                     else:
                         error_msg = f"找到相关文档：{doc_titles}。点击预览或下载。"
                     full_answer = error_msg
-                    yield f"data: {json.dumps({'content': error_msg, 'done': True, 'documents': documents, 'images': images, 'conversation_id': conversation_id_str}, ensure_ascii=False)}\n\n"
+                    yield sse_event({'content': error_msg, 'done': True, 'documents': documents, 'images': images, 'conversation_id': conversation_id_str})
                     return
                 elif images:
                     # 如果找到图片且用户在询问照片，则不显示任何文字，只返回图片
@@ -216,7 +411,7 @@ async def stream_answer(
                         error_msg = "抱歉，知识库中没有找到相关信息。请先上传相关文档到知识库。"
                 
                 full_answer = error_msg
-                yield f"data: {json.dumps({'content': error_msg, 'done': True, 'documents': documents, 'images': images, 'conversation_id': conversation_id_str}, ensure_ascii=False)}\n\n"
+                yield sse_event({'content': error_msg, 'done': True, 'documents': documents, 'images': images, 'conversation_id': conversation_id_str})
                 return
             
             try:
@@ -228,16 +423,21 @@ async def stream_answer(
                     has_images=len(images) > 0  # 告知AI是否有图片
                 )
                 
+                # 先收集片段，结束后一次拼接，避免逐 token 字符串累加的重复拷贝
+                answer_parts: List[str] = []
                 async for chunk_data in stream_gen:
                     chunk_content, chunk_token_usage = chunk_data
                     if chunk_content is not None:
-                        full_answer += chunk_content
-                        yield f"data: {json.dumps({'content': chunk_content, 'done': False}, ensure_ascii=False)}\n\n"
+                        answer_parts.append(chunk_content)
+                        yield sse_content_event(chunk_content)
                     elif chunk_token_usage is not None:
                         token_usage = chunk_token_usage
+                full_answer = "".join(answer_parts)
                 
                 if token_usage is None:
-                    estimated_prompt = len(chat_request.question + str(relevant_docs)) // 3
+                    # 仅用于估算：直接累加各文档内容长度，避免把整个检索结果转成字符串
+                    context_length = sum(len(doc.get("content", "")) for doc in relevant_docs)
+                    estimated_prompt = (len(chat_request.question) + context_length) // 3
                     estimated_completion = len(full_answer) // 3
                     token_usage = {
                         'prompt_tokens': estimated_prompt,
@@ -249,80 +449,45 @@ async def stream_answer(
                 logger.error(f"流式生成失败: {e}", exc_info=True)
                 error_msg = f"生成回答时出错: {str(e)}"
                 full_answer = error_msg
-                yield f"data: {json.dumps({'content': error_msg, 'done': True, 'error': True}, ensure_ascii=False)}\n\n"
+                yield sse_event({'content': error_msg, 'done': True, 'error': True})
                 return
             
+            # 按文件去重取前 MAX_SOURCES 个来源，取满立即结束，不再扫描剩余文档
             seen_filenames = set()
-            for doc in relevant_docs[:ProcessingConfig.MAX_CONTEXT_DOCS]:
+            for doc in islice(relevant_docs, ProcessingConfig.MAX_CONTEXT_DOCS):
                 metadata = doc.get("metadata", {})
                 filename = metadata.get("filename", "未知文档")
                 
-                if filename not in seen_filenames and len(sources) < 2:
+                if filename not in seen_filenames:
                     seen_filenames.add(filename)
                     sources.append({
-                        "content": doc["content"][:200] + "..." if len(doc["content"]) > 200 else doc["content"],
+                        "content": truncate_text(doc["content"], SOURCE_PREVIEW_LENGTH),
                         "metadata": metadata
                     })
+                    if len(sources) >= MAX_SOURCES:
+                        break
             
-            yield f"data: {json.dumps({'content': '', 'done': True, 'sources': sources, 'documents': documents, 'images': images, 'conversation_id': conversation_id_str}, ensure_ascii=False)}\n\n"
+            # sources 只序列化一次：SSE 帧中以 Fragment 原样嵌入，入库时直接使用同一份 JSON
+            sources_json = orjson.dumps(sources)
+            yield sse_event({'content': '', 'done': True, 'sources': orjson.Fragment(sources_json), 'documents': documents, 'images': images, 'conversation_id': conversation_id_str})
 
             
-            if user_id and conversation and full_answer:
-                try:
-                    assistant_message = Message(
-                        conversation_id=conversation.id,
-                        role="assistant",
-                        content=full_answer,
-                        sources=json.dumps(sources, ensure_ascii=False) if sources else None
-                    )
-                    db.add(assistant_message)
-                    
-                    if not conversation.title and chat_request.question:
-                        conversation.title = chat_request.question[:50]
-                    
-                    await db.commit()
-                    
-                    # 清理当前对话中过多的消息
-                    if ConversationConfig.ENABLE_MESSAGE_LIMIT:
-                        try:
-                            # 获取当前对话的所有消息，按时间降序
-                            messages_result = await db.execute(
-                                select(Message)
-                                .where(Message.conversation_id == conversation.id)
-                                .order_by(Message.created_at.desc())
-                            )
-                            all_messages = messages_result.scalars().all()
-                            
-                            # 如果消息数量超过限制，删除最旧的消息
-                            if len(all_messages) > ConversationConfig.MAX_MESSAGES_PER_CONVERSATION:
-                                messages_to_delete = all_messages[ConversationConfig.MAX_MESSAGES_PER_CONVERSATION:]
-                                
-                                for msg in messages_to_delete:
-                                    await db.delete(msg)
-                                
-                                await db.commit()
-                                logger.info(f"对话 {conversation.conversation_id} 自动清理了 {len(messages_to_delete)} 条旧消息")
-                        except Exception as cleanup_error:
-                            logger.warning(f"清理对话消息失败: {cleanup_error}")
-                            # 清理失败不影响主流程
-                    
-                    # 清理用户超过最大数量的旧对话（只保留最近10个）
-                    # 在保存完消息后清理，确保新对话已经保存
-                    if user_id:
-                        await cleanup_old_conversations_for_user(db, user_id)
-                        await db.commit()
-                    
-                    if token_usage:
-                        await token_usage_service.record_usage(
-                            db=db,
-                            user_id=user_id,
-                            prompt_tokens=token_usage.get('prompt_tokens', 0),
-                            completion_tokens=token_usage.get('completion_tokens', 0),
-                            endpoint="chat/stream"
-                        )
-                except Exception as e:
-                    logger.error(f"保存流式响应到数据库失败: {e}", exc_info=True)
-                    await db.rollback()
+            if user_id and conversation_pk is not None and full_answer:
+                # 回答入库在响应结束后由后台任务完成，最后一帧发出后连接即可释放
+                background_tasks.add_task(
+                    persist_assistant_message,
+                    user_id=user_id,
+                    conversation_pk=conversation_pk,
+                    conversation_id_str=conversation_id_str,
+                    conversation_title=conversation_title,
+                    question=chat_request.question,
+                    full_answer=full_answer,
+                    sources_json=sources_json if sources else None,
+                    token_usage=token_usage
+                )
+        
+        # 提交用户消息等写入并归还连接，避免整个流式生成期间占用连接池
+        await db.commit()
         
         return StreamingResponse(
             generate(),
@@ -334,7 +499,14 @@ async def stream_answer(
             }
         )
     
+    except HTTPException:
+        if retrieval_task:
+            retrieval_task.cancel()
+        raise
     except Exception as e:
+        # 提前失败时取消尚未完成的检索
+        if retrieval_task:
+            retrieval_task.cancel()
         logger.error(f"流式问答失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"处理请求时出错: {str(e)}")
 
@@ -2,6 +2,7 @@
 对话管理 API 路由
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from app.models.schemas import ConversationResponse, MessageResponse
@@ -29,39 +30,53 @@ async def list_conversations(
         if not user_id:
             raise HTTPException(status_code=401, detail="无法获取用户ID")
         
-        # 获取所有对话，按更新时间降序
-        result = await db.execute(
+        # 按更新时间降序（由 (user_id, updated_at DESC) 索引支撑）
+        query = (
             select(Conversation)
             .where(Conversation.user_id == user_id)
             .order_by(Conversation.updated_at.desc())
         )
-        conversations = result.scalars().all()
         
         # 自动清理：只保留最新的对话
-        if ConversationConfig.ENABLE_AUTO_CLEANUP and len(conversations) > ConversationConfig.MAX_CONVERSATIONS_PER_USER:
-            # 获取需要删除的旧对话
-            conversations_to_delete = conversations[ConversationConfig.MAX_CONVERSATIONS_PER_USER:]
-            
-            # 删除旧对话（会级联删除相关消息）
-            for conv in conversations_to_delete:
-                await db.delete(conv)
+        if ConversationConfig.ENABLE_AUTO_CLEANUP:
+            max_conversations = ConversationConfig.MAX_CONVERSATIONS_PER_USER
             
-            await db.commit()
-            logger.info(f"用户 {user_id} 自动清理了 {len(conversations_to_delete)} 个旧对话")
+            # 只取最新的 N + 1 个，多取的一条用于判断是否存在需要清理的旧对话
+            result = await db.execute(query.limit(max_conversations + 1))
+            conversations = result.scalars().all()
             
-            # 只保留最新的对话
-            conversations = conversations[:ConversationConfig.MAX_CONVERSATIONS_PER_USER]
+            if len(conversations) > max_conversations:
+                conversations = conversations[:max_conversations]
+                
+                # 批量删除保留范围之外的旧对话及其消息（DELETE ... WHERE，而非逐条删除）
+                # 先显式删除消息：PostgreSQL 外键已是 ON DELETE CASCADE，但 SQLite 默认不启用外键约束
+                keep_ids = [conv.id for conv in conversations]
+                stale_ids = (
+                    select(Conversation.id)
+                    .where(Conversation.user_id == user_id, Conversation.id.notin_(keep_ids))
+                    .scalar_subquery()
+                )
+                await db.execute(delete(Message).where(Message.conversation_id.in_(stale_ids)))
+                deleted = await db.execute(
+                    delete(Conversation).where(Conversation.user_id == user_id, Conversation.id.notin_(keep_ids))
+                )
+                
+                await db.commit()
+                logger.info(f"用户 {user_id} 自动清理了 {deleted.rowcount} 个旧对话")
+        else:
+            result = await db.execute(query)
+            conversations = result.scalars().all()
         
-        return [
-            ConversationResponse(
-                id=conv.id,
-                conversation_id=conv.conversation_id,
-                title=conv.title,
-                created_at=conv.created_at,
-                updated_at=conv.updated_at
-            )
+        return ORJSONResponse([
+            {
+                "id": conv.id,
+                "conversation_id": conv.conversation_id,
+                "title": conv.title,
+                "created_at": conv.created_at,
+                "updated_at": conv.updated_at
+            }
             for conv in conversations
-        ]
+        ])
     except HTTPException:
         raise
     except Exception as e:
@@ -83,34 +98,39 @@ async def get_conversation_messages(
         if not user_id:
             raise HTTPException(status_code=401, detail="无法获取用户ID")
         
-        result = await db.execute(
-            select(Conversation).where(
+        # 联表一次查询完成归属校验与消息读取
+        messages_result = await db.execute(
+            select(Message)
+            .join(Conversation, Message.conversation_id == Conversation.id)
+            .where(
                 Conversation.conversation_id == conversation_id,
                 Conversation.user_id == user_id
             )
-        )
-        conversation = result.scalar_one_or_none()
-        
-        if not conversation:
-            raise HTTPException(status_code=404, detail="对话不存在")
-        
-        messages_result = await db.execute(
-            select(Message)
-            .where(Message.conversation_id == conversation.id)
             .order_by(Message.created_at)
         )
         messages = messages_result.scalars().all()
         
-        return [
-            MessageResponse(
-                id=msg.id,
-                role=msg.role,
-                content=msg.content,
-                sources=msg.sources,
-                created_at=msg.created_at
+        # 没有消息时再区分“对话不存在”与“空对话”
+        if not messages:
+            exists_result = await db.execute(
+                select(Conversation.id).where(
+                    Conversation.conversation_id == conversation_id,
+                    Conversation.user_id == user_id
+                )
             )
+            if exists_result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=404, detail="对话不存在")
+        
+        return ORJSONResponse([
+            {
+                "id": msg.id,
+                "role": msg.role,
+                "content": msg.content,
+                "sources": msg.sources,
+                "created_at": msg.created_at
+            }
             for msg in messages
-        ]
+        ])
     except HTTPException:
         raise
     except Exception as e:
@@ -132,18 +152,22 @@ async def delete_conversation(
         if not user_id:
             raise HTTPException(status_code=401, detail="无法获取用户ID")
         
+        # 单条 DELETE ... RETURNING 同时完成归属校验与删除，不加载 ORM 对象
         result = await db.execute(
-            select(Conversation).where(
+            delete(Conversation)
+            .where(
                 Conversation.conversation_id == conversation_id,
                 Conversation.user_id == user_id
             )
+            .returning(Conversation.id)
         )
-        conversation = result.scalar_one_or_none()
+        conversation_pk = result.scalar_one_or_none()
         
-        if not conversation:
+        if conversation_pk is None:
             raise HTTPException(status_code=404, detail="对话不存在")
         
-        await db.delete(conversation)
+        # PostgreSQL 外键已级联删除消息；SQLite 默认不启用外键约束，显式清理
+        await db.execute(delete(Message).where(Message.conversation_id == conversation_pk))
         await db.commit()
         
         return {"message": "对话删除成功", "conversation_id": conversation_id}
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Request
-from fastapi.responses import Response, StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Request, Query, BackgroundTasks
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models.schemas import DocumentUpload, DocumentMetadata
+from sqlalchemy import select, insert, update, delete, null, or_, and_
+from app.models.schemas import DocumentUpload, DocumentPage
 from app.utils.auth import get_current_user
-from app.db.database import get_db
+from app.db.database import get_db, AsyncSessionLocal
 from app.db.models import Document, User
 from app.services.local_storage_service import storage_service
 from app.services.openai_service import openai_service
@@ -14,24 +14,198 @@ from app.services.document_analysis_service import document_analysis_service
 from app.utils.document_parser import DocumentParser
 from app.utils.file_validator import validate_file, validate_file_size
 from app.utils.sanitizer import InputSanitizer
+from app.utils.ttl_cache import TTLCache
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.upload_spool import UploadSpool
+from app.utils.http_cache import parse_byte_range, document_cache_headers, is_not_modified
 from app.middleware.rate_limit import limiter
-from app.core.constants import RateLimitConfig
+from app.core.constants import RateLimitConfig, FileValidationConfig, AIConfig, DocumentParserConfig, DocumentListConfig, CacheConfig
 from app.core.config import settings
-from typing import List
+from typing import BinaryIO, Dict, List, Optional, Tuple
 from datetime import datetime
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import os
 import uuid
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 parser = DocumentParser()
 
+# 文本预览缓存：解码后的文本，按 file_id 缓存
+_text_preview_cache = TTLCache(
+    maxsize=CacheConfig.TEXT_PREVIEW_CACHE_MAXSIZE,
+    ttl=CacheConfig.TEXT_PREVIEW_CACHE_TTL
+)
+
+# 文档解析 / 切块为 CPU 密集操作，线程数与核心数一致
+DOCUMENT_PARSE_POOL = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="document-parse"
+)
+
+
+def parse_and_chunk(file_obj: BinaryIO, file_extension: str) -> Tuple[List[str], List[Dict]]:
+    """
+    解析文档并切块（同步，在线程池中执行）
+    
+    Returns:
+        (文本块列表, 块元数据列表) 元组；仅 Markdown 有结构化元数据
+    """
+    # 二进制格式直接从临时文件解析；纯文本格式读出字节后解码
+    if file_extension == '.pdf':
+        texts = parser.parse_pdf(file_obj)
+    elif file_extension in ['.docx', '.doc']:
+        texts = parser.parse_docx(file_obj)
+    elif file_extension in ['.xlsx', '.xls']:
+        texts = parser.parse_excel(file_obj)
+    elif file_extension == '.txt':
+        texts = parser.parse_text(file_obj.read())
+    elif file_extension == '.md':
+        # Markdown 使用结构化解析
+        sections = parser.parse_markdown(file_obj.read())
+        return parser.chunk_markdown(
+            sections,
+            chunk_size=DocumentParserConfig.DEFAULT_CHUNK_SIZE,
+            overlap=DocumentParserConfig.DEFAULT_OVERLAP
+        )
+    else:
+        raise HTTPException(status_code=400, detail=f"不支持的文件格式: {file_extension}")
+    
+    # 对于非 Markdown 文件，使用通用切块
+    chunks = parser.chunk_text(
+        texts, 
+        chunk_size=DocumentParserConfig.DEFAULT_CHUNK_SIZE, 
+        overlap=DocumentParserConfig.DEFAULT_OVERLAP
+    )
+    return chunks, []
+
+
+async def store_upload(spool: UploadSpool, filename: str, content_type: Optional[str]) -> str:
+    """将暂存内容写入存储服务（S3 为分片上传），在线程中执行"""
+    with spool.open_reader() as reader:
+        return await asyncio.to_thread(
+            storage_service.upload_file,
+            file_obj=reader,
+            filename=filename,
+            content_type=content_type
+        )
+
+
+async def discard_upload(file_id: str, filename: str):
+    """处理失败时清理已保存的文件与已写入的向量点（尽力而为，失败只记录日志）"""
+    results = await asyncio.gather(
+        asyncio.to_thread(storage_service.delete_file, file_id, filename),
+        qdrant_service.delete_file_points_async(file_id),
+        return_exceptions=True
+    )
+    for stage_result in results:
+        if isinstance(stage_result, BaseException):
+            logger.warning(f"清理失败上传的数据时出错: {file_id}, {stage_result}")
+
+
+async def parse_upload(spool: UploadSpool, file_extension: str) -> Tuple[List[str], List[Dict]]:
+    """解析并切块暂存内容（CPU 密集，在专用线程池执行）"""
+    loop = asyncio.get_running_loop()
+    with spool.open_reader() as reader:
+        return await loop.run_in_executor(DOCUMENT_PARSE_POOL, parse_and_chunk, reader, file_extension)
+
+
+async def embed_and_index(texts: List[str], metadata_list: List[Dict]) -> Optional[Dict]:
+    """
+    分组生成 embedding 并写入 Qdrant（生产者-消费者流水线）
+    
+    每组按 AIConfig 的批大小与并发数生成向量后放入队列，由写入任务异步 upsert，
+    上一组写入 Qdrant 的同时生成下一组 embedding。
+    
+    Returns:
+        累计的 embedding token 使用量
+    """
+    group_size = AIConfig.EMBEDDING_BATCH_SIZE * AIConfig.EMBEDDING_BATCH_CONCURRENCY
+    queue: asyncio.Queue = asyncio.Queue(maxsize=AIConfig.EMBEDDING_PIPELINE_QUEUE_SIZE)
+    index_errors: List[Exception] = []
+    
+    stopped = False
+    
+    async def index_worker():
+        # 写入失败或生产者出错后继续取空队列，避免生产者阻塞在 put 上
+        while (item := await queue.get()) is not None:
+            if index_errors or stopped:
+                continue
+            start, embeddings = item
+            end = start + len(embeddings)
+            try:
+                # 写入 WAL 后即返回，不等待索引构建
+                await asyncio.to_thread(
+                    qdrant_service.add_documents,
+                    texts=texts[start:end],
+                    embeddings=embeddings,
+                    metadata=metadata_list[start:end],
+                    wait=False
+                )
+            except Exception as e:
+                index_errors.append(e)
+    
+    worker = asyncio.create_task(index_worker())
+    token_usage = None
+    try:
+        for start in range(0, len(texts), group_size):
+            if index_errors:
+                break
+            embeddings, usage = await openai_service.agenerate_embeddings_batched(texts[start:start + group_size])
+            if usage:
+                if token_usage is None:
+                    token_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+                for key in token_usage:
+                    token_usage[key] += usage.get(key, 0)
+            await queue.put((start, embeddings))
+        await queue.put(None)
+        await worker
+    except Exception:
+        # embedding 失败：等待进行中的写入结束再抛出，保证调用方清理向量点时不会再有新点写入
+        stopped = True
+        if not worker.done():
+            await queue.put(None)
+            await worker
+        raise
+    finally:
+        worker.cancel()
+    
+    if index_errors:
+        raise index_errors[0]
+    return token_usage
+
+
+async def analyze_and_update_document(file_id: str, filename: str, content_preview: str):
+    """
+    智能文档分析：提取标题、摘要、关键词并写回文档记录（上传响应返回后在后台执行）
+    
+    写回之前 doc_metadata 为空，智能文档检索暂时跳过该文档
+    """
+    try:
+        doc_metadata = await asyncio.to_thread(
+            document_analysis_service.analyze_document,
+            filename=filename,
+            content_preview=content_preview
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Document)
+                .where(Document.file_id == file_id)
+                .values(doc_metadata=doc_metadata)
+            )
+            await db.commit()
+        logger.info(f"文档分析结果: {file_id}, 标题: {doc_metadata.get('title')}")
+    except Exception as e:
+        logger.error(f"文档分析失败: {file_id}, {e}", exc_info=True)
+
 
 @router.post("/upload", response_model=DocumentUpload)
 @limiter.limit(RateLimitConfig.UPLOAD_RATE_LIMIT)
 async def upload_document(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
@@ -49,123 +223,166 @@ async def upload_document(
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"文件名验证失败: {str(e)}")
         
-        file_content = await file.read()
-        file_size = len(file_content)
-        
-        validate_file_size(file_size)
-        
-        from io import BytesIO
-        file_obj = BytesIO(file_content)
-        file_id = storage_service.upload_file(
-            file_obj=file_obj,
-            filename=filename,
-            content_type=file.content_type
-        )
-        
-        texts = []
-        chunk_metadata = []
-        
-        if file_extension == '.pdf':
-            texts = parser.parse_pdf(file_content)
-        elif file_extension in ['.docx', '.doc']:
-            texts = parser.parse_docx(file_content)
-        elif file_extension in ['.xlsx', '.xls']:
-            texts = parser.parse_excel(file_content)
-        elif file_extension == '.txt':
-            texts = parser.parse_text(file_content)
-        elif file_extension == '.md':
-            # Markdown 使用结构化解析
-            sections = parser.parse_markdown(file_content)
-            from app.core.constants import DocumentParserConfig
-            chunks, chunk_metadata = parser.chunk_markdown(
-                sections,
-                chunk_size=DocumentParserConfig.DEFAULT_CHUNK_SIZE,
-                overlap=DocumentParserConfig.DEFAULT_OVERLAP
-            )
-            texts = None  # 标记已处理
-        else:
-            raise HTTPException(status_code=400, detail=f"不支持的文件格式: {file_extension}")
-        
-        # 对于非 Markdown 文件，使用通用切块
-        if texts is not None:
-            from app.core.constants import DocumentParserConfig
-            chunks = parser.chunk_text(
-                texts, 
-                chunk_size=DocumentParserConfig.DEFAULT_CHUNK_SIZE, 
-                overlap=DocumentParserConfig.DEFAULT_OVERLAP
-            )
-        
-        embeddings, embedding_token_usage = openai_service.generate_embeddings(chunks)
-        
-        if user_id and embedding_token_usage:
-            await token_usage_service.record_usage(
-                db=db,
-                user_id=user_id,
-                prompt_tokens=embedding_token_usage.get('prompt_tokens', 0),
-                completion_tokens=embedding_token_usage.get('completion_tokens', 0),
-                endpoint="documents/upload/embedding"
-            )
-        
-        # 构建元数据
-        metadata_list = []
-        for i in range(len(chunks)):
-            base_metadata = {
-                "file_id": file_id,
-                "filename": filename,
-                "source": filename,  # 添加 source 字段便于过滤
-                "file_type": file.content_type,
-                "file_size": file_size,
-                "chunk_index": i,
-                "upload_time": datetime.utcnow().isoformat()
-            }
+        # 分块读取上传内容（小文件留在内存，大文件落盘）并计算内容哈希，超过大小限制立即终止
+        spool = UploadSpool(max_memory=FileValidationConfig.UPLOAD_SPOOL_MAX_MEMORY)
+        try:
+            while chunk := await file.read(FileValidationConfig.UPLOAD_READ_CHUNK_SIZE):
+                spool.write(chunk)
+                if spool.size > FileValidationConfig.MAX_FILE_SIZE:
+                    validate_file_size(spool.size)
             
-            # 如果是 Markdown，添加结构化信息
-            if chunk_metadata and i < len(chunk_metadata):
-                base_metadata.update({
-                    "heading": chunk_metadata[i].get("heading", ""),
-                    "heading_level": chunk_metadata[i].get("level", 0),
-                    "section_path": chunk_metadata[i].get("section_path", ""),
-                    "section_chunk_index": chunk_metadata[i].get("section_chunk_index", 0)
-                })
+            file_size = spool.size
+            validate_file_size(file_size)
+            content_hash = spool.sha256()
             
-            metadata_list.append(base_metadata)
-        
-        qdrant_service.add_documents(
-            texts=chunks,
-            embeddings=embeddings,
-            metadata=metadata_list
-        )
-        
-        # 智能文档分析：提取标题、摘要、关键词
-        content_preview = "\n".join(chunks[:5]) if chunks else ""  # 取前5个chunk作为内容预览
-        doc_metadata = document_analysis_service.analyze_document(
-            filename=filename,
-            content_preview=content_preview
-        )
-        logger.info(f"文档分析结果: {doc_metadata.get('title')}")
-        
-        db_document = Document(
-            file_id=file_id,
-            filename=filename,
-            file_type=file.content_type,
-            file_size=file_size,
-            user_id=user_id,
-            status="completed",
-            chunks_count=len(chunks),
-            doc_metadata=doc_metadata  # 存储 AI 分析结果
-        )
-        
-        db.add(db_document)
-        await db.commit()
-        await db.refresh(db_document)
+            # 该用户此前已处理过相同内容：只保存文件，向量点从已有文档复制，跳过解析与 embedding
+            # （按用户隔离，避免 AI 分析结果等在用户之间共享）
+            reusable = (await db.execute(
+                select(Document.file_id, Document.doc_metadata)
+                .where(
+                    Document.user_id == user_id,
+                    Document.content_hash == content_hash,
+                    Document.status == "completed",
+                    Document.chunks_count > 0
+                )
+                .order_by(Document.created_at.desc())
+                .limit(1)
+            )).first()
+            
+            file_id = None
+            chunks_count = 0
+            content_preview = None
+            if reusable:
+                file_id = await store_upload(spool, filename, file.content_type)
+                try:
+                    chunks_count = await asyncio.to_thread(
+                        qdrant_service.copy_file_points,
+                        source_file_id=reusable.file_id,
+                        payload_updates={
+                            "file_id": file_id,
+                            "filename": filename,
+                            "source": filename,
+                            "file_type": file.content_type,
+                            "file_size": file_size,
+                            "upload_time": datetime.utcnow().isoformat()
+                        },
+                        wait=False
+                    )
+                    doc_metadata = reusable.doc_metadata
+                    if chunks_count and doc_metadata is None:
+                        # 源文档的后台分析尚未完成或已失败：解析内容预览，为副本单独安排分析
+                        chunks, _ = await parse_upload(spool, file_extension)
+                        content_preview = "\n".join(chunks[:5])
+                except Exception:
+                    await discard_upload(file_id, filename)
+                    raise
+            
+            if not chunks_count:
+                if file_id is None:
+                    # 存储上传与解析切块互不依赖，各用独立读句柄并行执行
+                    upload_result, parse_result = await asyncio.gather(
+                        store_upload(spool, filename, file.content_type),
+                        parse_upload(spool, file_extension),
+                        return_exceptions=True
+                    )
+                    # 两个阶段都结束后再抛出异常；解析失败时删除已保存的文件
+                    if isinstance(parse_result, BaseException):
+                        if not isinstance(upload_result, BaseException):
+                            await discard_upload(upload_result, filename)
+                        raise parse_result
+                    if isinstance(upload_result, BaseException):
+                        raise upload_result
+                    file_id = upload_result
+                    chunks, chunk_metadata = parse_result
+                else:
+                    # 源文档的向量已不存在，回退到完整处理流程
+                    try:
+                        chunks, chunk_metadata = await parse_upload(spool, file_extension)
+                    except Exception:
+                        await discard_upload(file_id, filename)
+                        raise
+        finally:
+            spool.close()
+        
+        # 从这里开始向量点可能已部分写入、文件已保存；任何失败都清理掉，避免没有文档记录的点出现在检索结果中且无法删除
+        try:
+            if chunks_count:
+                logger.info(f"文档内容与 {reusable.file_id} 相同，复用已有向量: {chunks_count} 个")
+                if content_preview is not None:
+                    background_tasks.add_task(analyze_and_update_document, file_id, filename, content_preview)
+            else:
+                # 构建元数据：文档级字段只构建一次，每个块浅拷贝后补充块级字段
+                base_metadata = {
+                    "file_id": file_id,
+                    "filename": filename,
+                    "source": filename,  # 添加 source 字段便于过滤
+                    "file_type": file.content_type,
+                    "file_size": file_size,
+                    "upload_time": datetime.utcnow().isoformat()
+                }
+                metadata_list = []
+                for i in range(len(chunks)):
+                    chunk_meta = base_metadata.copy()
+                    chunk_meta["chunk_index"] = i
+                    
+                    # 如果是 Markdown，添加结构化信息
+                    if i < len(chunk_metadata):
+                        section = chunk_metadata[i]
+                        chunk_meta["heading"] = section.get("heading", "")
+                        chunk_meta["heading_level"] = section.get("level", 0)
+                        chunk_meta["section_path"] = section.get("section_path", "")
+                        chunk_meta["section_chunk_index"] = section.get("section_chunk_index", 0)
+                    
+                    metadata_list.append(chunk_meta)
+                
+                # embedding 生成与 Qdrant 写入流水线执行
+                embedding_token_usage = await embed_and_index(chunks, metadata_list)
+                
+                if user_id and embedding_token_usage:
+                    await token_usage_service.record_usage(
+                        db=db,
+                        user_id=user_id,
+                        prompt_tokens=embedding_token_usage.get('prompt_tokens', 0),
+                        completion_tokens=embedding_token_usage.get('completion_tokens', 0),
+                        endpoint="documents/upload/embedding"
+                    )
+                
+                # 智能文档分析（LLM 调用）在响应返回后于后台执行，分析结果稍后写回
+                content_preview = "\n".join(chunks[:5]) if chunks else ""  # 取前5个chunk作为内容预览
+                background_tasks.add_task(analyze_and_update_document, file_id, filename, content_preview)
+                doc_metadata = None
+                chunks_count = len(chunks)
+            
+            # INSERT ... RETURNING 直接取回数据库生成的上传时间，无需提交后再 refresh 查询一次
+            result = await db.execute(
+                insert(Document)
+                .values(
+                    file_id=file_id,
+                    filename=filename,
+                    file_type=file.content_type,
+                    file_size=file_size,
+                    user_id=user_id,
+                    status="completed",
+                    chunks_count=chunks_count,
+                    content_hash=content_hash,
+                    doc_metadata=doc_metadata if doc_metadata is not None else null()  # AI 分析结果，后台分析完成前为空
+                )
+                .returning(Document.created_at)
+            )
+            upload_time = result.scalar_one()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await discard_upload(file_id, filename)
+            raise
         
-        logger.info(f"文档处理完成: {file_id}, 块数: {len(chunks)}, 标题: {doc_metadata.get('title')}")
+        logger.info(f"文档处理完成: {file_id}, 块数: {chunks_count}")
         
         return DocumentUpload(
             file_id=file_id,
             filename=filename,
             file_size=file_size,
-            upload_time=db_document.created_at,
+            upload_time=upload_time,
             status="completed"
         )
     
@@ -179,49 +396,200 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=f"文档处理失败: {str(e)}")
 
 
-@router.get("/list", response_model=List[DocumentMetadata])
+@router.get("/list", response_model=DocumentPage)
 @limiter.limit(RateLimitConfig.DOCUMENT_RATE_LIMIT)
 async def list_documents(
     request: Request,
+    limit: int = Query(DocumentListConfig.DEFAULT_PAGE_SIZE, ge=1, le=DocumentListConfig.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor（created_at|file_id）"),
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    获取当前用户的文档列表（按上传时间倒序，游标分页）
+    
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的 next_cursor，为空时从最新文档开始
+    """
     try:
         user_id = current_user.get("user_id")
         
-        result = await db.execute(
-            select(Document)
+        # 只查询需要的列，不加载 ORM 对象与 doc_metadata 等大字段
+        stmt = (
+            select(
+                Document.file_id,
+                Document.filename,
+                Document.file_type,
+                Document.file_size,
+                Document.created_at,
+                Document.chunks_count,
+                Document.status
+            )
             .where(Document.user_id == user_id)
-            .order_by(Document.created_at.desc())
+            .order_by(Document.created_at.desc(), Document.file_id.desc())
+            .limit(limit)
         )
-        documents = result.scalars().all()
+        if cursor:
+            # file_id 作为同一时间戳下的次级排序，避免在页边界跳过记录
+            cursor_time, cursor_file_id = decode_cursor(cursor)
+            stmt = stmt.where(
+                or_(
+                    Document.created_at < cursor_time,
+                    and_(Document.created_at == cursor_time, Document.file_id < cursor_file_id)
+                )
+            )
+        result = await db.execute(stmt)
+        rows = result.all()
         
+        # 直接构建字典由 orjson 输出，跳过逐行 Pydantic 校验
         result_list = [
-            DocumentMetadata(
-                file_id=doc.file_id,
-                filename=doc.filename,
-                file_type=doc.file_type,
-                file_size=doc.file_size,
-                upload_time=doc.created_at,
-                chunks_count=doc.chunks_count,
-                status=doc.status
-            )
-            for doc in documents
+            {
+                "file_id": row.file_id,
+                "filename": row.filename,
+                "file_type": row.file_type,
+                "file_size": row.file_size,
+                "upload_time": row.created_at,
+                "chunks_count": row.chunks_count,
+                "status": row.status,
+                "user_id": None
+            }
+            for row in rows
         ]
         
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].file_id) if len(rows) == limit else None
+        
         logger.info(f"返回 {len(result_list)} 个文档")
-        return result_list
+        return ORJSONResponse({"items": result_list, "next_cursor": next_cursor})
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取文档列表失败: {e}", exc_info=True)
         if settings.MODE == "development":
             logger.warning("获取文档列表失败，返回空列表")
-            return []
+            return {"items": [], "next_cursor": None}
         raise HTTPException(status_code=500, detail=f"获取文档列表失败: {str(e)}")
 
 
+async def stream_document_file(
+    request: Request,
+    document: Document,
+    media_type: str,
+    disposition: str,
+    extra_headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """
+    分块流式返回文档文件，支持单段 Range 请求（浏览器预览 PDF 时可按需拉取）
+    
+    文件读取在线程池中迭代，不把整个文件读入内存
+    """
+    headers = {
+        'Content-Disposition': f'{disposition}; filename="{document.filename}"',
+        'Accept-Ranges': 'bytes',
+        **document_cache_headers(document),
+        **(extra_headers or {})
+    }
+    
+    byte_range = None
+    range_header = request.headers.get('range')
+    if range_header:
+        file_size = await asyncio.to_thread(storage_service.get_file_size, document.file_id, document.filename)
+        if file_size > 0:
+            try:
+                byte_range = parse_byte_range(range_header, file_size)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=416,
+                    detail=str(e),
+                    headers={'Content-Range': f'bytes */{file_size}'}
+                )
+    
+    start, end = byte_range or (0, None)
+    try:
+        chunks, file_size = await asyncio.to_thread(
+            storage_service.open_file_stream, document.file_id, document.filename, start, end
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    if byte_range:
+        headers['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+        headers['Content-Length'] = str(end - start + 1)
+    else:
+        headers['Content-Length'] = str(file_size)
+    
+    return StreamingResponse(
+        chunks,
+        status_code=206 if byte_range else 200,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+async def preview_pdf(request: Request, document: Document, file_extension: str, cache_headers: Dict[str, str]):
+    """PDF 预览：浏览器内嵌显示，支持 Range 请求"""
+    # 文档属于单个用户，只允许浏览器私有缓存，共享代理不得缓存
+    return await stream_document_file(
+        request,
+        document,
+        media_type='application/pdf',
+        disposition='inline',
+        extra_headers={**cache_headers, 'Cache-Control': 'private, max-age=3600'}
+    )
+
+
+async def preview_text(request: Request, document: Document, file_extension: str, cache_headers: Dict[str, str]):
+    """文本 / Markdown 预览：解码为 UTF-8 文本返回"""
+    text_content = _text_preview_cache.get(document.file_id)
+    if text_content is None:
+        # 文本预览需要整体解码（文本文件通常较小），读取放到线程中执行
+        try:
+            file_content = await asyncio.to_thread(storage_service.download_file, document.file_id, document.filename)
+        except (ValueError, FileNotFoundError) as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        
+        text_content = parser.decode_text(file_content)
+        
+        if len(file_content) <= CacheConfig.TEXT_PREVIEW_CACHE_MAX_BYTES:
+            _text_preview_cache.set(document.file_id, text_content)
+    
+    return Response(
+        content=text_content,
+        media_type=TEXT_PREVIEW_MEDIA_TYPES[file_extension],
+        headers={
+            'Content-Disposition': f'inline; filename="{document.filename}"',
+            **cache_headers
+        }
+    )
+
+
+async def preview_attachment(request: Request, document: Document, file_extension: str, cache_headers: Dict[str, str]):
+    """其他格式无法在线预览，作为附件下载"""
+    return await stream_document_file(
+        request,
+        document,
+        media_type=document.file_type or 'application/octet-stream',
+        disposition='attachment'
+    )
+
+
+TEXT_PREVIEW_MEDIA_TYPES = {
+    '.txt': 'text/plain; charset=utf-8',
+    '.md': 'text/markdown; charset=utf-8',
+}
+
+# 预览方式按扩展名分派，未列出的格式作为附件下载
+PREVIEW_HANDLERS = {
+    '.pdf': preview_pdf,
+    '.txt': preview_text,
+    '.md': preview_text,
+}
+
+
 @router.get("/{file_id}/preview")
 async def preview_document(
+    request: Request,
     file_id: str,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
@@ -245,47 +613,14 @@ async def preview_document(
         if not document:
             raise HTTPException(status_code=404, detail="文档不存在")
         
-        try:
-            file_content = storage_service.download_file(file_id, document.filename)
-        except ValueError as e:
-            raise HTTPException(status_code=404, detail=str(e))
-        
-        file_extension = document.filename.split('.')[-1].lower() if '.' in document.filename else ''
+        # 客户端已缓存同一文件时直接返回 304，不再读取与传输文件内容
+        cache_headers = document_cache_headers(document)
+        if is_not_modified(request, cache_headers['ETag']):
+            return Response(status_code=304, headers=cache_headers)
         
-        if file_extension == 'pdf':
-            return Response(
-                content=file_content,
-                media_type='application/pdf',
-                headers={
-                    'Content-Disposition': f'inline; filename="{document.filename}"',
-                    'Cache-Control': 'public, max-age=3600'
-                }
-            )
-        elif file_extension in ['txt', 'md']:
-            try:
-                text_content = file_content.decode('utf-8')
-            except UnicodeDecodeError:
-                try:
-                    text_content = file_content.decode('gbk')
-                except:
-                    text_content = file_content.decode('utf-8', errors='ignore')
-            
-            media_type = 'text/markdown; charset=utf-8' if file_extension == 'md' else 'text/plain; charset=utf-8'
-            return Response(
-                content=text_content,
-                media_type=media_type,
-                headers={
-                    'Content-Disposition': f'inline; filename="{document.filename}"'
-                }
-            )
-        else:
-            return Response(
-                content=file_content,
-                media_type=document.file_type or 'application/octet-stream',
-                headers={
-                    'Content-Disposition': f'attachment; filename="{document.filename}"'
-                }
-            )
+        file_extension = os.path.splitext(document.filename)[1].lower()
+        handler = PREVIEW_HANDLERS.get(file_extension, preview_attachment)
+        return await handler(request, document, file_extension, cache_headers)
             
     except HTTPException:
         raise
@@ -296,6 +631,7 @@ async def preview_document(
 
 @router.get("/{file_id}/download")
 async def download_document(
+    request: Request,
     file_id: str,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
@@ -319,17 +655,15 @@ async def download_document(
         if not document:
             raise HTTPException(status_code=404, detail="文档不存在")
         
-        try:
-            file_content = storage_service.download_file(file_id, document.filename)
-        except ValueError as e:
-            raise HTTPException(status_code=404, detail=str(e))
+        cache_headers = document_cache_headers(document)
+        if is_not_modified(request, cache_headers['ETag']):
+            return Response(status_code=304, headers=cache_headers)
         
-        return Response(
-            content=file_content,
+        return await stream_document_file(
+            request,
+            document,
             media_type=document.file_type or 'application/octet-stream',
-            headers={
-                'Content-Disposition': f'attachment; filename="{document.filename}"'
-            }
+            disposition='attachment'
         )
             
     except HTTPException:
@@ -349,37 +683,42 @@ async def delete_document(
     try:
         user_id = current_user.get("user_id")
         
-        # 1. 查询文档是否存在且属于当前用户
+        # 1. 删除属于当前用户的数据库记录并返回文件名（查询与删除合并为一次往返，事务提交前可回滚）
         result = await db.execute(
-            select(Document).where(
+            delete(Document)
+            .where(
                 Document.file_id == file_id,
                 Document.user_id == user_id
             )
+            .returning(Document.filename)
         )
-        document = result.scalar_one_or_none()
+        deleted = result.one_or_none()
         
-        if not document:
+        if not deleted:
             raise HTTPException(status_code=404, detail="文档不存在")
         
-        # 2. 删除物理文件
-        try:
-            storage_service.delete_file(file_id, document.filename)
+        # 2. 并发删除物理文件和向量数据（两者互不依赖）
+        # 向量数据使用异步 Qdrant 客户端（file_id 已建 payload 索引）；存储服务为同步 I/O，放到线程池执行
+        file_result, vector_result = await asyncio.gather(
+            asyncio.to_thread(storage_service.delete_file, file_id, deleted.filename),
+            qdrant_service.delete_documents_async(file_id),
+            return_exceptions=True
+        )
+        
+        # 3. 分别记录结果，失败时继续执行，不阻断流程
+        if isinstance(file_result, Exception):
+            logger.error(f"物理文件删除失败: {file_result}")
+        else:
             logger.info(f"物理文件删除成功: {file_id}")
-        except Exception as e:
-            logger.error(f"物理文件删除失败: {e}")
-            # 继续执行，不阻断流程
         
-        # 3. 删除向量数据
-        try:
-            qdrant_service.delete_documents(file_id)
+        if isinstance(vector_result, Exception):
+            logger.error(f"向量数据删除失败: {vector_result}")
+        else:
             logger.info(f"向量数据删除成功: {file_id}")
-        except Exception as e:
-            logger.error(f"向量数据删除失败: {e}")
-            # 继续执行，不阻断流程
         
-        # 4. 删除数据库记录
-        await db.delete(document)
+        # 4. 提交删除
         await db.commit()
+        _text_preview_cache.pop(file_id)
         
         logger.info(f"用户 {user_id} 成功删除文档 {file_id}")
         return {"message": "文档删除成功", "file_id": file_id}
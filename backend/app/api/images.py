@@ -2,10 +2,11 @@
 图片管理 API
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse, ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete
-from typing import List, Optional
+from sqlalchemy import select, func, delete, insert, literal
+from sqlalchemy.orm import selectinload
+from typing import BinaryIO, List, Optional
 from app.db.database import get_db
 from app.db.models import User, Image, ImageTag, image_tag_association
 from app.models.schemas import (
@@ -13,11 +14,15 @@ from app.models.schemas import (
     ImageTagCreate, ImageTagResponse, ImageListResponse
 )
 from app.api.auth import get_current_user, get_current_admin_user
+from app.utils.upload_spool import UploadSpool
+from app.utils.http_cache import is_not_modified
 from app.services.image_storage_service import storage_service
+from app.services.cache_service import cache_service
 
 from app.middleware.rate_limit import limiter
 from fastapi import Request
-from app.core.constants import ImageConfig
+from app.core.constants import ImageConfig, FileValidationConfig, CacheConfig
+import asyncio
 import uuid
 import logging
 from datetime import datetime
@@ -27,8 +32,19 @@ import io
 
 logger = logging.getLogger(__name__)
 
+# libvips 可选：流式解码+缩放，内存占用和耗时都远低于 Pillow；未安装时回退到 Pillow
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None
+
 router = APIRouter()
 
+
+def image_detail_cache_key(image_id: int) -> str:
+    """图片详情缓存键"""
+    return f"{CacheConfig.IMAGE_DETAIL_CACHE_PREFIX}:{image_id}"
+
 # 支持的图片格式
 ALLOWED_IMAGE_TYPES = {
     "image/jpeg": [".jpg", ".jpeg"],
@@ -38,6 +54,7 @@ ALLOWED_IMAGE_TYPES = {
 }
 
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024  # 1MB
 
 
 def validate_image_file(file: UploadFile) -> None:
@@ -59,11 +76,42 @@ def validate_image_file(file: UploadFile) -> None:
         )
 
 
+async def spool_image_upload(file: UploadFile) -> UploadSpool:
+    """分块读取上传图片到暂存区（小图留在内存，大图落盘），超过大小限制立即终止"""
+    spool = UploadSpool(max_memory=FileValidationConfig.UPLOAD_SPOOL_MAX_MEMORY)
+    try:
+        while chunk := await file.read(UPLOAD_READ_CHUNK_SIZE):
+            spool.write(chunk)
+            if spool.size > MAX_IMAGE_SIZE:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"图片大小不能超过 {MAX_IMAGE_SIZE // 1024 // 1024}MB"
+                )
+    except BaseException:
+        spool.close()
+        raise
+    return spool
 
-def create_thumbnail(image_data: bytes, max_size: tuple = None) -> tuple[bytes, dict]:
+
+async def save_spooled_image(spool: UploadSpool, filename: str, content_type: Optional[str]) -> str:
+    """将暂存的图片写入存储服务"""
+    with spool.open_reader() as reader:
+        return await storage_service.save_fileobj(reader, filename, content_type)
+
+
+def create_spooled_thumbnail(spool: UploadSpool) -> tuple[bytes, dict]:
+    """从暂存的图片生成缩略图（同步，在线程中执行）"""
+    with spool.open_reader() as reader:
+        return create_thumbnail(reader, spool.size)
+
+
+
+def create_thumbnail(image_file: BinaryIO, file_size: int, max_size: tuple = None) -> tuple[bytes, dict]:
     """
     创建缩略图（智能优化）
     
+    image_file 为可 seek 的图片文件对象，file_size 为其字节数
+    
     返回: (thumbnail_data, info_dict)
         - thumbnail_data: 缩略图字节数据，如果不需要生成则返回 None
         - info_dict: 包含原图信息 {'width': int, 'height': int, 'needs_thumbnail': bool}
@@ -72,11 +120,21 @@ def create_thumbnail(image_data: bytes, max_size: tuple = None) -> tuple[bytes,
         max_size = ImageConfig.THUMBNAIL_MAX_SIZE
     
     try:
-        img = PILImage.open(io.BytesIO(image_data))
-        original_width, original_height = img.size
+        file_size_kb = file_size / 1024
+        
+        # 智能模式下小文件不生成缩略图，无需打开图片
+        if ImageConfig.ENABLE_SMART_THUMBNAIL and file_size_kb <= ImageConfig.THUMBNAIL_SIZE_THRESHOLD_KB:
+            logger.info(f"原图大小 {file_size_kb:.2f}KB, 无需生成缩略图")
+            return None, {
+                'width': None,
+                'height': None,
+                'needs_thumbnail': False,
+                'original_size_kb': round(file_size_kb, 2)
+            }
         
-        # 智能判断是否需要生成缩略图
-        file_size_kb = len(image_data) / 1024
+        # PIL 延迟解码，这里只解析文件头获取尺寸；确定需要缩略图后才解码像素
+        img = PILImage.open(image_file)
+        original_width, original_height = img.size
         
         # 根据配置决定是否启用智能缩略图
         if ImageConfig.ENABLE_SMART_THUMBNAIL:
@@ -102,6 +160,25 @@ def create_thumbnail(image_data: bytes, max_size: tuple = None) -> tuple[bytes,
             logger.info(f"原图尺寸 {original_width}x{original_height}, 大小 {file_size_kb:.2f}KB, 无需生成缩略图")
             return None, info
         
+        if pyvips is not None:
+            try:
+                image_file.seek(0)
+                thumb = pyvips.Image.thumbnail_buffer(image_file.read(), max_size[0], height=max_size[1], size='down')
+                if thumb.hasalpha():
+                    thumb = thumb.flatten(background=[255, 255, 255])
+                thumbnail_data = thumb.jpegsave_buffer(
+                    Q=ImageConfig.THUMBNAIL_JPEG_QUALITY, strip=True, optimize_coding=True
+                )
+                thumbnail_size_kb = len(thumbnail_data) / 1024
+                logger.info(f"缩略图生成成功(libvips): {thumb.width}x{thumb.height}, 大小 {thumbnail_size_kb:.2f}KB (节省 {file_size_kb - thumbnail_size_kb:.2f}KB)")
+                return thumbnail_data, info
+            except pyvips.Error as e:
+                logger.warning(f"libvips 生成缩略图失败，回退到 Pillow: {e}")
+        
+        # JPEG 在解码阶段直接按比例缩小（libjpeg DCT 缩放），大图解码快得多
+        if img.format == 'JPEG':
+            img.draft('RGB', max_size)
+        
         # 生成缩略图
         img.thumbnail(max_size, PILImage.Resampling.LANCZOS)
         
@@ -151,6 +228,7 @@ async def create_tag(
         db.add(new_tag)
         await db.commit()
         await db.refresh(new_tag)
+        cache_service.delete(CacheConfig.IMAGE_TAGS_CACHE_KEY)
         
         return new_tag
     except HTTPException:
@@ -173,10 +251,22 @@ async def list_tags(
 ):
     """获取所有标签"""
     try:
+        if CacheConfig.ENABLE_CACHE:
+            cached_tags = cache_service.get(CacheConfig.IMAGE_TAGS_CACHE_KEY)
+            if cached_tags is not None:
+                return ORJSONResponse(cached_tags)
+        
         query = select(ImageTag).order_by(ImageTag.name)
         result = await db.execute(query)
-        tags = result.scalars().all()
-        return tags
+        tags = [
+            ImageTagResponse.model_validate(tag).model_dump(mode="json")
+            for tag in result.scalars().all()
+        ]
+        
+        if CacheConfig.ENABLE_CACHE:
+            cache_service.set(CacheConfig.IMAGE_TAGS_CACHE_KEY, tags, ttl=CacheConfig.IMAGE_TAGS_CACHE_TTL)
+        
+        return ORJSONResponse(tags)
     except Exception as e:
         logger.error(f"获取标签列表失败: {e}", exc_info=True)
         raise HTTPException(
@@ -207,6 +297,9 @@ async def delete_tag(
         
         await db.delete(tag)
         await db.commit()
+        # 标签列表和引用该标签的图片详情都已过期
+        cache_service.delete(CacheConfig.IMAGE_TAGS_CACHE_KEY)
+        cache_service.clear(CacheConfig.IMAGE_DETAIL_CACHE_PREFIX)
         
         return {"message": "标签删除成功"}
     except HTTPException:
@@ -244,35 +337,29 @@ async def upload_image(
         validate_image_file(file)
         logger.info("文件验证通过")
         
-        # 读取文件内容
-        file_content = await file.read()
-        file_size = len(file_content)
+        # 分块读取到暂存区（边读边检查大小，大图落盘而非整张留在内存）
+        spool = await spool_image_upload(file)
+        file_size = spool.size
         logger.info(f"文件大小: {file_size} bytes")
         
-        # 检查文件大小
-        if file_size > MAX_IMAGE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"图片大小不能超过 {MAX_IMAGE_SIZE // 1024 // 1024}MB"
-            )
-        
         # 生成唯一文件 ID
         file_id = str(uuid.uuid4())
         file_ext = os.path.splitext(file.filename)[1].lower()
         stored_filename = f"{file_id}{file_ext}"
         logger.info(f"生成文件ID: {file_id}, 存储文件名: {stored_filename}")
         
-        # 保存原图
-        storage_path = await storage_service.save_file(
-            file_content,
-            stored_filename,
-            file.content_type
-        )
-        logger.info(f"原图保存成功: {storage_path}")
-        
-        # 创建缩略图（智能优化：只为大图生成）
-        thumbnail_path = None
-        thumbnail_data, image_info = create_thumbnail(file_content)
+        # 保存原图与生成缩略图同时进行，各用独立读句柄读取暂存区
+        try:
+            save_task = asyncio.create_task(save_spooled_image(spool, stored_filename, file.content_type))
+            
+            # 创建缩略图（智能优化：只为大图生成），解码与缩放为 CPU 密集操作，放到线程中执行
+            thumbnail_path = None
+            thumbnail_data, image_info = await asyncio.to_thread(create_spooled_thumbnail, spool)
+            
+            storage_path = await save_task
+            logger.info(f"原图保存成功: {storage_path}")
+        finally:
+            spool.close()
         
         if thumbnail_data:
             thumbnail_filename = f"{file_id}_thumb.jpg"
@@ -283,13 +370,15 @@ async def upload_image(
             )
             logger.info(f"缩略图保存成功: {thumbnail_path}")
         else:
-            logger.info(f"使用原图作为缩略图（原图: {image_info['width']}x{image_info['height']}, {image_info['original_size_kb']}KB）")
+            dimensions = f"{image_info['width']}x{image_info['height']}, " if image_info['width'] else ""
+            logger.info(f"使用原图作为缩略图（原图: {dimensions}{image_info['original_size_kb']}KB）")
         
         # 解析标签 ID
         tag_id_list = []
         if tag_ids:
             try:
-                tag_id_list = [int(tid.strip()) for tid in tag_ids.split(",") if tid.strip()]
+                # 去重并保持顺序
+                tag_id_list = list(dict.fromkeys(int(tid.strip()) for tid in tag_ids.split(",") if tid.strip()))
                 logger.info(f"解析标签ID: {tag_id_list}")
             except ValueError:
                 raise HTTPException(
@@ -320,20 +409,25 @@ async def upload_image(
         
         # 关联标签
         if tag_id_list:
-            # 验证标签存在
-            tag_query = select(ImageTag).where(ImageTag.id.in_(tag_id_list))
-            tag_result = await db.execute(tag_query)
-            tags = tag_result.scalars().all()
+            # 验证标签存在（只计数，不加载标签对象）
+            tag_count = (await db.execute(
+                select(func.count(ImageTag.id)).where(ImageTag.id.in_(tag_id_list))
+            )).scalar()
             
-            if len(tags) != len(tag_id_list):
+            if tag_count != len(tag_id_list):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="部分标签不存在"
                 )
             
-            # 添加关联
-            new_image.tags = tags
-            logger.info(f"标签关联成功: {len(tags)} 个标签")
+            # 添加关联：INSERT ... SELECT 一条语句写入全部关联行
+            await db.execute(
+                insert(image_tag_association).from_select(
+                    ["image_id", "tag_id"],
+                    select(literal(new_image.id), ImageTag.id).where(ImageTag.id.in_(tag_id_list))
+                )
+            )
+            logger.info(f"标签关联成功: {tag_count} 个标签")
         
         await db.commit()
         await db.refresh(new_image)
@@ -375,56 +469,61 @@ async def list_images(
 ):
     """获取图片列表"""
     try:
-        # 构建查询
-        query = select(Image)
-        
-        # 按标签筛选
+        # 按标签筛选：EXISTS 子查询，不 JOIN 也就不会产生重复行
+        filters = []
         if tag_id:
-            query = query.join(Image.tags).where(ImageTag.id == tag_id)
+            filters.append(Image.tags.any(ImageTag.id == tag_id))
         
-        # 计算总数
-        count_query = select(func.count()).select_from(query.subquery())
-        total_result = await db.execute(count_query)
-        total = total_result.scalar()
-        
-        # 分页
+        # 总数用窗口函数随分页结果一并返回，省去单独的 COUNT 子查询；
+        # 标签用 selectinload 一次 IN 查询批量加载，避免逐张图片查询标签
         offset = (page - 1) * page_size
-        query = query.order_by(Image.created_at.desc()).offset(offset).limit(page_size)
-        
+        query = (
+            select(Image, func.count().over().label("total"))
+            .options(selectinload(Image.tags))
+            .where(*filters)
+            .order_by(Image.created_at.desc())
+            .offset(offset)
+            .limit(page_size)
+        )
         result = await db.execute(query)
-        images = result.scalars().all()
+        rows = result.all()
+        images = [row.Image for row in rows]
+        
+        if rows:
+            total = rows[0].total
+        elif page == 1:
+            total = 0
+        else:
+            # 页码超出范围时没有返回行，单独统计总数
+            count_query = select(func.count(Image.id)).where(*filters)
+            total = (await db.execute(count_query)).scalar()
         
-        # 加载标签
         image_list = []
         for image in images:
-            tag_query = select(ImageTag).join(Image.tags).where(Image.id == image.id)
-            tag_result = await db.execute(tag_query)
-            tags = tag_result.scalars().all()
-            
-            image_response = ImageResponse(
-                id=image.id,
-                file_id=image.file_id,
-                filename=image.filename,
-                original_filename=image.original_filename,
-                file_size=image.file_size,
-                mime_type=image.mime_type,
-                storage_path=image.storage_path,
-                thumbnail_path=image.thumbnail_path,
-                description=image.description,
-                alt_text=image.alt_text,
-                user_id=image.user_id,
-                tags=[ImageTagResponse(id=tag.id, name=tag.name, created_at=tag.created_at) for tag in tags],
-                created_at=image.created_at,
-                updated_at=image.updated_at
-            )
-            image_list.append(image_response)
-        
-        return ImageListResponse(
-            images=image_list,
-            total=total,
-            page=page,
-            page_size=page_size
-        )
+            # 直接构建字典由 orjson 输出，跳过逐行 Pydantic 校验
+            image_list.append({
+                "id": image.id,
+                "file_id": image.file_id,
+                "filename": image.filename,
+                "original_filename": image.original_filename,
+                "file_size": image.file_size,
+                "mime_type": image.mime_type,
+                "storage_path": image.storage_path,
+                "thumbnail_path": image.thumbnail_path,
+                "description": image.description,
+                "alt_text": image.alt_text,
+                "user_id": image.user_id,
+                "tags": [{"id": tag.id, "name": tag.name, "created_at": tag.created_at} for tag in image.tags],
+                "created_at": image.created_at,
+                "updated_at": image.updated_at
+            })
+        
+        return ORJSONResponse({
+            "images": image_list,
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        })
         
     except Exception as e:
         logger.error(f"获取图片列表失败: {e}", exc_info=True)
@@ -444,7 +543,13 @@ async def get_image(
 ):
     """获取图片详情"""
     try:
-        query = select(Image).where(Image.id == image_id)
+        cache_key = image_detail_cache_key(image_id)
+        if CacheConfig.ENABLE_CACHE:
+            cached_image = cache_service.get(cache_key)
+            if cached_image is not None:
+                return ORJSONResponse(cached_image)
+        
+        query = select(Image).options(selectinload(Image.tags)).where(Image.id == image_id)
         result = await db.execute(query)
         image = result.scalar_one_or_none()
         
@@ -454,12 +559,7 @@ async def get_image(
                 detail="图片不存在"
             )
         
-        # 加载标签
-        tag_query = select(ImageTag).join(Image.tags).where(Image.id == image.id)
-        tag_result = await db.execute(tag_query)
-        tags = tag_result.scalars().all()
-        
-        return ImageResponse(
+        image_data = ImageResponse(
             id=image.id,
             file_id=image.file_id,
             filename=image.filename,
@@ -471,10 +571,15 @@ async def get_image(
             description=image.description,
             alt_text=image.alt_text,
             user_id=image.user_id,
-            tags=[ImageTagResponse(id=tag.id, name=tag.name, created_at=tag.created_at) for tag in tags],
+            tags=[ImageTagResponse(id=tag.id, name=tag.name, created_at=tag.created_at) for tag in image.tags],
             created_at=image.created_at,
             updated_at=image.updated_at
-        )
+        ).model_dump(mode="json")
+        
+        if CacheConfig.ENABLE_CACHE:
+            cache_service.set(cache_key, image_data, ttl=CacheConfig.IMAGE_DETAIL_CACHE_TTL)
+        
+        return ORJSONResponse(image_data)
         
     except HTTPException:
         raise
@@ -497,7 +602,7 @@ async def update_image(
 ):
     """更新图片信息（仅管理员）"""
     try:
-        query = select(Image).where(Image.id == image_id)
+        query = select(Image).options(selectinload(Image.tags)).where(Image.id == image_id)
         result = await db.execute(query)
         image = result.scalar_one_or_none()
         
@@ -516,12 +621,13 @@ async def update_image(
         # 更新标签
         if update_data.tag_ids is not None:
             if update_data.tag_ids:
-                # 验证标签存在
-                tag_query = select(ImageTag).where(ImageTag.id.in_(update_data.tag_ids))
+                # 验证标签存在（重复的 ID 只计一次）
+                tag_id_list = list(dict.fromkeys(update_data.tag_ids))
+                tag_query = select(ImageTag).where(ImageTag.id.in_(tag_id_list))
                 tag_result = await db.execute(tag_query)
                 tags = tag_result.scalars().all()
                 
-                if len(tags) != len(update_data.tag_ids):
+                if len(tags) != len(tag_id_list):
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail="部分标签不存在"
@@ -533,12 +639,9 @@ async def update_image(
                 image.tags = []
         
         await db.commit()
-        await db.refresh(image)
-        
-        # 加载标签
-        tag_query = select(ImageTag).join(Image.tags).where(Image.id == image.id)
-        tag_result = await db.execute(tag_query)
-        tags = tag_result.scalars().all()
+        # 标签已在内存中（selectinload + 赋值），只需刷新数据库生成的更新时间
+        await db.refresh(image, attribute_names=["updated_at"])
+        cache_service.delete(image_detail_cache_key(image_id))
         
         return ImageResponse(
             id=image.id,
@@ -552,7 +655,7 @@ async def update_image(
             description=image.description,
             alt_text=image.alt_text,
             user_id=image.user_id,
-            tags=[ImageTagResponse(id=tag.id, name=tag.name, created_at=tag.created_at) for tag in tags],
+            tags=[ImageTagResponse(id=tag.id, name=tag.name, created_at=tag.created_at) for tag in image.tags],
             created_at=image.created_at,
             updated_at=image.updated_at
         )
@@ -599,6 +702,7 @@ async def delete_image(
         # 删除数据库记录
         await db.delete(image)
         await db.commit()
+        cache_service.delete(image_detail_cache_key(image_id))
         
         return {"message": "图片删除成功"}
         
@@ -636,21 +740,33 @@ async def get_image_file(
         # 选择原图或缩略图
         file_path = image.thumbnail_path if thumbnail and image.thumbnail_path else image.storage_path
         
-        # 获取文件内容
-        file_content = await storage_service.get_file(file_path)
+        # 存储路径含唯一 file_id，上传后内容不再变化，可直接作为强 ETag 并长期缓存
+        cache_headers = {
+            "ETag": f'"{os.path.splitext(file_path)[0]}"',
+            "Cache-Control": f"private, max-age={ImageConfig.FILE_CACHE_MAX_AGE}, immutable"
+        }
+        if is_not_modified(request, cache_headers["ETag"]):
+            return Response(status_code=304, headers=cache_headers)
+        
+        # 分块读取文件，边读边发送，不把整张图片读入内存
+        file_stream = await storage_service.open_file_stream(file_path)
         
-        if not file_content:
+        if file_stream is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="图片文件不存在"
             )
         
+        chunks, file_size = file_stream
+        
         # 返回文件
         return StreamingResponse(
-            io.BytesIO(file_content),
+            chunks,
             media_type=image.mime_type,
             headers={
-                "Content-Disposition": f'inline; filename="{image.original_filename}"'
+                "Content-Disposition": f'inline; filename="{image.original_filename}"',
+                "Content-Length": str(file_size),
+                **cache_headers
             }
         )
         
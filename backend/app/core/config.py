@@ -4,10 +4,12 @@
 """
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Tuple
+from functools import cached_property
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from app.core.constants import DatabaseConfig
 
 # 自动定位项目根目录（即包含 frontend 和 backend 的目录）
 BASE_DIR = Path(__file__).resolve().parents[3]
@@ -49,19 +51,24 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
     JWT_EXPIRATION_HOURS: int = int(os.getenv("JWT_EXPIRATION_HOURS", "24"))
 
+    # 密码哈希 bcrypt 成本因子（每 +1 耗时翻倍；调整后旧哈希在用户下次登录时自动升级）
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "10"))
+
     # CORS 配置
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "https://www.kabi.pro")
 
-    @property
-    def CORS_ORIGINS(self) -> List[str]:
+    # 以下派生配置只在首次访问时计算一次，返回不可变的 tuple
+
+    @cached_property
+    def CORS_ORIGINS(self) -> Tuple[str, ...]:
         """CORS 允许的来源"""
         if self.MODE == "development":
-            return [
+            return (
                 "http://localhost:3000",
                 "http://127.0.0.1:3000",
                 "http://localhost:3001",
                 "http://localhost:3002",
-            ]
+            )
 
         # 生产允许的域名
         origins = [
@@ -75,20 +82,20 @@ class Settings(BaseSettings):
             extra_origins = [origin.strip() for origin in env_origins.split(",")]
             origins.extend(extra_origins)
 
-        return list(set(origins))  # 去重
+        return tuple(dict.fromkeys(origins))  # 去重并保持顺序
 
-    @property
-    def ALLOWED_HOSTS(self) -> List[str]:
+    @cached_property
+    def ALLOWED_HOSTS(self) -> Tuple[str, ...]:
         if self.MODE == "development":
-            return ["*"]
+            return ("*",)
 
-        return [
+        return (
             "*",
             "localhost",
             "127.0.0.1",
             "api.kabi.pro",
             "*.kabi.pro",
-        ]
+        )
 
     # 日志配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -100,9 +107,23 @@ class Settings(BaseSettings):
         "sqlite+aiosqlite:///./knowledgehub.db"
     )
 
+    # 数据库连接池（仅 PostgreSQL 生效，默认值见 DatabaseConfig）
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", str(DatabaseConfig.POOL_SIZE)))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", str(DatabaseConfig.MAX_OVERFLOW)))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", str(DatabaseConfig.POOL_RECYCLE)))
+
+    # 经 PgBouncer（事务池模式）连接时需关闭 asyncpg 预编译语句缓存
+    DB_PGBOUNCER: bool = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+    # 是否输出 SQL 日志（两种数据库都生效；默认保持原有行为开启，生产环境建议关闭）
+    DB_ECHO: bool = os.getenv("DB_ECHO", "true").lower() == "true"
+
     # Redis（可选）
     REDIS_URL: str = os.getenv("REDIS_URL", "")
 
+    # 管理后台统计在数据库不可用时回退到过期缓存（opt-in）
+    ADMIN_STALE_FALLBACK_ENABLED: bool = os.getenv("ADMIN_STALE_FALLBACK_ENABLED", "false").lower() == "true"
+
     # 本地文件存储路径
     LOCAL_STORAGE_PATH: str = os.getenv("LOCAL_STORAGE_PATH", "./storage")
 
@@ -115,7 +136,7 @@ class Settings(BaseSettings):
     # 存储类型: local | s3
     STORAGE_TYPE: str = os.getenv("STORAGE_TYPE", "s3" if os.getenv("MODE") == "production" else "local")
 
-    @property
+    @cached_property
     def DATABASE_URL_SYNC(self) -> str:
         """同步版本数据库 URL（用于 Alembic）"""
         url = self.DATABASE_URL
@@ -53,6 +53,12 @@ class AIConfig:
     # 默认问答配置
     DEFAULT_TEMPERATURE = 0.7
     DEFAULT_MAX_TOKENS = 1000
+    
+    # 文档切块批量生成 embedding：每批条数与并发批数
+    EMBEDDING_BATCH_SIZE = 96
+    EMBEDDING_BATCH_CONCURRENCY = 8
+    # 文档上传流水线：已生成 embedding、等待写入 Qdrant 的最大组数
+    EMBEDDING_PIPELINE_QUEUE_SIZE = 4
 
 
 class RerankConfig:
@@ -75,6 +81,10 @@ class QdrantConfig:
     
     # 删除操作限制
     MAX_DELETE_POINTS = 10000
+    
+    # 批量写入：每批点数与并发批数（大文档切块较多时分批并行 upsert）
+    UPSERT_BATCH_SIZE = 256
+    UPSERT_PARALLEL = 4
 
 
 class ProcessingConfig:
@@ -83,6 +93,23 @@ class ProcessingConfig:
     MAX_CONTEXT_DOCS = 5  # 保留不包含关键词的文档数量
 
 
+class DatabaseConfig:
+    """数据库连接池配置（仅 PostgreSQL 生效）"""
+    
+    # 常驻连接数与突发时可额外创建的连接数
+    POOL_SIZE = 20
+    MAX_OVERFLOW = 30
+    
+    # 获取连接的最长等待时间（秒）
+    POOL_TIMEOUT = 30
+    
+    # 连接回收时间（秒），避免被 RDS / 负载均衡断开的空闲连接
+    POOL_RECYCLE = 1800
+    
+    # 取出连接前先探活，自动替换失效连接
+    POOL_PRE_PING = True
+
+
 class RateLimitConfig:
     # 全局限流（每分钟请求数）
     GLOBAL_RATE_LIMIT = "100/minute"
@@ -101,6 +128,9 @@ class RateLimitConfig:
     
     # 限流错误消息
     RATE_LIMIT_MESSAGE = "请求过于频繁，请稍后再试"
+    
+    # 限流算法：滑动窗口（避免固定窗口边界处的突发翻倍；Redis 下由 Lua 脚本原子执行）
+    STRATEGY = "moving-window"
 
 
 class TokenLimitConfig:
@@ -135,6 +165,10 @@ class FileValidationConfig:
     # 文件大小限制（字节）
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
     
+    # 上传文件分块读取大小，以及暂存在内存中的上限（超过后落盘）
+    UPLOAD_READ_CHUNK_SIZE = 1024 * 1024  # 1MB
+    UPLOAD_SPOOL_MAX_MEMORY = 8 * 1024 * 1024  # 8MB
+    
     # 扩展名到 MIME 类型的映射
     EXTENSION_MIME_MAP = {
         '.pdf': 'application/pdf',
@@ -147,6 +181,14 @@ class FileValidationConfig:
     }
 
 
+class DocumentListConfig:
+    """用户文档列表配置"""
+    
+    # 游标分页：默认每页条数与最大每页条数
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+
+
 class RetryConfig:
     # OpenAI API 重试配置
     OPENAI_MAX_ATTEMPTS = 3  # 最大重试次数
@@ -164,10 +206,29 @@ class RetryConfig:
     QDRANT_OPERATION_MAX_WAIT = 20  # 操作重试最大等待时间（秒）
 
 
+class HttpClientConfig:
+    """外部服务（OpenAI / Qdrant）HTTP 连接池配置，客户端进程内只创建一次并复用"""
+    
+    # 最大连接数与保持空闲的长连接数
+    MAX_CONNECTIONS = 100
+    MAX_KEEPALIVE_CONNECTIONS = 50
+    
+    # 空闲长连接保留时间（秒）
+    KEEPALIVE_EXPIRY = 30
+    
+    # 请求超时（秒）：建立连接与整体读写
+    CONNECT_TIMEOUT = 5.0
+    OPENAI_TIMEOUT = 60.0
+    QDRANT_TIMEOUT = 30
+
+
 class CacheConfig:
     # Embedding 缓存时间（秒）- 24小时，因为相同文本的embedding通常不变
     EMBEDDING_CACHE_TTL = 86400
     
+    # Embedding 进程内一级缓存条目数（3072 维向量约 100KB/条，命中时省去 Redis 往返与 JSON 解析）
+    EMBEDDING_MEMORY_CACHE_MAXSIZE = 256
+    
     SEARCH_RESULT_CACHE_TTL = 3600
     
     ANSWER_CACHE_TTL = 1800
@@ -177,6 +238,45 @@ class CacheConfig:
     EMBEDDING_CACHE_PREFIX = "embedding"
     SEARCH_CACHE_PREFIX = "search"
     ANSWER_CACHE_PREFIX = "answer"
+    
+    # 问答检索结果缓存（按归一化问题缓存 embedding + 向量检索的最终上下文）
+    # 前缀挂在搜索缓存下，知识库更新清除搜索缓存时一并失效
+    RETRIEVAL_CACHE_PREFIX = f"{SEARCH_CACHE_PREFIX}:context"
+    RETRIEVAL_CACHE_TTL = 300
+    
+    # 图片标签列表与图片详情缓存（写操作时主动失效，TTL 只兜底多实例间的短暂不一致）
+    IMAGE_TAGS_CACHE_KEY = "image:tags"
+    IMAGE_TAGS_CACHE_TTL = 300
+    IMAGE_DETAIL_CACHE_PREFIX = "image:detail"
+    IMAGE_DETAIL_CACHE_TTL = 60
+    
+    # 文本文档预览缓存（进程内，按 file_id 缓存解码后的文本；文件上传后内容不变）
+    TEXT_PREVIEW_CACHE_MAXSIZE = 128
+    TEXT_PREVIEW_CACHE_TTL = 3600
+    TEXT_PREVIEW_CACHE_MAX_BYTES = 1024 * 1024  # 只缓存不超过 1MB 的文本
+    
+    # JWT 校验结果缓存（进程内），重复请求跳过签名校验
+    JWT_VERIFY_CACHE_TTL = 10
+    JWT_VERIFY_CACHE_MAXSIZE = 10000
+    
+    # 用户资料缓存（/me 等已认证请求，避免每次访问数据库）
+    USER_PROFILE_CACHE_PREFIX = "user_profile"
+    USER_PROFILE_CACHE_TTL = 60
+    # 权限校验使用的用户资料缓存，TTL 取 JWT_VERIFY_CACHE_TTL
+    USER_PROFILE_FRESH_CACHE_PREFIX = "user_profile_fresh"
+    
+    # 管理后台缓存（短-中-长策略：列表 15 秒，统计 30 秒，Token 汇总 120 秒）
+    ADMIN_DOCUMENTS_CACHE_PREFIX = "admin_docs"
+    ADMIN_DOCUMENTS_STATS_CACHE_PREFIX = "admin_docs_stats"
+    ADMIN_USERS_CACHE_PREFIX = "admin_users"
+    ADMIN_USERS_STATS_CACHE_PREFIX = "admin_users_stats"
+    ADMIN_TOKENS_SUMMARY_CACHE_PREFIX = "admin_users_tokens"
+    ADMIN_LIST_CACHE_TTL = 15
+    ADMIN_STATS_CACHE_TTL = 30
+    ADMIN_TOKENS_SUMMARY_CACHE_TTL = 120
+    # 过期副本保留时间（秒）：数据库故障时仍可返回最近一次的统计结果
+    ADMIN_STALE_CACHE_TTL = 600
+    ADMIN_STALE_CACHE_SUFFIX = "stale"
 
 
 
@@ -197,6 +297,9 @@ class ImageConfig:
     
     # 是否启用智能缩略图（False = 总是生成缩略图）
     ENABLE_SMART_THUMBNAIL = True
+    
+    # 图片文件浏览器缓存时间（秒）：存储路径含唯一 file_id，内容不会变化
+    FILE_CACHE_MAX_AGE = 31536000  # 1 年
 
 
 class ConversationConfig:
@@ -213,3 +316,14 @@ class ConversationConfig:
     
     # 是否启用消息数量限制
     ENABLE_MESSAGE_LIMIT = True
+
+
+class AdminConfig:
+    """管理后台配置"""
+    
+    # 列表接口游标分页：默认每页条数与最大每页条数
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 500
+    
+    # 流式读取聚合结果时每批获取的行数
+    STREAM_PARTITION_SIZE = 500
@@ -5,8 +5,10 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine
 )
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
+from app.core.constants import DatabaseConfig
 
 logger = logging.getLogger(__name__)
 
@@ -45,14 +47,25 @@ def create_engine_by_mode():
         ssl_context = get_ssl_context()
 
         connect_args = {"ssl": ssl_context} if ssl_context else {}
+        url = make_url(DATABASE_URL)
+
+        if settings.DB_PGBOUNCER:
+            # PgBouncer 事务池模式下连接会在事务间切换，预编译语句无法复用，需关闭两层缓存
+            connect_args["statement_cache_size"] = 0
+            url = url.update_query_dict({"prepared_statement_cache_size": "0"})
 
         logger.info("正在使用 PostgreSQL + asyncpg + SSL")
 
         return create_async_engine(
-            DATABASE_URL,
-            echo=settings.MODE == "development",
+            url,
+            echo=settings.DB_ECHO,
             future=True,
-            connect_args=connect_args
+            connect_args=connect_args,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=DatabaseConfig.POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=DatabaseConfig.POOL_PRE_PING
         )
 
     else:
@@ -60,7 +73,7 @@ def create_engine_by_mode():
         logger.info("正在使用 SQLite（开发环境）")
         return create_async_engine(
             DATABASE_URL,
-            echo=True,
+            echo=settings.DB_ECHO,
             future=True
         )
 
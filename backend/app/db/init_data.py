@@ -2,19 +2,20 @@
 数据库初始化数据
 """
 import os
+import asyncio
 import logging
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from app.db.database import AsyncSessionLocal
 from app.db.models import User
-from passlib.context import CryptContext
+from app.core.config import settings
+import bcrypt
 
 logger = logging.getLogger(__name__)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def get_password_hash(password: str) -> str:
     """密码哈希"""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(settings.BCRYPT_ROUNDS)).decode("utf-8")
 
 async def create_admin_user():
     """创建默认管理员用户"""
@@ -29,9 +30,13 @@ async def create_admin_user():
                 logger.info("管理员用户已存在，跳过创建")
                 return
             
+            # bcrypt 哈希耗时，放到线程中执行，不阻塞启动期间的事件循环
+            hashed_password = await asyncio.to_thread(
+                get_password_hash, os.getenv("ADMIN_PASSWORD", "admin123")
+            )
             admin_user = User(
                 email="admin@abc.com",
-                hashed_password=get_password_hash(os.getenv("ADMIN_PASSWORD", "admin123")),
+                hashed_password=hashed_password,
                 full_name="管理员",
                 is_active=True,
                 role="admin"
@@ -21,6 +21,27 @@ async def run_migrations():
         # 迁移 1: 添加 token_quota 字段
         await migrate_add_token_quota()
         
+        # 迁移 2: 为用户统计添加部分索引
+        await migrate_add_user_partial_indexes()
+        
+        # 迁移 3: 为 Token / 文档统计聚合添加覆盖索引
+        await migrate_add_aggregate_covering_indexes()
+        
+        # 迁移 4: 外键改为 ON DELETE CASCADE，由数据库完成级联删除
+        await migrate_cascade_foreign_keys()
+        
+        # 迁移 5: 对话列表按用户 + 更新时间排序的复合索引
+        await migrate_add_conversation_indexes()
+        
+        # 迁移 6: 消息列表按对话 + 创建时间排序的复合索引
+        await migrate_add_message_indexes()
+        
+        # 迁移 7: 用户文档列表按上传时间排序的复合索引
+        await migrate_add_document_list_indexes()
+        
+        # 迁移 8: 文档内容哈希字段，重复上传时复用已有向量
+        await migrate_add_document_content_hash()
+        
         logger.info("All migrations completed successfully")
         
     except Exception as e:
@@ -108,3 +129,198 @@ async def migrate_add_token_quota():
         
         logger.error(f"Failed to add token_quota field: {e}", exc_info=True)
         raise
+
+
+async def migrate_add_user_partial_indexes():
+    """迁移：为活跃用户和管理员计数添加部分索引（PostgreSQL 和 SQLite 均支持）"""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_users_active
+                ON users (is_active)
+                WHERE is_active
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_users_role_admin
+                ON users (role)
+                WHERE role = 'admin'
+            """))
+            logger.info("✓ User partial indexes ensured")
+            
+    except Exception as e:
+        logger.warning(f"Failed to create user partial indexes: {e}")
+        # 索引仅用于性能优化，失败不影响启动
+
+
+async def migrate_add_aggregate_covering_indexes():
+    """
+    迁移：为按用户聚合的统计查询添加覆盖索引
+    
+    - token_usage(user_id) INCLUDE (total_tokens)：SUM(total_tokens) GROUP BY user_id
+    - documents(user_id) INCLUDE (file_size)：管理后台按用户统计文档
+    
+    PostgreSQL 使用 INCLUDE 实现 index-only scan；SQLite 不支持 INCLUDE，改用复合索引
+    """
+    try:
+        async with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                await conn.execute(text("""
+                    CREATE INDEX IF NOT EXISTS token_usage_user_sum_idx
+                    ON token_usage (user_id) INCLUDE (total_tokens)
+                """))
+                await conn.execute(text("""
+                    CREATE INDEX IF NOT EXISTS documents_user_id_idx
+                    ON documents (user_id) INCLUDE (file_size)
+                """))
+            else:
+                await conn.execute(text("""
+                    CREATE INDEX IF NOT EXISTS token_usage_user_sum_idx
+                    ON token_usage (user_id, total_tokens)
+                """))
+                await conn.execute(text("""
+                    CREATE INDEX IF NOT EXISTS documents_user_id_idx
+                    ON documents (user_id, file_size)
+                """))
+            logger.info("✓ Aggregate covering indexes ensured")
+            
+    except Exception as e:
+        logger.warning(f"Failed to create aggregate covering indexes: {e}")
+        # 索引仅用于性能优化，失败不影响启动
+
+
+# (表名, 外键列, 引用表)
+CASCADE_FOREIGN_KEYS = [
+    ("documents", "user_id", "users"),
+    ("conversations", "user_id", "users"),
+    ("messages", "conversation_id", "conversations"),
+]
+
+
+async def migrate_cascade_foreign_keys():
+    """
+    迁移：将用户/对话相关外键改为 ON DELETE CASCADE
+    
+    仅 PostgreSQL 需要（SQLite 无法修改已有外键，新建的表已由模型定义带上 CASCADE）
+    """
+    if engine.dialect.name != "postgresql":
+        logger.info("✓ Skipping cascade foreign key migration (not PostgreSQL)")
+        return
+    
+    try:
+        async with engine.begin() as conn:
+            for table, column, ref_table in CASCADE_FOREIGN_KEYS:
+                result = await conn.execute(text("""
+                    SELECT tc.constraint_name, rc.delete_rule
+                    FROM information_schema.table_constraints tc
+                    JOIN information_schema.key_column_usage kcu
+                        ON tc.constraint_name = kcu.constraint_name
+                        AND tc.table_name = kcu.table_name
+                    JOIN information_schema.referential_constraints rc
+                        ON rc.constraint_name = tc.constraint_name
+                    WHERE tc.constraint_type = 'FOREIGN KEY'
+                    AND tc.table_name = :table
+                    AND kcu.column_name = :column
+                """), {"table": table, "column": column})
+                row = result.fetchone()
+                
+                if row is None or row.delete_rule == "CASCADE":
+                    continue
+                
+                logger.info(f"Recreating {table}.{column} foreign key with ON DELETE CASCADE...")
+                await conn.execute(text(f"""
+                    ALTER TABLE {table}
+                    DROP CONSTRAINT {row.constraint_name},
+                    ADD CONSTRAINT {row.constraint_name}
+                        FOREIGN KEY ({column}) REFERENCES {ref_table}(id) ON DELETE CASCADE
+                """))
+            
+            logger.info("✓ Cascade foreign keys ensured")
+            
+    except Exception as e:
+        logger.error(f"Failed to migrate cascade foreign keys: {e}", exc_info=True)
+
+
+async def migrate_add_conversation_indexes():
+    """
+    迁移：为对话列表 / 旧对话清理添加 (user_id, updated_at DESC) 复合索引
+    
+    conversation_id 本身已有唯一索引，按 conversation_id 查询无需额外索引
+    """
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_conversations_user_updated
+                ON conversations (user_id, updated_at DESC)
+            """))
+            logger.info("✓ Conversation indexes ensured")
+            
+    except Exception as e:
+        logger.warning(f"Failed to create conversation indexes: {e}")
+        # 索引仅用于性能优化，失败不影响启动
+
+
+async def migrate_add_message_indexes():
+    """
+    迁移：为按对话读取消息添加 (conversation_id, created_at) 复合索引
+    
+    messages.conversation_id 原本没有索引，消息列表查询与排序都可由该索引完成
+    """
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_messages_conversation_created
+                ON messages (conversation_id, created_at)
+            """))
+            logger.info("✓ Message indexes ensured")
+            
+    except Exception as e:
+        logger.warning(f"Failed to create message indexes: {e}")
+        # 索引仅用于性能优化，失败不影响启动
+
+
+async def migrate_add_document_list_indexes():
+    """
+    迁移：为用户文档列表添加 (user_id, created_at DESC) 复合索引
+    
+    按用户过滤并按上传时间倒序排序时可直接走索引，无需额外排序
+    """
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_documents_user_created
+                ON documents (user_id, created_at DESC)
+            """))
+            logger.info("✓ Document list indexes ensured")
+            
+    except Exception as e:
+        logger.warning(f"Failed to create document list indexes: {e}")
+        # 索引仅用于性能优化，失败不影响启动
+
+
+async def migrate_add_document_content_hash():
+    """
+    迁移：为 documents 表添加 content_hash 字段及索引
+    
+    上传时按内容哈希查找已处理过的相同文档，直接复用其向量
+    """
+    try:
+        async with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                await conn.execute(text("""
+                    ALTER TABLE documents
+                    ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)
+                """))
+            else:
+                # SQLite 不支持 ADD COLUMN IF NOT EXISTS，先检查字段是否存在
+                result = await conn.execute(text("PRAGMA table_info(documents)"))
+                if "content_hash" not in {row.name for row in result}:
+                    await conn.execute(text("ALTER TABLE documents ADD COLUMN content_hash VARCHAR(64)"))
+            
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_documents_content_hash
+                ON documents (content_hash)
+            """))
+            logger.info("✓ Document content hash column ensured")
+            
+    except Exception as e:
+        logger.error(f"Failed to add document content hash column: {e}", exc_info=True)
@@ -31,8 +31,8 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
-    documents = relationship("Document", back_populates="owner", cascade="all, delete-orphan")
-    conversations = relationship("Conversation", back_populates="owner", cascade="all, delete-orphan")
+    documents = relationship("Document", back_populates="owner", cascade="all, delete-orphan", passive_deletes=True)
+    conversations = relationship("Conversation", back_populates="owner", cascade="all, delete-orphan", passive_deletes=True)
 
 
 
@@ -45,9 +45,11 @@ class Document(Base):
     filename = Column(String(255), nullable=False)
     file_type = Column(String(100), nullable=False)
     file_size = Column(Integer, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     status = Column(String(50), default="completed", nullable=False)
     chunks_count = Column(Integer, default=0, nullable=False)
+    # 文件内容 SHA-256，重复上传相同内容时复用已有向量
+    content_hash = Column(String(64), nullable=True, index=True)
     # 智能文档检索：AI 提取的元数据
     # 格式: {"title": "...", "summary": "...", "keywords": [...], "category": "..."}
     doc_metadata = Column(JSON, nullable=True)
@@ -63,13 +65,13 @@ class Conversation(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(String(255), unique=True, index=True, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     owner = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", order_by="Message.created_at")
+    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True, order_by="Message.created_at")
 
 
 class Message(Base):
@@ -77,7 +79,7 @@ class Message(Base):
     __tablename__ = "messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
     sources = Column(Text, nullable=True)
@@ -4,7 +4,7 @@ FastAPI 主应用入口
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 from contextlib import asynccontextmanager
 from app.core.config import settings
@@ -56,6 +56,7 @@ app = FastAPI(
     docs_url="/docs" if settings.MODE == "development" else None,
     redoc_url="/redoc" if settings.MODE == "development" else None,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.state.limiter = limiter
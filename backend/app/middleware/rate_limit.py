@@ -5,9 +5,10 @@ API 限流中间件
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from fastapi import Request
+from fastapi import Request, HTTPException
 from app.core.config import settings
 from app.core.constants import RateLimitConfig
+from app.utils.auth import verify_token
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,11 +24,15 @@ def get_user_identifier(request: Request) -> str:
     if hasattr(request.state, "user_id"):
         return f"user:{request.state.user_id}"
     
-    # 尝试从 Authorization header 解析（简化处理）
+    # 从 Authorization header 解析 JWT 获取 user_id（校验结果有短期缓存，开销很小）
     auth_header = request.headers.get("Authorization", "")
     if auth_header.startswith("Bearer "):
-        # 这里可以解析 JWT 获取 user_id，但为了简化，先使用 IP
-        pass
+        try:
+            user_id = verify_token(auth_header[len("Bearer "):]).get("user_id")
+        except HTTPException:
+            user_id = None
+        if user_id:
+            return f"user:{user_id}"
     
     # 使用 IP 地址作为标识符
     return f"ip:{get_remote_address(request)}"
@@ -36,7 +41,11 @@ def get_user_identifier(request: Request) -> str:
 limiter = Limiter(
     key_func=get_user_identifier,
     default_limits=[RateLimitConfig.GLOBAL_RATE_LIMIT],
-    storage_uri="memory://",  # 使用内存存储（生产环境建议使用 Redis）
+    # 配置了 Redis 时使用 Redis 存储（多实例共享计数，计数与过期在一次往返内完成），否则使用内存存储
+    storage_uri=settings.REDIS_URL or "memory://",
+    # Redis 不可用时退回进程内计数，而不是让所有受限接口（包括登录）报错；恢复后自动切回 Redis
+    in_memory_fallback_enabled=True,
+    strategy=RateLimitConfig.STRATEGY,
     headers_enabled=False,  # 禁用以兼容 FastAPI 的 response_model
 )
 
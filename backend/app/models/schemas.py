@@ -369,6 +369,24 @@ class AdminUserDetailResponse(BaseModel):
         from_attributes = True
 
 
+class DocumentPage(BaseModel):
+    """用户文档列表分页响应（游标分页）"""
+    items: List[DocumentMetadata]
+    next_cursor: Optional[str] = None  # 下一页游标（最后一条的 created_at|file_id），无更多数据时为 None
+
+
+class AdminDocumentPage(BaseModel):
+    """管理员文档列表分页响应（游标分页）"""
+    items: List[DocumentMetadata]
+    next_cursor: Optional[str] = None  # 下一页游标（最后一条的 created_at|id），无更多数据时为 None
+
+
+class AdminUserPage(BaseModel):
+    """管理员用户列表分页响应（游标分页）"""
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None  # 下一页游标（最后一条的 created_at|id），无更多数据时为 None
+
+
 class UserQuotaUpdate(BaseModel):
     """更新用户 Token 配额请求"""
     token_quota: int = Field(..., ge=0, description="新的 Token 配额")
@@ -3,8 +3,8 @@ AI 文档分析服务
 自动从文档内容中提取标题、摘要、关键词
 用于智能文档检索功能
 """
-from openai import OpenAI
 from app.core.config import settings
+from app.services.openai_service import openai_service
 from typing import Dict, Optional
 import logging
 import json
@@ -18,7 +18,8 @@ class DocumentAnalysisService:
     
     def __init__(self):
         if settings.OPENAI_API_KEY:
-            self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            # 复用 openai_service 的客户端与连接池
+            self.client = openai_service.client
         else:
             self.client = None
             logger.warning("OpenAI API key not configured, document analysis will be disabled")
@@ -55,7 +55,7 @@ class ImageRetrievalService:
             
             # 生成问题的 embedding
             try:
-                question_embeddings, _ = openai_service.generate_embeddings([question])
+                question_embeddings, _ = await openai_service.agenerate_embeddings([question])
                 question_embedding = question_embeddings[0]
                 logger.info("问题 embedding 生成成功")
             except Exception as e:
@@ -66,7 +66,7 @@ class ImageRetrievalService:
             # 生成所有图片 description 的 embeddings
             descriptions = [img.description for img in images]
             try:
-                description_embeddings, _ = openai_service.generate_embeddings(descriptions)
+                description_embeddings, _ = await openai_service.agenerate_embeddings_batched(descriptions)
                 logger.info(f"生成了 {len(description_embeddings)} 个图片 description embeddings")
             except Exception as e:
                 logger.error(f"生成图片 embeddings 失败: {e}")
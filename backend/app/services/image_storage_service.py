@@ -3,7 +3,8 @@
 为图片管理提供统一的存储接口，支持 S3 和本地存储
 """
 import io
-from typing import Optional
+import asyncio
+from typing import BinaryIO, Iterator, Optional, Tuple
 from pathlib import Path
 from app.services.local_storage_service import storage_service as base_storage_service, S3StorageService, LocalStorageService
 import logging
@@ -36,12 +37,29 @@ class ImageStorageService:
         Returns:
             存储路径
         """
-        try:
-            # 将字节内容转换为 BinaryIO
-            file_obj = io.BytesIO(file_content)
+        return await self.save_fileobj(io.BytesIO(file_content), filename, content_type)
+    
+    async def save_fileobj(
+        self,
+        file_obj: BinaryIO,
+        filename: str,
+        content_type: Optional[str] = None
+    ) -> str:
+        """
+        保存文件（从文件对象分块读取，不需要整个文件在内存中）
+        
+        Args:
+            file_obj: 文件对象
+            filename: 文件名
+            content_type: MIME 类型
             
-            # 调用底层存储服务的 upload_file 方法
-            file_id = self.base_service.upload_file(
+        Returns:
+            存储路径
+        """
+        try:
+            # 调用底层存储服务的 upload_file 方法（同步 I/O，放到线程中执行以免阻塞事件循环）
+            file_id = await asyncio.to_thread(
+                self.base_service.upload_file,
                 file_obj,
                 filename,
                 content_type
@@ -86,6 +104,29 @@ class ImageStorageService:
             logger.error(f"文件获取失败: {e}", exc_info=True)
             raise
     
+    async def open_file_stream(self, storage_path: str) -> Optional[Tuple[Iterator[bytes], int]]:
+        """
+        分块读取文件，不把整个文件读入内存
+        
+        Args:
+            storage_path: 存储路径
+            
+        Returns:
+            (字节块迭代器, 文件大小) 元组；文件不存在时返回 None
+        """
+        try:
+            file_id = Path(storage_path).stem
+            
+            # 打开本地文件 / 发起 S3 请求为同步 I/O，放到线程中执行
+            return await asyncio.to_thread(self.base_service.open_file_stream, file_id, storage_path)
+            
+        except FileNotFoundError:
+            logger.warning(f"文件不存在: {storage_path}")
+            return None
+        except Exception as e:
+            logger.error(f"文件读取失败: {e}", exc_info=True)
+            raise
+    
     async def delete_file(self, storage_path: str) -> bool:
         """
         删除文件
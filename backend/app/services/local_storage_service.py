@@ -10,15 +10,29 @@ logger = logging.getLogger(__name__)
 
 import os
 import uuid
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Iterator, Optional, Tuple
 from pathlib import Path
 from app.core.config import settings
+import shutil
 import logging
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
+# 本地存储分块复制大小
+UPLOAD_COPY_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# 下载时分块读取大小
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# S3 上传：超过 8MB 使用分片上传，每片 8MB，内存占用与文件大小无关
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024
+)
+
 
 class BaseStorageService:
     def upload_file(self, file_obj: BinaryIO, filename: str, content_type: Optional[str] = None) -> str:
@@ -27,6 +41,25 @@ class BaseStorageService:
     def download_file(self, file_id: str, original_filename: str) -> bytes:
         raise NotImplementedError
 
+    def open_file_stream(
+        self,
+        file_id: str,
+        original_filename: str,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> Tuple[Iterator[bytes], int]:
+        """
+        分块读取文件（可指定字节范围），不把整个文件读入内存
+        
+        Args:
+            start: 起始字节（含）
+            end: 结束字节（含），为空时读到文件末尾
+            
+        Returns:
+            (字节块迭代器, 文件总大小) 元组；文件不存在时抛出 FileNotFoundError
+        """
+        raise NotImplementedError
+
     def delete_file(self, file_id: str, original_filename: str) -> bool:
         raise NotImplementedError
 
@@ -55,8 +88,9 @@ class LocalStorageService(BaseStorageService):
             storage_filename = f"{file_id}{file_extension}"
             file_path = self.storage_dir / storage_filename
 
+            # 分块复制，不把整个文件读入内存
             with open(file_path, 'wb') as f:
-                f.write(file_obj.read())
+                shutil.copyfileobj(file_obj, f, UPLOAD_COPY_CHUNK_SIZE)
 
             logger.info(f"文件上传成功(Local): {storage_filename}")
             return file_id
@@ -84,6 +118,36 @@ class LocalStorageService(BaseStorageService):
             logger.error(f"文件下载失败(Local): {str(e)}")
             raise
 
+    def open_file_stream(
+        self,
+        file_id: str,
+        original_filename: str,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> Tuple[Iterator[bytes], int]:
+        file_extension = Path(original_filename).suffix
+        storage_filename = f"{file_id}{file_extension}"
+        file_path = self.storage_dir / storage_filename
+
+        if not file_path.exists():
+            raise FileNotFoundError(f"文件不存在: {storage_filename}")
+
+        file_size = file_path.stat().st_size
+        remaining = (file_size - 1 if end is None else end) - start + 1
+
+        def iter_chunks():
+            nonlocal remaining
+            with open(file_path, 'rb') as f:
+                f.seek(start)
+                while remaining > 0:
+                    chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+
+        return iter_chunks(), file_size
+
     def delete_file(self, file_id: str, original_filename: str) -> bool:
         try:
             file_extension = Path(original_filename).suffix
@@ -167,7 +231,8 @@ class S3StorageService(BaseStorageService):
                 file_obj,
                 self.bucket_name,
                 storage_filename,
-                ExtraArgs=extra_args
+                ExtraArgs=extra_args,
+                Config=S3_TRANSFER_CONFIG
             )
 
             logger.info(f"文件上传成功(S3): {storage_filename}")
@@ -197,6 +262,30 @@ class S3StorageService(BaseStorageService):
             logger.error(f"文件下载失败(S3): {str(e)}")
             raise
 
+    def open_file_stream(
+        self,
+        file_id: str,
+        original_filename: str,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> Tuple[Iterator[bytes], int]:
+        file_extension = Path(original_filename).suffix
+        storage_filename = f"{file_id}{file_extension}"
+        
+        get_kwargs = {"Bucket": self.bucket_name, "Key": storage_filename}
+        if start or end is not None:
+            get_kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        
+        try:
+            response = self.s3_client.get_object(**get_kwargs)
+        except self.s3_client.exceptions.NoSuchKey:
+            raise FileNotFoundError(f"文件不存在(S3): {storage_filename}")
+        
+        # 范围请求时 ContentLength 为本段长度，总大小在 ContentRange 中（bytes start-end/total）
+        content_range = response.get('ContentRange')
+        file_size = int(content_range.rsplit('/', 1)[1]) if content_range else response['ContentLength']
+        return response['Body'].iter_chunks(DOWNLOAD_CHUNK_SIZE), file_size
+
     def delete_file(self, file_id: str, original_filename: str) -> bool:
         try:
             file_extension = Path(original_filename).suffix
@@ -3,12 +3,15 @@ OpenAI 服务封装
 """
 from openai import OpenAI
 from app.core.config import settings
-from app.core.constants import AIConfig, CacheConfig, RerankConfig
+from app.core.constants import AIConfig, CacheConfig, RerankConfig, HttpClientConfig
 from app.services.prompts import Prompts
 from app.services.cache_service import cache_service
 from app.utils.retry import openai_retry
 from app.utils.language_detector import detect_language
+from app.utils.ttl_cache import TTLCache
 from typing import List, Dict, Tuple, Optional, Literal
+import asyncio
+import httpx
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,9 +31,28 @@ class OpenAIService:
                 "⚠️  安全警告：OpenAI API Key 未配置，使用占位符（仅用于开发环境）。"
                 "生产环境必须设置有效的 API Key。"
             )
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY or "dummy-key")
+        # 显式配置连接池，所有请求复用长连接，避免每次对话重新 TLS 握手
+        self.client = OpenAI(
+            api_key=settings.OPENAI_API_KEY or "dummy-key",
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HttpClientConfig.MAX_CONNECTIONS,
+                    max_keepalive_connections=HttpClientConfig.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HttpClientConfig.KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(
+                    HttpClientConfig.OPENAI_TIMEOUT,
+                    connect=HttpClientConfig.CONNECT_TIMEOUT
+                )
+            )
+        )
         self.model = settings.OPENAI_MODEL
         self.embedding_model = settings.OPENAI_EMBEDDING_MODEL
+        # 进程内一级缓存，二级为 cache_service（Redis / 内存）
+        self._embedding_memory_cache = TTLCache(
+            maxsize=CacheConfig.EMBEDDING_MEMORY_CACHE_MAXSIZE,
+            ttl=CacheConfig.EMBEDDING_CACHE_TTL
+        )
     
     @openai_retry
     def _generate_embeddings_internal(self, texts: List[str]):
@@ -70,7 +92,11 @@ class OpenAIService:
                 text,
                 model=self.embedding_model
             )
-            cached_result = cache_service.get(cache_key)
+            cached_result = self._embedding_memory_cache.get(cache_key)
+            if cached_result is None:
+                cached_result = cache_service.get(cache_key)
+                if cached_result is not None:
+                    self._embedding_memory_cache.set(cache_key, cached_result)
             if cached_result is not None:
                 cached_results.append((i, cached_result))
             else:
@@ -107,6 +133,7 @@ class OpenAIService:
                         embedding,
                         ttl=CacheConfig.EMBEDDING_CACHE_TTL
                     )
+                    self._embedding_memory_cache.set(cache_key, embedding)
                 
                 logger.debug(f"缓存了 {len(new_embeddings)} 个新的embeddings，命中 {len(cached_results)} 个缓存")
             except Exception as e:
@@ -124,6 +151,57 @@ class OpenAIService:
         
         return all_embeddings, new_token_usage
     
+    async def agenerate_embeddings(self, texts: List[str]) -> Tuple[List[List[float]], Optional[Dict]]:
+        """
+        生成文本向量嵌入（异步版本，在线程中执行，不阻塞事件循环）
+        """
+        return await asyncio.to_thread(self.generate_embeddings, texts)
+    
+    async def agenerate_embeddings_batched(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> Tuple[List[List[float]], Optional[Dict]]:
+        """
+        分批并发生成文本向量嵌入（用于文档切块等大批量文本）
+        
+        按 batch_size 切成多批，最多 concurrency 批同时请求，
+        避免单次请求超出 token / 输入条数限制，并按原顺序合并结果与 token 使用量。
+        每批单独带重试，一批失败重试时不影响其他批次。
+        
+        Args:
+            texts: 文本列表
+            batch_size: 每批条数，默认 AIConfig.EMBEDDING_BATCH_SIZE
+            concurrency: 同时请求的批数，默认 AIConfig.EMBEDDING_BATCH_CONCURRENCY
+        """
+        batch_size = batch_size or AIConfig.EMBEDDING_BATCH_SIZE
+        if len(texts) <= batch_size:
+            return await self.agenerate_embeddings(texts)
+        
+        semaphore = asyncio.Semaphore(concurrency or AIConfig.EMBEDDING_BATCH_CONCURRENCY)
+        
+        async def embed_batch(batch: List[str]):
+            async with semaphore:
+                return await self.agenerate_embeddings(batch)
+        
+        results = await asyncio.gather(*(
+            embed_batch(texts[i:i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ))
+        
+        all_embeddings = []
+        token_usage = None
+        for embeddings, usage in results:
+            all_embeddings.extend(embeddings)
+            if usage:
+                if token_usage is None:
+                    token_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+                for key in token_usage:
+                    token_usage[key] += usage.get(key, 0)
+        
+        return all_embeddings, token_usage
+    
     def _generate_embeddings_without_cache(self, texts: List[str]) -> Tuple[List[List[float]], Optional[Dict]]:
         """
         生成文本向量嵌入（不使用缓存）
@@ -1,11 +1,15 @@
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct, PayloadSchemaType
 from app.core.config import settings
-from app.core.constants import QdrantConfig, CacheConfig, ProcessingConfig, SearchConfig
+from app.core.constants import QdrantConfig, CacheConfig, ProcessingConfig, SearchConfig, HttpClientConfig
 from app.services.cache_service import cache_service
 from app.utils.retry import qdrant_retry, qdrant_operation_retry
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import httpx
 import logging
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -14,9 +18,22 @@ logger = logging.getLogger(__name__)
 class QdrantService:
     def __init__(self):
         self._client = None
+        self._async_client = None
         self.collection_name = settings.QDRANT_COLLECTION_NAME
         self._initialized = False
     
+    @staticmethod
+    def _http_kwargs() -> Dict:
+        """REST 客户端连接池参数（透传给 httpx），客户端复用长连接"""
+        return {
+            "timeout": HttpClientConfig.QDRANT_TIMEOUT,
+            "limits": httpx.Limits(
+                max_connections=HttpClientConfig.MAX_CONNECTIONS,
+                max_keepalive_connections=HttpClientConfig.MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HttpClientConfig.KEEPALIVE_EXPIRY
+            ),
+        }
+    
     @qdrant_retry
     def _create_client(self):
         if not settings.QDRANT_URL or not settings.QDRANT_API_KEY:
@@ -26,8 +43,28 @@ class QdrantService:
         return QdrantClient(
             url=settings.QDRANT_URL,
             api_key=settings.QDRANT_API_KEY,
+            **self._http_kwargs()
         )
     
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        """
+        异步客户端（懒加载），用于在事件循环中直接 await 的操作
+        
+        集合的创建与校验仍由同步客户端在首次访问时完成
+        """
+        if self._async_client is None:
+            if not settings.QDRANT_URL or not settings.QDRANT_API_KEY:
+                raise ValueError(
+                    "Qdrant 配置未设置。请在 .env 文件中配置 QDRANT_URL 和 QDRANT_API_KEY"
+                )
+            self._async_client = AsyncQdrantClient(
+                url=settings.QDRANT_URL,
+                api_key=settings.QDRANT_API_KEY,
+                **self._http_kwargs()
+            )
+        return self._async_client
+    
     def _reset_client(self):
         self._client = None
         self._initialized = False
@@ -144,18 +181,39 @@ class QdrantService:
                 raise
     
     @qdrant_operation_retry
-    def _upsert_points(self, points: List[PointStruct]):
+    def _upsert_points(self, points: List[PointStruct], wait: bool = True):
         """插入/更新点（带重试）"""
         self.client.upsert(
             collection_name=self.collection_name,
-            points=points
+            points=points,
+            wait=wait
         )
     
+    def _upsert_points_batched(self, points: List[PointStruct], wait: bool = True):
+        """
+        分批并行写入点：每批 UPSERT_BATCH_SIZE 个，最多 UPSERT_PARALLEL 批同时请求
+        
+        每批单独重试，避免一次超大请求超时后整体重传
+        """
+        batch_size = QdrantConfig.UPSERT_BATCH_SIZE
+        if len(points) <= batch_size:
+            self._upsert_points(points, wait=wait)
+            return
+        
+        batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+        with ThreadPoolExecutor(
+            max_workers=min(QdrantConfig.UPSERT_PARALLEL, len(batches)),
+            thread_name_prefix="qdrant-upsert"
+        ) as executor:
+            # list() 消费结果，任一批次失败时抛出异常
+            list(executor.map(lambda batch: self._upsert_points(batch, wait=wait), batches))
+    
     def add_documents(
         self,
         texts: List[str],
         embeddings: List[List[float]],
-        metadata: List[Dict]
+        metadata: List[Dict],
+        wait: bool = True
     ) -> List[str]:
         """
         添加文档到向量数据库
@@ -164,6 +222,7 @@ class QdrantService:
             texts: 文本列表
             embeddings: 向量列表
             metadata: 元数据列表
+            wait: 是否等待索引更新完成；False 时写入 WAL 即返回，点稍后可被检索
             
         Returns:
             文档ID列表
@@ -184,7 +243,7 @@ class QdrantService:
                     )
                 )
             
-            self._upsert_points(points)
+            self._upsert_points_batched(points, wait=wait)
             
             logger.info(f"成功添加 {len(points)} 个文档到向量数据库")
             return [point.id for point in points]
@@ -192,32 +251,146 @@ class QdrantService:
             logger.error(f"添加文档失败: {e}")
             raise
     
-    @qdrant_operation_retry
-    def _search_points(self, query_embedding: List[float], limit: int, score_threshold: float = None):
-        """搜索点（带重试 + ef_search 优化）"""
+    @staticmethod
+    def _search_params():
+        """HNSW 搜索参数（ef_search 优化）"""
         from qdrant_client.models import SearchParams
         
-        # 使用优化的 HNSW 参数
-        search_params = SearchParams(
+        return SearchParams(
             hnsw_ef=QdrantConfig.HNSW_EF_SEARCH,  # 128，提升精准度
             exact=False  # 使用近似搜索（速度更快）
         )
-        
+    
+    def _search_kwargs(self, query_embedding: List[float], limit: int, score_threshold: float = None) -> Dict:
+        """构造搜索参数（ef_search 优化）"""
+        kwargs = {
+            "collection_name": self.collection_name,
+            "query_vector": query_embedding,
+            "limit": limit,
+            "search_params": self._search_params()  # 添加搜索参数
+        }
         if score_threshold and score_threshold > 0:
-            return self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
-                score_threshold=score_threshold,
-                search_params=search_params  # 添加搜索参数
+            kwargs["score_threshold"] = score_threshold
+        return kwargs
+    
+    @qdrant_operation_retry
+    def _search_points(self, query_embedding: List[float], limit: int, score_threshold: float = None):
+        """搜索点（带重试 + ef_search 优化）"""
+        return self.client.search(**self._search_kwargs(query_embedding, limit, score_threshold))
+    
+    @qdrant_operation_retry
+    async def _search_points_async(self, query_embedding: List[float], limit: int, score_threshold: float = None):
+        """搜索点（异步，带重试 + ef_search 优化）"""
+        return await self.async_client.search(**self._search_kwargs(query_embedding, limit, score_threshold))
+    
+    @qdrant_operation_retry
+    async def _search_batch_points_async(self, requests: List):
+        """批量搜索点（异步，带重试），多组查询一次 RPC 完成"""
+        return await self.async_client.search_batch(
+            collection_name=self.collection_name,
+            requests=requests
+        )
+    
+    def _search_cache_key(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        score_threshold: float,
+        query_text: Optional[str]
+    ) -> str:
+        """搜索结果缓存键（使用 embedding 的哈希值，更准确）"""
+        embedding_hash = hashlib.md5(
+            str(query_embedding).encode()
+        ).hexdigest()[:16]
+        
+        return cache_service.cache_key(
+            CacheConfig.SEARCH_CACHE_PREFIX,
+            embedding_hash=embedding_hash,
+            limit=limit,
+            score_threshold=score_threshold,
+            query_text=query_text,
+            collection=self.collection_name
+        )
+    
+    def _process_search_results(
+        self,
+        results,
+        limit: int,
+        query_text: Optional[str],
+        start_time: float
+    ) -> List[Dict]:
+        """搜索结果去重、关键词匹配优先级排序并截取前 limit 条"""
+        documents = []
+        seen_contents = set()
+        seen_file_chunks = {}
+        
+        for result in results:
+            content = result.payload.get("text", "").strip()
+            if not content:
+                continue
+            
+            content_fingerprint = content[:100]
+            if content_fingerprint in seen_contents:
+                continue
+            seen_contents.add(content_fingerprint)
+            
+            file_id = result.payload.get("file_id", "unknown")
+            chunk_count = seen_file_chunks.get(file_id, 0)
+            if chunk_count >= ProcessingConfig.MAX_CHUNKS_PER_FILE:
+                continue
+            seen_file_chunks[file_id] = chunk_count + 1
+            
+            doc = {
+                "content": content,
+                "metadata": {
+                    k: v for k, v in result.payload.items() if k != "text"
+                },
+                "score": result.score
+            }
+            
+            if query_text:
+                query_lower = query_text.lower()
+                content_lower = content.lower()
+                
+                doc["has_exact_match"] = query_lower in content_lower
+                
+                keywords = query_lower.split()
+                match_count = sum(1 for kw in keywords if kw in content_lower)
+                doc["keyword_match_count"] = match_count
+                doc["has_keyword"] = match_count > 0
+            
+            documents.append(doc)
+        
+        if query_text:
+            def sort_key(doc):
+                if doc.get("has_exact_match", False):
+                    return (3, doc["score"])
+                elif doc.get("keyword_match_count", 0) > 1:
+                    return (2, doc["score"])
+                elif doc.get("has_keyword", False):
+                    return (1, doc["score"])
+                else:
+                    return (0, doc["score"])
+            
+            documents = sorted(documents, key=sort_key, reverse=True)
+            
+            exact_match_count = sum(1 for d in documents if d.get("has_exact_match", False))
+            keyword_match_count = sum(1 for d in documents if d.get("has_keyword", False))
+            
+            logger.info(
+                f"检索完成: 完全匹配={exact_match_count}, "
+                f"关键词匹配={keyword_match_count}, "
+                f"总文档={len(documents)}, "
+                f"耗时={time.time() - start_time:.3f}s"
             )
         else:
-            return self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
-                search_params=search_params  # 添加搜索参数
+            documents = sorted(documents, key=lambda x: x["score"], reverse=True)
+            logger.info(
+                f"检索完成: 返回{len(documents)}个文档, "
+                f"耗时={time.time() - start_time:.3f}s"
             )
+        
+        return documents[:limit]
     
     def search(
         self,
@@ -238,26 +411,11 @@ class QdrantService:
         Returns:
             搜索结果列表，每个包含 content 和 metadata
         """
-        import time
-        import hashlib
         start_time = time.time()
         
         # 检查缓存是否启用
         if CacheConfig.ENABLE_CACHE:
-            # 使用embedding的哈希值作为缓存键（更准确）
-            embedding_hash = hashlib.md5(
-                str(query_embedding).encode()
-            ).hexdigest()[:16]
-            
-            cache_key = cache_service.cache_key(
-                CacheConfig.SEARCH_CACHE_PREFIX,
-                embedding_hash=embedding_hash,
-                limit=limit,
-                score_threshold=score_threshold,
-                query_text=query_text,
-                collection=self.collection_name
-            )
-            
+            cache_key = self._search_cache_key(query_embedding, limit, score_threshold, query_text)
             cached_result = cache_service.get(cache_key)
             if cached_result is not None:
                 logger.info(f"检索结果缓存命中 (耗时: {time.time() - start_time:.3f}s)")
@@ -268,91 +426,52 @@ class QdrantService:
             
             results = self._search_points(query_embedding, search_limit, score_threshold)
             
-            documents = []
-            seen_contents = set()
-            seen_file_chunks = {}
+            documents = self._process_search_results(results, limit, query_text, start_time)
             
-            for result in results:
-                content = result.payload.get("text", "").strip()
-                if not content:
-                    continue
-                
-                content_fingerprint = content[:100]
-                if content_fingerprint in seen_contents:
-                    continue
-                seen_contents.add(content_fingerprint)
-                
-                file_id = result.payload.get("file_id", "unknown")
-                chunk_count = seen_file_chunks.get(file_id, 0)
-                if chunk_count >= ProcessingConfig.MAX_CHUNKS_PER_FILE:
-                    continue
-                seen_file_chunks[file_id] = chunk_count + 1
-                
-                doc = {
-                    "content": content,
-                    "metadata": {
-                        k: v for k, v in result.payload.items() if k != "text"
-                    },
-                    "score": result.score
-                }
-                
-                if query_text:
-                    query_lower = query_text.lower()
-                    content_lower = content.lower()
-                    
-                    doc["has_exact_match"] = query_lower in content_lower
-                    
-                    keywords = query_lower.split()
-                    match_count = sum(1 for kw in keywords if kw in content_lower)
-                    doc["keyword_match_count"] = match_count
-                    doc["has_keyword"] = match_count > 0
-                
-                documents.append(doc)
-            
-            if query_text:
-                def sort_key(doc):
-                    if doc.get("has_exact_match", False):
-                        return (3, doc["score"])
-                    elif doc.get("keyword_match_count", 0) > 1:
-                        return (2, doc["score"])
-                    elif doc.get("has_keyword", False):
-                        return (1, doc["score"])
-                    else:
-                        return (0, doc["score"])
-                
-                documents = sorted(documents, key=sort_key, reverse=True)
-                
-                exact_match_count = sum(1 for d in documents if d.get("has_exact_match", False))
-                keyword_match_count = sum(1 for d in documents if d.get("has_keyword", False))
-                
-                logger.info(
-                    f"检索完成: 完全匹配={exact_match_count}, "
-                    f"关键词匹配={keyword_match_count}, "
-                    f"总文档={len(documents)}, "
-                    f"耗时={time.time() - start_time:.3f}s"
-                )
-            else:
-                documents = sorted(documents, key=lambda x: x["score"], reverse=True)
-                logger.info(
-                    f"检索完成: 返回{len(documents)}个文档, "
-                    f"耗时={time.time() - start_time:.3f}s"
+            if CacheConfig.ENABLE_CACHE:
+                cache_service.set(
+                    cache_key,
+                    documents,
+                    ttl=CacheConfig.SEARCH_RESULT_CACHE_TTL
                 )
             
-            documents = documents[:limit]
+            return documents
+        except Exception as e:
+            logger.error(f"向量搜索失败: {e}", exc_info=True)
+            if settings.MODE == "development":
+                logger.warning("向量搜索失败，返回空结果")
+                return []
+            raise
+    
+    async def search_async(
+        self,
+        query_embedding: List[float],
+        limit: int = QdrantConfig.DEFAULT_SEARCH_LIMIT,
+        score_threshold: float = QdrantConfig.DEFAULT_SCORE_THRESHOLD,
+        query_text: str = None
+    ) -> List[Dict]:
+        """
+        向量相似度搜索（异步版本，使用 AsyncQdrantClient，不阻塞事件循环）
+        
+        参数、缓存与返回值同 search
+        """
+        start_time = time.time()
+        
+        if CacheConfig.ENABLE_CACHE:
+            cache_key = self._search_cache_key(query_embedding, limit, score_threshold, query_text)
+            cached_result = cache_service.get(cache_key)
+            if cached_result is not None:
+                logger.info(f"检索结果缓存命中 (耗时: {time.time() - start_time:.3f}s)")
+                return cached_result
+        
+        try:
+            search_limit = limit * SearchConfig.EXPANDED_SEARCH_MULTIPLIER if query_text else limit
+            
+            results = await self._search_points_async(query_embedding, search_limit, score_threshold)
+            
+            documents = self._process_search_results(results, limit, query_text, start_time)
             
             if CacheConfig.ENABLE_CACHE:
-                embedding_hash = hashlib.md5(
-                    str(query_embedding).encode()
-                ).hexdigest()[:16]
-                
-                cache_key = cache_service.cache_key(
-                    CacheConfig.SEARCH_CACHE_PREFIX,
-                    embedding_hash=embedding_hash,
-                    limit=limit,
-                    score_threshold=score_threshold,
-                    query_text=query_text,
-                    collection=self.collection_name
-                )
                 cache_service.set(
                     cache_key,
                     documents,
@@ -367,6 +486,78 @@ class QdrantService:
                 return []
             raise
     
+    async def search_batch_async(
+        self,
+        query_embedding: List[float],
+        searches: List[Tuple[int, float]],
+        query_text: str = None
+    ) -> List[List[Dict]]:
+        """
+        同一查询向量的多组搜索（异步，一次 search_batch RPC）
+        
+        用于严格检索 + 降级检索等需要多组 limit / 阈值的场景，
+        未命中缓存的各组合并为一次请求，省去多次网络往返。
+        
+        Args:
+            query_embedding: 查询向量
+            searches: [(limit, score_threshold), ...]
+            query_text: 查询文本（用于关键词匹配优先级）
+            
+        Returns:
+            与 searches 一一对应的搜索结果列表
+        """
+        from qdrant_client.models import SearchRequest
+        
+        start_time = time.time()
+        
+        cache_keys = [
+            self._search_cache_key(query_embedding, limit, score_threshold, query_text)
+            for limit, score_threshold in searches
+        ]
+        batch_results: List[Optional[List[Dict]]] = [None] * len(searches)
+        if CacheConfig.ENABLE_CACHE:
+            batch_results = [cache_service.get(cache_key) for cache_key in cache_keys]
+        
+        pending = [i for i, documents in enumerate(batch_results) if documents is None]
+        if not pending:
+            logger.info(f"批量检索结果缓存命中 (耗时: {time.time() - start_time:.3f}s)")
+            return batch_results
+        
+        try:
+            requests = []
+            for i in pending:
+                limit, score_threshold = searches[i]
+                search_limit = limit * SearchConfig.EXPANDED_SEARCH_MULTIPLIER if query_text else limit
+                requests.append(SearchRequest(
+                    vector=query_embedding,
+                    limit=search_limit,
+                    score_threshold=score_threshold if score_threshold and score_threshold > 0 else None,
+                    params=self._search_params(),
+                    with_payload=True
+                ))
+            
+            responses = await self._search_batch_points_async(requests)
+            
+            for i, results in zip(pending, responses):
+                limit, _ = searches[i]
+                documents = self._process_search_results(results, limit, query_text, start_time)
+                batch_results[i] = documents
+                
+                if CacheConfig.ENABLE_CACHE:
+                    cache_service.set(
+                        cache_keys[i],
+                        documents,
+                        ttl=CacheConfig.SEARCH_RESULT_CACHE_TTL
+                    )
+            
+            return batch_results
+        except Exception as e:
+            logger.error(f"批量向量搜索失败: {e}", exc_info=True)
+            if settings.MODE == "development":
+                logger.warning("批量向量搜索失败，返回空结果")
+                return [[] for _ in searches]
+            raise
+    
     @qdrant_operation_retry
     def _scroll_points(self, filter_condition, limit: int):
         """滚动查询点（带重试）"""
@@ -378,6 +569,61 @@ class QdrantService:
             with_vectors=False
         )
     
+    @qdrant_operation_retry
+    def _scroll_points_page(self, filter_condition, limit: int, offset=None):
+        """分页滚动查询点，包含 payload 与向量（带重试）"""
+        return self.client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=filter_condition,
+            limit=limit,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+    
+    def copy_file_points(self, source_file_id: str, payload_updates: Dict, wait: bool = True) -> int:
+        """
+        复制某个文件的全部向量点，生成新点 ID 并覆盖部分 payload
+        
+        用于重复上传相同内容的文档：直接复用已有 embedding，无需重新解析和生成向量。
+        复制出的点与原文件相互独立，删除任一文件不影响另一个。
+        
+        Args:
+            source_file_id: 源文件ID
+            payload_updates: 需要覆盖的 payload 字段（如 file_id、filename、upload_time）
+            wait: 是否等待索引更新完成
+            
+        Returns:
+            复制的点数，源文件没有点时为 0
+        """
+        try:
+            filter_condition = self._build_delete_filter(file_id=source_file_id)
+            points = []
+            offset = None
+            while True:
+                records, offset = self._scroll_points_page(
+                    filter_condition, QdrantConfig.UPSERT_BATCH_SIZE, offset
+                )
+                points.extend(
+                    PointStruct(
+                        id=str(uuid.uuid4()),
+                        vector=record.vector,
+                        payload={**record.payload, **payload_updates}
+                    )
+                    for record in records
+                )
+                if offset is None:
+                    break
+            
+            if points:
+                self._upsert_points_batched(points, wait=wait)
+            
+            logger.info(f"从 {source_file_id} 复制了 {len(points)} 个向量点")
+            return len(points)
+        except Exception as e:
+            logger.error(f"复制向量点失败: {e}")
+            raise
+    
     @qdrant_operation_retry
     def _delete_points(self, point_ids: List):
         """删除点（带重试）"""
@@ -387,6 +633,31 @@ class QdrantService:
             wait=True
         )
     
+    @staticmethod
+    def _build_delete_filter(file_id: str = None, filename: str = None):
+        """构建按 file_id 或 filename 删除的过滤条件"""
+        from qdrant_client.models import Filter, FieldCondition, MatchValue
+        
+        if file_id:
+            return Filter(
+                must=[
+                    FieldCondition(
+                        key="file_id",
+                        match=MatchValue(value=file_id)
+                    )
+                ]
+            )
+        elif filename:
+            return Filter(
+                must=[
+                    FieldCondition(
+                        key="filename",
+                        match=MatchValue(value=filename)
+                    )
+                ]
+            )
+        raise ValueError("必须提供 file_id 或 filename")
+    
     def delete_documents(self, file_id: str = None, filename: str = None):
         """
         删除指定文件的所有文档（同时清除相关缓存）
@@ -396,28 +667,7 @@ class QdrantService:
             filename: 文件名（完整文件名）
         """
         try:
-            from qdrant_client.models import Filter, FieldCondition, MatchValue
-            
-            if file_id:
-                filter_condition = Filter(
-                    must=[
-                        FieldCondition(
-                            key="file_id",
-                            match=MatchValue(value=file_id)
-                        )
-                    ]
-                )
-            elif filename:
-                filter_condition = Filter(
-                    must=[
-                        FieldCondition(
-                            key="filename",
-                            match=MatchValue(value=filename)
-                        )
-                    ]
-                )
-            else:
-                raise ValueError("必须提供 file_id 或 filename")
+            filter_condition = self._build_delete_filter(file_id, filename)
             
             scroll_result = self._scroll_points(filter_condition, QdrantConfig.MAX_DELETE_POINTS)
             
@@ -443,6 +693,79 @@ class QdrantService:
             logger.error(f"删除文档失败: {e}", exc_info=True)
             raise
     
+    @qdrant_operation_retry
+    async def _scroll_points_async(self, filter_condition, limit: int):
+        """滚动查询点（异步，带重试）"""
+        return await self.async_client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=filter_condition,
+            limit=limit,
+            with_payload=False,
+            with_vectors=False
+        )
+    
+    @qdrant_operation_retry
+    async def _delete_points_async(self, point_ids: List):
+        """删除点（异步，带重试）"""
+        await self.async_client.delete(
+            collection_name=self.collection_name,
+            points_selector=point_ids,
+            wait=True
+        )
+    
+    async def delete_documents_async(self, file_id: str = None, filename: str = None):
+        """
+        删除指定文件的所有文档（异步版本，不阻塞事件循环）
+        
+        Args:
+            file_id: 文件ID（文件名不含扩展名）
+            filename: 文件名（完整文件名）
+        """
+        try:
+            filter_condition = self._build_delete_filter(file_id, filename)
+            
+            scroll_result = await self._scroll_points_async(filter_condition, QdrantConfig.MAX_DELETE_POINTS)
+            
+            point_ids = [point.id for point in scroll_result[0]]
+            
+            if not point_ids:
+                logger.info(f"未找到匹配的文档: file_id={file_id}, filename={filename}")
+                return 0
+            
+            await self._delete_points_async(point_ids)
+            
+            deleted_count = len(point_ids)
+            logger.info(f"成功删除 {deleted_count} 个文档块: file_id={file_id}, filename={filename}")
+            
+            # 清除搜索缓存（因为知识库已更新）
+            if CacheConfig.ENABLE_CACHE:
+                cache_service.clear(prefix=CacheConfig.SEARCH_CACHE_PREFIX)
+                logger.info("已清除搜索缓存")
+            
+            return deleted_count
+            
+        except Exception as e:
+            logger.error(f"删除文档失败: {e}", exc_info=True)
+            raise
+    
+    @qdrant_operation_retry
+    async def delete_file_points_async(self, file_id: str):
+        """
+        按过滤条件删除某文件的全部点（异步，带重试）
+        
+        与 delete_documents_async 先滚动查询再按 ID 删除不同，过滤删除在服务端
+        排在此前 wait=False 的写入之后执行，不会漏掉尚未落盘的点；用于清理处理失败的上传
+        """
+        from qdrant_client.models import FilterSelector
+        
+        await self.async_client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=self._build_delete_filter(file_id=file_id)),
+            wait=True
+        )
+        if CacheConfig.ENABLE_CACHE:
+            cache_service.clear(prefix=CacheConfig.SEARCH_CACHE_PREFIX)
+    
     @qdrant_operation_retry
     def _scroll_all_points(self, limit: int, offset=None):
         """滚动查询所有点（带重试）"""
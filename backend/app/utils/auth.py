@@ -4,12 +4,21 @@ JWT 认证工具
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from app.core.config import settings
+from app.core.constants import CacheConfig
+from app.utils.ttl_cache import TTLCache
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import hashlib
 
 security = HTTPBearer()
 
+# 已校验 token 的短期缓存：key 为 token 的 SHA-256 前缀，value 为解码后的 payload
+_token_cache = TTLCache(
+    maxsize=CacheConfig.JWT_VERIFY_CACHE_MAXSIZE,
+    ttl=CacheConfig.JWT_VERIFY_CACHE_TTL
+)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -50,12 +59,22 @@ def verify_token(token: str) -> dict:
     Raises:
         HTTPException: token 无效或过期
     """
+    cache_key = hashlib.sha256(token.encode("utf-8")).digest()[:16]
+    cached_payload = _token_cache.get(cache_key)
+    if cached_payload is not None:
+        return cached_payload
+    
     try:
         payload = jwt.decode(
             token,
             settings.JWT_SECRET_KEY,
             algorithms=[settings.JWT_ALGORITHM]
         )
+        
+        # 缓存时间不超过 token 自身的过期时间
+        exp = payload.get("exp")
+        _token_cache.set(cache_key, payload, expires_at=float(exp) if exp else None)
+        
         return payload
     except JWTError:
         raise HTTPException(
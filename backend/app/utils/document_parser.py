@@ -1,5 +1,6 @@
+import codecs
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union, BinaryIO
 from io import BytesIO
 import re
 import PyPDF2
@@ -12,18 +13,33 @@ logger = logging.getLogger(__name__)
 
 class DocumentParser:
     @staticmethod
-    def parse_pdf(file_content: bytes) -> List[str]:
+    def decode_text(file_content: bytes) -> str:
+        """
+        解码文本文件内容
+        
+        有 UTF-8 BOM 时去掉 BOM，否则先按 UTF-8 解码；失败时按 GB18030（GBK 的超集）解码，
+        无法识别的字节替换为占位符。最多扫描两遍，不依赖编码探测库。
+        """
+        if file_content.startswith(codecs.BOM_UTF8):
+            return file_content.decode('utf-8-sig', errors='replace')
+        try:
+            return file_content.decode('utf-8')
+        except UnicodeDecodeError:
+            return file_content.decode('gb18030', errors='replace')
+    
+    @staticmethod
+    def parse_pdf(file_content: Union[bytes, BinaryIO]) -> List[str]:
         """
         解析 PDF 文件
         
         Args:
-            file_content: PDF 文件内容（字节）
+            file_content: PDF 文件内容（字节或可 seek 的文件对象）
             
         Returns:
             文本块列表
         """
         try:
-            pdf_file = BytesIO(file_content)
+            pdf_file = BytesIO(file_content) if isinstance(file_content, bytes) else file_content
             pdf_reader = PyPDF2.PdfReader(pdf_file)
             
             texts = []
@@ -38,18 +54,18 @@ class DocumentParser:
             raise
     
     @staticmethod
-    def parse_docx(file_content: bytes) -> List[str]:
+    def parse_docx(file_content: Union[bytes, BinaryIO]) -> List[str]:
         """
         解析 Word 文档（支持中文）
         
         Args:
-            file_content: DOCX 文件内容（字节）
+            file_content: DOCX 文件内容（字节或可 seek 的文件对象）
             
         Returns:
             文本块列表
         """
         try:
-            doc_file = BytesIO(file_content)
+            doc_file = BytesIO(file_content) if isinstance(file_content, bytes) else file_content
             doc = Document(doc_file)
             
             texts = []
@@ -95,21 +111,13 @@ class DocumentParser:
             文本块列表
         """
         try:
-            text = file_content.decode('utf-8')
+            text = DocumentParser.decode_text(file_content)
             if not text.strip():
                 logger.warning("TXT 文件内容为空")
                 return [""]
             
             lines = [line.strip() for line in text.split('\n') if line.strip()]
             return lines if lines else [text]
-        except UnicodeDecodeError:
-            try:
-                text = file_content.decode('gbk')
-                lines = [line.strip() for line in text.split('\n') if line.strip()]
-                return lines if lines else [text]
-            except Exception as e:
-                logger.error(f"TXT 文件解析失败: {e}")
-                raise ValueError(f"无法解析文本文件，编码不支持: {e}")
         except Exception as e:
             logger.error(f"TXT 解析失败: {e}")
             raise
@@ -131,10 +139,7 @@ class DocumentParser:
         """
         try:
             # 解码文件内容
-            try:
-                text = file_content.decode('utf-8')
-            except UnicodeDecodeError:
-                text = file_content.decode('gbk')
+            text = DocumentParser.decode_text(file_content)
             
             if not text.strip():
                 logger.warning("Markdown 文件内容为空")
@@ -220,18 +225,18 @@ class DocumentParser:
             raise
     
     @staticmethod
-    def parse_excel(file_content: bytes) -> List[str]:
+    def parse_excel(file_content: Union[bytes, BinaryIO]) -> List[str]:
         """
         解析 Excel 文件
         
         Args:
-            file_content: Excel 文件内容（字节）
+            file_content: Excel 文件内容（字节或可 seek 的文件对象）
             
         Returns:
             文本块列表
         """
         try:
-            excel_file = BytesIO(file_content)
+            excel_file = BytesIO(file_content) if isinstance(file_content, bytes) else file_content
             workbook = openpyxl.load_workbook(excel_file)
             
             texts = []
@@ -0,0 +1,73 @@
+"""
+HTTP 缓存与 Range 请求工具
+供文档与图片的文件下载/预览接口共用
+"""
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+
+from app.db.models import Document
+
+
+def parse_byte_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range 请求头（bytes=start-end / bytes=start- / bytes=-suffix）
+    
+    Returns:
+        (start, end) 闭区间；格式不支持时返回 None（按完整文件响应）
+        
+    Raises:
+        ValueError: 范围无法满足（起点超出文件大小）
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        start = int(start_str) if start_str else None
+        end = int(end_str) if end_str else None
+    except ValueError:
+        return None
+    
+    if start is None:
+        # 后缀范围：最后 N 个字节
+        if not end:
+            raise ValueError("无效的 Range 请求")
+        start, end = max(file_size - end, 0), file_size - 1
+    elif end is None:
+        end = file_size - 1
+    
+    if start >= file_size or end < start:
+        raise ValueError("无效的 Range 请求")
+    return start, min(end, file_size - 1)
+
+
+def document_cache_headers(document: Document) -> Dict[str, str]:
+    """
+    文档缓存校验头
+    
+    优先使用上传时计算的内容哈希作为强 ETag；早期上传的文档没有哈希，
+    使用 file_id（每次上传生成新的 file_id，文件内容上传后不再变化）
+    """
+    created_at = document.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return {
+        'ETag': f'"{document.content_hash or document.file_id}"',
+        'Last-Modified': format_datetime(created_at.astimezone(timezone.utc), usegmt=True)
+    }
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """请求携带的 If-None-Match 与 ETag 匹配时，客户端缓存仍然有效"""
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
@@ -0,0 +1,37 @@
+"""
+游标分页工具
+游标格式为 "created_at|唯一键"，按 (created_at DESC, 唯一键 DESC) 排序，
+唯一键作为同一时间戳下的次级排序，保证翻页时不会跳过或重复记录
+"""
+from datetime import datetime
+from typing import Callable, Tuple, TypeVar
+
+from fastapi import HTTPException, status
+
+K = TypeVar("K")
+
+CURSOR_SEPARATOR = "|"
+
+
+def encode_cursor(created_at: datetime, key) -> str:
+    """根据最后一条记录的创建时间和唯一键生成下一页游标"""
+    return f"{created_at.isoformat()}{CURSOR_SEPARATOR}{key}"
+
+
+def decode_cursor(cursor: str, key_type: Callable[[str], K] = str) -> Tuple[datetime, K]:
+    """
+    解析游标
+
+    Raises:
+        HTTPException: 游标格式无效（400）
+    """
+    created_at_str, sep, key_str = cursor.rpartition(CURSOR_SEPARATOR)
+    try:
+        if not sep or not key_str:
+            raise ValueError(cursor)
+        return datetime.fromisoformat(created_at_str), key_type(key_str)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
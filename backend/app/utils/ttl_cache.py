@@ -0,0 +1,54 @@
+"""
+进程内 TTL + LRU 缓存
+用于 JWT 校验结果、用户记录等热点数据的短期缓存
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+import time
+
+
+class TTLCache:
+    """线程安全的有界 TTL 缓存（超出容量时淘汰最久未使用的条目）"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，不存在或已过期时返回 None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """
+        设置缓存值
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+            expires_at: 绝对过期时间戳，不得晚于默认 TTL（用于对齐 token 的 exp 等）
+        """
+        default_expires_at = time.time() + self.ttl
+        if expires_at is None or expires_at > default_expires_at:
+            expires_at = default_expires_at
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key: Hashable):
+        """删除缓存值"""
+        with self._lock:
+            self._data.pop(key, None)
@@ -0,0 +1,49 @@
+"""
+上传内容暂存
+供文档上传与图片上传共用
+"""
+from io import BytesIO
+from typing import BinaryIO
+import hashlib
+import tempfile
+
+
+class UploadSpool:
+    """
+    上传内容暂存：小文件留在内存，超过阈值后落盘
+    
+    与 SpooledTemporaryFile 不同，可以打开多个相互独立的读句柄，
+    供存储上传与文档解析在不同线程中同时读取。
+    """
+    
+    def __init__(self, max_memory: int):
+        self.max_memory = max_memory
+        self.size = 0
+        self._buffer = BytesIO()
+        self._file = None
+        self._hasher = hashlib.sha256()
+    
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self._hasher.update(chunk)
+        if self._file is None and self.size > self.max_memory:
+            self._file = tempfile.NamedTemporaryFile()
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        (self._file or self._buffer).write(chunk)
+    
+    def sha256(self) -> str:
+        """已写入内容的 SHA-256（十六进制）"""
+        return self._hasher.hexdigest()
+    
+    def open_reader(self) -> BinaryIO:
+        """打开一个独立的读句柄（从头读取），调用方负责关闭"""
+        if self._file is None:
+            return BytesIO(self._buffer.getvalue())
+        self._file.flush()
+        return open(self._file.name, 'rb')
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._buffer = None
@@ -0,0 +1,62 @@
+"""
+测试公共配置
+
+测试使用临时 SQLite 数据库，不依赖 Redis、Qdrant、OpenAI 等外部服务
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# 必须在导入 app 之前设置，settings 在导入时读取环境变量
+os.environ.setdefault("MODE", "development")
+os.environ.setdefault("DB_ECHO", "false")
+os.environ.setdefault("REDIS_URL", "")
+os.environ.setdefault("STORAGE_TYPE", "local")
+os.environ.setdefault("LOCAL_STORAGE_PATH", tempfile.mkdtemp(prefix="knowledgehub-test-"))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from app.db.database import Base  # noqa: E402
+from app.db import models  # noqa: E402,F401  注册所有模型到 Base.metadata
+from app.services.cache_service import cache_service  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """未配置 Redis 时缓存在进程内存中，每个测试前清空，避免读到其他测试数据库的结果"""
+    cache_service.clear()
+    yield
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    每个测试独立的 SQLite 数据库，返回 AsyncSession 工厂
+
+    测试函数通过 asyncio.run 执行异步逻辑，每次运行都是新的事件循环，
+    因此使用 NullPool，避免连接跨事件循环复用
+    """
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}",
+        poolclass=NullPool
+    )
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    asyncio.run(engine.dispose())
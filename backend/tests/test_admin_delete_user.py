@@ -0,0 +1,135 @@
+"""
+删除用户测试：SQLite 默认不启用外键约束，关联数据必须由 delete_user 显式删除
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from app.api import admin
+from app.db.models import (
+    Conversation, Document, Image, ImageTag, Message, RegistrationCode,
+    TokenUsage, User, image_tag_association
+)
+
+# 跳过限流装饰器，直接调用路由函数
+delete_user = admin.delete_user.__wrapped__
+
+
+async def _create_user_with_data(db):
+    admin_user = User(email="admin@example.com", hashed_password="x", role="admin")
+    user = User(email="user@example.com", hashed_password="x")
+    other = User(email="other@example.com", hashed_password="x")
+    db.add_all([admin_user, user, other])
+    await db.flush()
+
+    for owner in (user, other):
+        conversation = Conversation(conversation_id=f"conv-{owner.id}", user_id=owner.id)
+        conversation.messages = [
+            Message(role="user", content="问题"),
+            Message(role="assistant", content="回答")
+        ]
+        db.add(conversation)
+        db.add(Document(
+            file_id=f"doc-{owner.id}",
+            filename="a.txt",
+            file_type="text/plain",
+            file_size=10,
+            user_id=owner.id
+        ))
+        db.add(TokenUsage(user_id=owner.id, usage_date=datetime(2024, 1, 1), total_tokens=100))
+        image = Image(
+            file_id=f"img-{owner.id}",
+            filename=f"img-{owner.id}.png",
+            original_filename="a.png",
+            file_size=10,
+            mime_type="image/png",
+            storage_path=f"images/img-{owner.id}.png",
+            thumbnail_path=f"thumbnails/img-{owner.id}.jpg",
+            user_id=owner.id
+        )
+        image.tags = [ImageTag(name=f"tag-{owner.id}")]
+        db.add(image)
+
+    db.add(RegistrationCode(code="CODE-1", created_by=user.id))
+    await db.commit()
+    return admin_user.id, user.id, other.id
+
+
+async def _count(db, entity, *conditions):
+    return await db.scalar(select(func.count()).select_from(entity).where(*conditions))
+
+
+def test_delete_user_removes_related_rows(session_factory, monkeypatch):
+    deleted_files = []
+
+    async def fake_delete_file(path):
+        deleted_files.append(path)
+        return True
+
+    monkeypatch.setattr(admin.image_storage_service, "delete_file", fake_delete_file)
+
+    async def scenario():
+        async with session_factory() as db:
+            admin_id, user_id, other_id = await _create_user_with_data(db)
+            response = await delete_user(
+                request=None, user_id=user_id, current_admin={"user_id": admin_id}, db=db
+            )
+
+        async with session_factory() as db:
+            counts = {
+                "user": await _count(db, User, User.id == user_id),
+                "conversations": await _count(db, Conversation, Conversation.user_id == user_id),
+                "messages": await _count(db, Message),
+                "documents": await _count(db, Document, Document.user_id == user_id),
+                "token_usage": await _count(db, TokenUsage, TokenUsage.user_id == user_id),
+                "images": await _count(db, Image, Image.user_id == user_id),
+                "image_tags": await _count(db, image_tag_association),
+                "other_conversations": await _count(db, Conversation, Conversation.user_id == other_id),
+                "other_documents": await _count(db, Document, Document.user_id == other_id),
+                "other_images": await _count(db, Image, Image.user_id == other_id),
+            }
+            code_creator = await db.scalar(select(RegistrationCode.created_by))
+        return user_id, response, counts, code_creator
+
+    user_id, response, counts, code_creator = asyncio.run(scenario())
+
+    assert response == {"message": "用户删除成功", "user_id": user_id, "email": "user@example.com"}
+    assert counts == {
+        "user": 0,
+        "conversations": 0,
+        "messages": 2,  # 只剩另一个用户的消息
+        "documents": 0,
+        "token_usage": 0,
+        "images": 0,
+        "image_tags": 1,
+        "other_conversations": 1,
+        "other_documents": 1,
+        "other_images": 1,
+    }
+    assert code_creator is None
+    assert sorted(deleted_files) == [f"images/img-{user_id}.png", f"thumbnails/img-{user_id}.jpg"]
+
+
+def test_delete_missing_user_is_404(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            admin_id, _, _ = await _create_user_with_data(db)
+            await delete_user(request=None, user_id=9999, current_admin={"user_id": admin_id}, db=db)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(scenario())
+    assert exc_info.value.status_code == 404
+
+
+def test_delete_self_is_400(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            admin_id, _, _ = await _create_user_with_data(db)
+            await delete_user(request=None, user_id=admin_id, current_admin={"user_id": admin_id}, db=db)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(scenario())
+    assert exc_info.value.status_code == 400
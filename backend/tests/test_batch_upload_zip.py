@@ -0,0 +1,41 @@
+"""
+ZIP 炸弹防护测试：条目流式解压时超过大小上限立即停止
+"""
+import io
+import zipfile
+
+from app.api.batch_upload import MAX_COMPRESSION_RATIO, read_zip_entry
+
+
+def _make_zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, data in entries.items():
+            zip_file.writestr(name, data)
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+def test_read_zip_entry_within_limit():
+    with _make_zip({"meta.csv": b"filename,description\na.png,test\n"}) as zip_file:
+        assert read_zip_entry(zip_file, "meta.csv", 1024) == b"filename,description\na.png,test\n"
+
+
+def test_read_zip_entry_at_exact_limit():
+    data = b"x" * 1024
+    with _make_zip({"a.bin": data}) as zip_file:
+        assert read_zip_entry(zip_file, "a.bin", len(data)) == data
+
+
+def test_read_zip_entry_over_limit_returns_none():
+    # 8MB 的零字节压缩后只有几 KB，解压到上限即停止，不会把整个条目读入内存
+    bomb = b"\0" * (8 * 1024 * 1024)
+    with _make_zip({"bomb.csv": bomb}) as zip_file:
+        assert read_zip_entry(zip_file, "bomb.csv", 1024 * 1024) is None
+
+
+def test_highly_compressed_entry_exceeds_ratio_limit():
+    # 条目头声明的压缩比用于在解压前跳过可疑图片
+    with _make_zip({"bomb.png": b"\0" * (8 * 1024 * 1024)}) as zip_file:
+        zip_info = zip_file.getinfo("bomb.png")
+        assert zip_info.file_size / max(zip_info.compress_size, 1) > MAX_COMPRESSION_RATIO
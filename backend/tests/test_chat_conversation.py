@@ -0,0 +1,51 @@
+"""
+对话归属检查测试：conversation_id 属于其他用户时返回 404，不能向他人对话追加消息
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.chat import get_user_conversation
+from app.db.models import Conversation, User
+
+
+async def _create_users_and_conversation(db):
+    owner = User(email="owner@example.com", hashed_password="x")
+    other = User(email="other@example.com", hashed_password="x")
+    db.add_all([owner, other])
+    await db.flush()
+    conversation = Conversation(conversation_id="conv-1", user_id=owner.id, title="标题")
+    db.add(conversation)
+    await db.commit()
+    return owner.id, other.id, conversation.id
+
+
+def test_owner_gets_conversation(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            owner_id, _, conversation_pk = await _create_users_and_conversation(db)
+            return conversation_pk, await get_user_conversation(db, "conv-1", owner_id)
+
+    conversation_pk, found = asyncio.run(scenario())
+    assert found == (conversation_pk, "标题")
+
+
+def test_unknown_conversation_returns_none(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            owner_id, _, _ = await _create_users_and_conversation(db)
+            return await get_user_conversation(db, "missing", owner_id)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_other_users_conversation_is_404(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            _, other_id, _ = await _create_users_and_conversation(db)
+            await get_user_conversation(db, "conv-1", other_id)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(scenario())
+    assert exc_info.value.status_code == 404
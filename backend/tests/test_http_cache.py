@@ -0,0 +1,109 @@
+"""
+HTTP 缓存与 Range 请求测试：解析函数与文档下载接口的 206 / 416 / 304 响应
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import documents
+from app.db.database import get_db
+from app.db.models import Document, User
+from app.utils.auth import get_current_user
+from app.utils.http_cache import parse_byte_range
+
+FILE_CONTENT = b"0123456789"
+
+
+@pytest.mark.parametrize("range_header, expected", [
+    ("bytes=2-5", (2, 5)),
+    ("bytes=2-", (2, 9)),
+    ("bytes=-3", (7, 9)),
+    ("bytes=-30", (0, 9)),
+    ("bytes=5-100", (5, 9)),
+    ("bytes=0-1,4-5", None),  # 不支持多段范围，按完整文件响应
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_byte_range(range_header, expected):
+    assert parse_byte_range(range_header, len(FILE_CONTENT)) == expected
+
+
+@pytest.mark.parametrize("range_header", ["bytes=10-", "bytes=5-2", "bytes=-0"])
+def test_unsatisfiable_range_raises(range_header):
+    with pytest.raises(ValueError):
+        parse_byte_range(range_header, len(FILE_CONTENT))
+
+
+@pytest.fixture
+def client(session_factory, tmp_path, monkeypatch):
+    """只挂载文档路由的测试应用，文件存放在临时目录"""
+    monkeypatch.setattr(documents.storage_service, "storage_dir", tmp_path)
+    (tmp_path / "file-1.txt").write_bytes(FILE_CONTENT)
+
+    async def create_document():
+        async with session_factory() as db:
+            user = User(email="user@example.com", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            db.add(Document(
+                file_id="file-1",
+                filename="a.txt",
+                file_type="text/plain",
+                file_size=len(FILE_CONTENT),
+                user_id=user.id,
+                content_hash="abc123"
+            ))
+            await db.commit()
+            return user.id
+
+    user_id = asyncio.run(create_document())
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/documents")
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: {"user_id": user_id}
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_download_full_file(client):
+    response = client.get("/documents/file-1/download")
+    assert response.status_code == 200
+    assert response.content == FILE_CONTENT
+    assert response.headers["etag"] == '"abc123"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(FILE_CONTENT))
+
+
+def test_download_range_returns_206(client):
+    response = client.get("/documents/file-1/download", headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b"2345"
+    assert response.headers["content-range"] == "bytes 2-5/10"
+    assert response.headers["content-length"] == "4"
+
+
+def test_download_unsatisfiable_range_returns_416(client):
+    response = client.get("/documents/file-1/download", headers={"Range": "bytes=10-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */10"
+
+
+@pytest.mark.parametrize("if_none_match", ['"abc123"', 'W/"abc123"', '"other", "abc123"', "*"])
+def test_matching_etag_returns_304(client, if_none_match):
+    response = client.get("/documents/file-1/download", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == '"abc123"'
+
+
+def test_stale_etag_returns_full_file(client):
+    response = client.get("/documents/file-1/download", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.content == FILE_CONTENT
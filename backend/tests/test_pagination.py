@@ -0,0 +1,97 @@
+"""
+游标分页测试：同一 created_at 的多条记录跨页时不能跳过或重复
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.admin import _load_documents_page, _load_users_page
+from app.db.models import Document, User
+from app.utils.pagination import decode_cursor, encode_cursor
+
+SAME_TIME = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(SAME_TIME, 42)
+    assert decode_cursor(cursor, int) == (SAME_TIME, 42)
+
+
+def test_cursor_keeps_separator_in_key():
+    # 文档游标的唯一键是 file_id，按最后一个分隔符拆分
+    cursor = encode_cursor(SAME_TIME, "a|b")
+    assert decode_cursor(cursor) == (SAME_TIME, "a|b")
+
+
+@pytest.mark.parametrize("cursor", ["", "no-separator", "2024-01-01T12:00:00|", "not-a-date|1"])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, int)
+    assert exc_info.value.status_code == 400
+
+
+def test_invalid_key_type_is_400():
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(encode_cursor(SAME_TIME, "abc"), int)
+    assert exc_info.value.status_code == 400
+
+
+async def _collect_pages(loader, db, limit):
+    """按游标依次翻页，返回所有页的记录和页数"""
+    items, pages, cursor = [], 0, None
+    while True:
+        page = await loader(db, limit, cursor)
+        items.extend(page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+
+def test_users_with_same_created_at_are_paged_once(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            db.add_all([
+                User(email=f"user{i}@example.com", hashed_password="x", created_at=SAME_TIME)
+                for i in range(7)
+            ])
+            db.add(User(email="newest@example.com", hashed_password="x", created_at=datetime(2024, 1, 2)))
+            await db.commit()
+            return await _collect_pages(_load_users_page, db, limit=3)
+
+    items, pages = asyncio.run(scenario())
+    emails = [item["email"] for item in items]
+    assert len(emails) == 8
+    assert len(set(emails)) == 8
+    assert emails[0] == "newest@example.com"
+    assert pages == 3
+
+
+def test_documents_with_same_created_at_are_paged_once(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            owner = User(email="owner@example.com", hashed_password="x")
+            db.add(owner)
+            await db.flush()
+            db.add_all([
+                Document(
+                    file_id=f"file-{i}",
+                    filename=f"doc{i}.txt",
+                    file_type="text/plain",
+                    file_size=10,
+                    user_id=owner.id,
+                    created_at=SAME_TIME
+                )
+                for i in range(5)
+            ])
+            await db.commit()
+            return await _collect_pages(_load_documents_page, db, limit=2)
+
+    items, pages = asyncio.run(scenario())
+    file_ids = [item["file_id"] for item in items]
+    assert sorted(file_ids) == [f"file-{i}" for i in range(5)]
+    # 同一时间戳下按主键倒序
+    assert file_ids == [f"file-{i}" for i in reversed(range(5))]
+    assert pages == 3
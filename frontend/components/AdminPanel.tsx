@@ -40,6 +40,11 @@ export default function AdminPanel({ isOpen, onClose }: AdminPanelProps) {
   const [editQuotaValue, setEditQuotaValue] = useState<string>('')
   const [userTokenSummary, setUserTokenSummary] = useState<any>(null)
 
+  // 游标分页：列表按需加载，next_cursor 为空时没有更多数据
+  const [documentsCursor, setDocumentsCursor] = useState<string | null>(null)
+  const [usersCursor, setUsersCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+
   const formatLosAngelesDate = (dateString: string) => {
     const date = new Date(dateString)
     return date.toLocaleString('en-US', {
@@ -126,32 +131,47 @@ export default function AdminPanel({ isOpen, onClose }: AdminPanelProps) {
     }
   }
 
-  const loadDocuments = async () => {
+  const loadDocuments = async (cursor: string | null = null) => {
     try {
-      const docs = await adminApi.getAllDocuments()
-      setDocuments(docs)
+      const page = await adminApi.getDocuments(cursor)
+      setDocuments(prev => cursor ? [...prev, ...page.items] : page.items)
+      setDocumentsCursor(page.next_cursor)
     } catch (error: any) {
       console.error('Failed to load documents:', error)
       toast.error('Failed to load data')
     }
   }
 
-  const loadUsers = async () => {
+  const loadUsers = async (cursor: string | null = null) => {
     try {
-      const [userList, stats, tokenSummary] = await Promise.all([
-        adminApi.getAllUsers(),
-        adminApi.getUserStats(),
-        adminApi.getUsersTokenSummary()
+      const [page, stats] = await Promise.all([
+        adminApi.getUsers(cursor),
+        adminApi.getUserStats()
       ])
-      setUsers(userList)
+      // 只获取当前页用户的 Token 使用情况
+      const tokenSummary = page.items.length > 0
+        ? await adminApi.getUsersTokenSummary(page.items.map(user => user.id))
+        : { total_users: stats.total_users, users: [] }
+      setUsers(prev => cursor ? [...prev, ...page.items] : page.items)
+      setUsersCursor(page.next_cursor)
       setUserStats(stats)
-      setUserTokenSummary(tokenSummary)
+      setUserTokenSummary((prev: any) => ({
+        ...tokenSummary,
+        users: cursor && prev ? [...prev.users, ...tokenSummary.users] : tokenSummary.users
+      }))
     } catch (error: any) {
       console.error('Failed to load users:', error)
       toast.error('Failed to load data')
     }
   }
 
+  const loadMore = async (loader: (cursor: string | null) => Promise<void>, cursor: string | null) => {
+    if (!cursor) return
+    setLoadingMore(true)
+    await loader(cursor)
+    setLoadingMore(false)
+  }
+
   const handleDeleteUser = async (userId: number, email: string) => {
     const confirmed = await confirm(
       `Are you sure you want to delete user "${email}"?\n\nThis will permanently delete:\n- User account\n- All documents\n- All conversations\n- Token usage records\n\nThis action cannot be undone!`,
@@ -500,8 +520,17 @@ export default function AdminPanel({ isOpen, onClose }: AdminPanelProps) {
                           ))}
                         </tbody>
                       </table>
-                      <div className="mt-4 text-sm text-gray-600">
-                        Showing {filteredDocuments.length} / {documents.length} documents
+                      <div className="mt-4 flex items-center justify-between text-sm text-gray-600">
+                        <span>Showing {filteredDocuments.length} / {documents.length} documents</span>
+                        {documentsCursor && (
+                          <button
+                            onClick={() => loadMore(loadDocuments, documentsCursor)}
+                            disabled={loadingMore}
+                            className="px-4 py-2 text-blue-600 hover:bg-blue-50 rounded-lg transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
+                          >
+                            {loadingMore ? 'Loading...' : 'Load more'}
+                          </button>
+                        )}
                       </div>
                     </div>
                   )}
@@ -515,7 +544,7 @@ export default function AdminPanel({ isOpen, onClose }: AdminPanelProps) {
               {activeTab === 'users' && userTokenSummary && (
                 <div>
                   <div className="mb-6">
-                    <p className="text-sm text-gray-600">Total {users.length} users</p>
+                    <p className="text-sm text-gray-600">Total {userStats?.total_users ?? users.length} users</p>
                   </div>
                   <div className="overflow-x-auto">
                     <table className="w-full">
@@ -599,6 +628,17 @@ export default function AdminPanel({ isOpen, onClose }: AdminPanelProps) {
                         })}
                       </tbody>
                     </table>
+                    {usersCursor && (
+                      <div className="mt-4 flex justify-center">
+                        <button
+                          onClick={() => loadMore(loadUsers, usersCursor)}
+                          disabled={loadingMore}
+                          className="px-4 py-2 text-sm text-blue-600 hover:bg-blue-50 rounded-lg transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
+                        >
+                          {loadingMore ? 'Loading...' : 'Load more'}
+                        </button>
+                      </div>
+                    )}
                   </div>
                 </div>
               )}
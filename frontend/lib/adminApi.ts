@@ -88,6 +88,13 @@ export interface UserTokenSummary {
 export interface UserTokensSummaryResponse {
   total_users: number
   users: UserTokenSummary[]
+  next_cursor?: number | null
+}
+
+// 游标分页响应（next_cursor 为不透明的 "created_at|id" 字符串，原样回传即可）
+export interface CursorPage<T> {
+  items: T[]
+  next_cursor: string | null
 }
 
 
@@ -112,9 +119,11 @@ export interface UserStats {
 
 // API 方法
 export const adminApi = {
-  // 获取所有文档
-  getAllDocuments: async (): Promise<AdminDocument[]> => {
-    const response = await adminClient.get('/documents')
+  // 获取一页文档（cursor 为上一页返回的 next_cursor，为空时从最新文档开始）
+  getDocuments: async (cursor?: string | null): Promise<CursorPage<AdminDocument>> => {
+    const response = await adminClient.get('/documents', {
+      params: cursor ? { cursor } : undefined,
+    })
     return response.data
   },
 
@@ -129,9 +138,11 @@ export const adminApi = {
     await adminClient.delete(`/documents/${fileId}`)
   },
 
-  // 获取所有用户
-  getAllUsers: async (): Promise<AdminUser[]> => {
-    const response = await adminClient.get('/users')
+  // 获取一页用户（cursor 为上一页返回的 next_cursor，为空时从最新用户开始）
+  getUsers: async (cursor?: string | null): Promise<CursorPage<AdminUser>> => {
+    const response = await adminClient.get('/users', {
+      params: cursor ? { cursor } : undefined,
+    })
     return response.data
   },
 
@@ -157,9 +168,11 @@ export const adminApi = {
     await adminClient.patch(`/users/${userId}/quota`, { token_quota: tokenQuota })
   },
 
-  // 获取所有用户的 Token 使用汇总
-  getUsersTokenSummary: async (): Promise<UserTokensSummaryResponse> => {
-    const response = await adminClient.get('/users/tokens/summary')
+  // 获取指定用户的 Token 使用汇总（用户列表按页加载，只取当前页的用户）
+  getUsersTokenSummary: async (userIds: number[]): Promise<UserTokensSummaryResponse> => {
+    const response = await adminClient.get('/users/tokens/summary', {
+      params: { user_ids: userIds.join(','), limit: Math.max(userIds.length, 1) },
+    })
     return response.data
   },
 }
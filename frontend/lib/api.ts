@@ -180,8 +180,11 @@ export const documentsAPI = {
     const response = await apiClient.post('/documents/upload', formData)
     return response.data
   },
-  list: async () => {
-    const response = await apiClient.get('/documents/list')
+  list: async (cursor?: string | null): Promise<{ items: any[]; next_cursor: string | null }> => {
+    // 游标分页：每次只取一页，需要更多时把 next_cursor（不透明的 "created_at|file_id" 字符串）原样传回
+    const response = await apiClient.get('/documents/list', {
+      params: cursor ? { cursor } : undefined,
+    })
     return response.data
   },
   preview: (fileId: string): string => {